@@ -0,0 +1 @@
+from .spartan_index import SPARTANIndex
@@ -0,0 +1,281 @@
+"""iSAX-style tree index over SPARTAN words."""
+
+import heapq
+import os
+
+import numpy as np
+
+from ..symbolic.spartan.spartan import SPARTAN
+from ..util.persistence import save_model, load_model, prefixed, unprefixed
+
+
+class SPARTANIndex:
+    """Hierarchical index over SPARTAN words (in the spirit of iSAX).
+
+    Every letter of a SPARTAN word has its own power-of-two alphabet from the
+    DAA allocation. A node keeps a reduced cardinality (number of bits) per
+    letter, and the node's word is the common bit prefix of the full symbols
+    below it, i.e. a box in the space of the kept PCA components. Splitting a
+    node refines the cardinality of a single letter by one bit, choosing the
+    letter that divides the node's series most evenly.
+
+    The index is bulk loaded: series are sorted into a permutation in which
+    every node, and in particular every leaf, covers a contiguous range.
+    ``fit`` only keeps a reference to X (which may itself be a memory mapped
+    array) and the permutation. ``save`` writes the series in index order to
+    an .npy file and ``load`` memory maps it, so a leaf is read from disk as
+    one contiguous block.
+
+    Parameters
+    ----------
+    leaf_size:          int, maximum number of series in a leaf
+    word_length:        int, number of kept PCA components
+    alphabet_size:      int, average alphabet size handed to DAA
+    bit_budget:         int, total number of bits of a full word
+    lamda:              float, DAA regularization
+    downsample:         float, fraction of series used to fit the PCA
+    pca_solver:         str, svd solver of the PCA
+    spartan:            already fitted SPARTAN transformer, optional
+    chunk_size:         int, series projected per PCA call
+    """
+
+    # constructor parameters stored by save(), the SPARTAN is stored separately
+    _PARAMS = ("leaf_size", "word_length", "alphabet_size", "bit_budget", "lamda", "downsample",
+               "pca_solver", "chunk_size")
+    # fitted node arrays stored by save()
+    _ARRAYS = ("bits", "edges", "order", "node_start", "node_end", "node_card", "node_prefix",
+               "node_split", "node_child", "node_low", "node_high")
+    # file names inside a saved index directory
+    _INDEX_FILE = "index.npz"
+    _SERIES_FILE = "series.npy"
+
+    def __init__(self,
+                 leaf_size=1000,
+                 word_length=8,
+                 alphabet_size=4,
+                 bit_budget=16,
+                 lamda=0.5,
+                 downsample=1.0,
+                 pca_solver='auto',
+                 spartan=None,
+                 chunk_size=2**16):
+        self.leaf_size = leaf_size
+        self.word_length = word_length
+        self.alphabet_size = alphabet_size
+        self.bit_budget = bit_budget
+        self.lamda = lamda
+        self.downsample = downsample
+        self.pca_solver = pca_solver
+        self.spartan = spartan
+        self.chunk_size = chunk_size
+
+    def fit(self, X):
+        """Bulk load the index with the series X [N_instances,N_timepoints].
+
+        X is referenced, not copied, and must not change while the index is used.
+        """
+        if self.spartan is None:
+            self.spartan = SPARTAN(
+                alphabet_size=self.alphabet_size,
+                word_length=self.word_length,
+                assignment_policy='DAA',
+                bit_budget=self.bit_budget,
+                lamda=self.lamda,
+                build_histogram=False,
+                downsample=self.downsample,
+                pca_solver=self.pca_solver
+            )
+            self.spartan.fit(X)
+
+        alphabet_size = np.asarray(self.spartan.word_radices())
+        self.bits = np.log2(alphabet_size).astype(np.int64)
+        if np.any(2**self.bits != alphabet_size):
+            raise ValueError("SPARTANIndex requires power-of-two alphabet sizes, got {}".format(alphabet_size.tolist()))
+
+        # symbol k of letter i covers the PCA interval (edges[i,k], edges[i,k+1]]
+        max_alphabet_size = alphabet_size.max()
+        self.edges = np.full((len(alphabet_size), max_alphabet_size + 1), np.inf)
+        for i, breakpoints_i in enumerate(self.spartan.breakpoints):
+            self.edges[i, 0] = -np.inf
+            self.edges[i, 1:len(breakpoints_i) + 1] = breakpoints_i
+
+        words = self.spartan.generate_words(self._project(X), self.spartan.breakpoints).astype(np.int64)
+        self._build(words)
+        self.series = X
+        # series rows are in the caller's order until the index is saved
+        self.series_in_index_order = False
+        return self
+
+    def save(self, path):
+        """Write the fitted index to the directory path.
+
+        The directory holds ``index.npz`` (the SPARTAN transformer and the
+        node arrays, see ``util.persistence``) and ``series.npy``, the
+        series in index order, written chunk by chunk.
+        """
+        os.makedirs(path, exist_ok=True)
+        params = {name: getattr(self, name) for name in self._PARAMS}
+        params["spartan"], spartan_arrays = self.spartan._get_state()
+        arrays = prefixed("spartan", spartan_arrays)
+        arrays.update({name: getattr(self, name) for name in self._ARRAYS})
+        save_model(os.path.join(path, self._INDEX_FILE), type(self).__name__, params, arrays)
+
+        n_instances = len(self.order)
+        series = np.lib.format.open_memmap(os.path.join(path, self._SERIES_FILE), mode="w+",
+                                           dtype=np.float64, shape=(n_instances,) + self.series.shape[1:])
+        for start in range(0, n_instances, self.chunk_size):
+            series[start:start + self.chunk_size] = self._series_rows(start, min(start + self.chunk_size, n_instances))
+        series.flush()
+        del series
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Index from a directory written by ``save``.
+
+        The series are memory mapped with mmap_mode (None reads them into memory).
+        """
+        params, arrays = load_model(os.path.join(path, cls._INDEX_FILE), cls.__name__)
+        index = cls(**{name: params[name] for name in cls._PARAMS})
+        index.spartan = SPARTAN._from_state(params["spartan"], unprefixed("spartan", arrays))
+        for name in cls._ARRAYS:
+            setattr(index, name, arrays[name])
+        index.series = np.load(os.path.join(path, cls._SERIES_FILE), mmap_mode=mmap_mode)
+        index.series_in_index_order = True
+        return index
+
+    def _series_rows(self, start, end):
+        # series of the index positions start:end, a contiguous slice once the
+        # index is saved and loaded
+        if self.series_in_index_order:
+            return self.series[start:end]
+        return self.series[self.order[start:end]]
+
+    def _project(self, X):
+        word_length = len(self.spartan.breakpoints)
+        pca_repr = np.empty((len(X), word_length))
+        for start in range(0, len(X), self.chunk_size):
+            pca_repr[start:start + self.chunk_size] = \
+                self.spartan.pca.transform(X[start:start + self.chunk_size])[:, :word_length]
+        return pca_repr
+
+    def _build(self, words):
+        n_instances, word_length = words.shape
+        self.order = np.arange(n_instances)
+
+        node_start, node_end, node_card, node_prefix = [0], [n_instances], [np.zeros(word_length, dtype=np.int64)], [np.zeros(word_length, dtype=np.int64)]
+        node_split, node_child = [-1], [-1]
+
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            start, end = node_start[node], node_end[node]
+            card = node_card[node]
+            if end - start <= self.leaf_size:
+                continue
+
+            letter, bit = self._choose_split(words[self.order[start:end]], card)
+            if letter < 0:
+                continue
+
+            # stable partition of the node's range on the next bit of `letter`
+            members = self.order[start:end]
+            self.order[start:end] = np.concatenate([members[bit == 0], members[bit == 1]])
+            middle = start + int(np.count_nonzero(bit == 0))
+
+            node_split[node] = letter
+            node_child[node] = len(node_start)
+            for child_bit, (child_start, child_end) in enumerate([(start, middle), (middle, end)]):
+                child_card = card.copy()
+                child_card[letter] += 1
+                child_prefix = node_prefix[node].copy()
+                child_prefix[letter] = 2 * child_prefix[letter] + child_bit
+
+                stack.append(len(node_start))
+                node_start.append(child_start)
+                node_end.append(child_end)
+                node_card.append(child_card)
+                node_prefix.append(child_prefix)
+                node_split.append(-1)
+                node_child.append(-1)
+
+        self.node_start = np.asarray(node_start)
+        self.node_end = np.asarray(node_end)
+        self.node_card = np.asarray(node_card)
+        self.node_prefix = np.asarray(node_prefix)
+        self.node_split = np.asarray(node_split)
+        self.node_child = np.asarray(node_child)
+
+        # PCA box of every node
+        shift = self.bits[None, :] - self.node_card
+        letters = np.arange(word_length)[None, :]
+        self.node_low = self.edges[letters, self.node_prefix << shift]
+        self.node_high = self.edges[letters, (self.node_prefix + 1) << shift]
+
+    def _choose_split(self, words, card):
+        # refine the letter whose next bit splits the node most evenly
+        best_letter, best_balance, best_bit = -1, None, None
+        for letter in np.flatnonzero(card < self.bits):
+            bit = (words[:, letter] >> (self.bits[letter] - card[letter] - 1)) & 1
+            balance = abs(2 * int(bit.sum()) - len(bit))
+            if best_balance is None or balance < best_balance:
+                best_letter, best_balance, best_bit = letter, balance, bit
+        return best_letter, best_bit
+
+    def _node_lower_bound(self, nodes, query_repr):
+        gap = np.maximum(self.node_low[nodes] - query_repr, 0) + np.maximum(query_repr - self.node_high[nodes], 0)
+        return np.sqrt(np.sum(gap**2, axis=-1))
+
+    def kneighbors(self, X, n_neighbors=1, exact=True, max_leaves=1):
+        """k nearest indexed series under Euclidean distance.
+
+        Nodes are visited best-first by the lower bound between the query's
+        PCA coordinates and the node's box. An exact search stops once the
+        next lower bound exceeds the k-th best distance; an approximate search
+        stops after scanning max_leaves leaves. The fraction of indexed series
+        that was never scanned is stored in ``self.pruning_ratio``.
+
+        Returns
+        -------
+        distances : 2d numpy array [N_instances,n_neighbors]
+        indices : 2d numpy array [N_instances,n_neighbors], rows of the fitted X
+        """
+        X = np.atleast_2d(X)
+        n_neighbors = min(n_neighbors, len(self.order))
+        query_reprs = self._project(X)
+
+        distances = np.full((len(X), n_neighbors), np.inf)
+        indices = np.full((len(X), n_neighbors), -1, dtype=np.int64)
+        n_scanned = 0
+        for q in range(len(X)):
+            n_scanned += self._search(X[q], query_reprs[q], distances[q], indices[q], exact, max_leaves)
+
+        self.pruning_ratio = 1 - n_scanned / (len(X) * len(self.order))
+        return distances, indices
+
+    def _search(self, query, query_repr, best_d, best_i, exact, max_leaves):
+        n_scanned, n_leaves = 0, 0
+        heap = [(0.0, 0)]
+        while heap:
+            lower_bound, node = heapq.heappop(heap)
+            if lower_bound > best_d[-1] or (not exact and n_leaves >= max_leaves):
+                break
+
+            start, end = self.node_start[node], self.node_end[node]
+            child = self.node_child[node]
+            if child < 0:
+                dist = np.sqrt(np.sum((self._series_rows(start, end) - query)**2, axis=1))
+                candidates_d = np.concatenate([best_d, dist])
+                candidates_i = np.concatenate([best_i, self.order[start:end]])
+                # ties go to the smaller series index
+                keep = np.lexsort((candidates_i, candidates_d))[:len(best_d)]
+                best_d[:], best_i[:] = candidates_d[keep], candidates_i[keep]
+                n_scanned += end - start
+                n_leaves += 1
+                continue
+
+            children = np.array([child, child + 1])
+            children = children[self.node_end[children] > self.node_start[children]]
+            for child_node, child_bound in zip(children, self._node_lower_bound(children, query_repr)):
+                if child_bound <= best_d[-1]:
+                    heapq.heappush(heap, (child_bound, child_node))
+        return n_scanned
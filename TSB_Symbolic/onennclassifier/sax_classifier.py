@@ -1,12 +1,18 @@
 from ..symbolic.sax.sax import SAX
 from ..util.distance import mindist,matching_distance,hist_euclidean_dist,pairwise_distance,pairwise_histogram_distance
-from ..util.distance_vectorized import hamming_vectorized,symbol_vectorized,sax_mindist,euclidean_vectorized,boss_vectorized,cosine_similarity_vectorized,kl_divergence
+from ..util.persistence import save_model,load_model,prefixed,unprefixed,pack_matrix,unpack_matrix,pack_labels
+from ..util.distance_blocked import hamming_vectorized,symbol_vectorized,sax_mindist,euclidean_vectorized,euclidean_sparse,boss_vectorized,cosine_similarity_vectorized,kl_divergence
 
 import sys
 import numpy as np
 import scipy
+import scipy.sparse
 
 class SAXDictionaryClassifier():
+    # constructor parameters, stored with their fitted values by save()
+    _PARAMS = ('word_length', 'alphabet_size', 'window_size', 'remove_repeat_words', 'save_words', 'metric',
+               'store_words', 'build_histogram', 'return_sparse')
+
     def __init__(self,
         word_length=4,
         alphabet_size=4,
@@ -15,7 +21,8 @@ class SAXDictionaryClassifier():
         save_words=False,
         metric = 'mindist',
         store_words=None,
-        build_histogram=True):
+        build_histogram=True,
+        return_sparse=False):
         
         self.word_length = word_length
         self.alphabet_size = alphabet_size
@@ -25,6 +32,7 @@ class SAXDictionaryClassifier():
         self.metric = metric
         self.store_words = store_words
         self.build_histogram = build_histogram
+        self.return_sparse = return_sparse
 
     def fit(self,X,y=None):
 
@@ -40,7 +48,8 @@ class SAXDictionaryClassifier():
             window_size=self.window_size,
             remove_repeat_words=self.remove_repeat_words,
             save_words=self.save_words,
-            build_histogram = self.window_size > 0 and self.build_histogram
+            build_histogram = self.window_size > 0 and self.build_histogram,
+            return_sparse = self.return_sparse
         )
 
         # transform 
@@ -58,6 +67,38 @@ class SAXDictionaryClassifier():
 
         return self 
 
+    def save(self,path):
+        """Write the fitted classifier to a versioned .npz archive.
+
+        Stores the SAX parameters, the labels and the training words and
+        histograms, not the training series.
+        """
+        params = {name: getattr(self, name) for name in self._PARAMS}
+        params['ts_len'] = self.ts_len
+        params['series_length'] = self.series_length
+        params['breakpoints'] = list(self.breakpoints)
+        params['sax'], sax_arrays = self.sax._get_state()
+
+        arrays = prefixed('sax', sax_arrays)
+        arrays['_y'] = pack_labels(self._y)
+        arrays['train_words_bps'] = self.train_words_bps
+        arrays.update(prefixed('train_hist', pack_matrix(self.train_hist)))
+        save_model(path, type(self).__name__, params, arrays)
+
+    @classmethod
+    def load(cls,path):
+        """Fitted classifier from an archive written by ``save``."""
+        params, arrays = load_model(path, cls.__name__)
+        model = cls(**{name: params[name] for name in cls._PARAMS})
+        model.sax = SAX._from_state(params['sax'], unprefixed('sax', arrays))
+        model.ts_len = params['ts_len']
+        model.series_length = params['series_length']
+        model.breakpoints = params['breakpoints']
+        model._y = arrays.get('_y')
+        model.train_words_bps = arrays['train_words_bps']
+        model.train_hist = unpack_matrix(unprefixed('train_hist', arrays))
+        return model
+
     def predict(self,X):
 
         self.test_data = X
@@ -69,7 +110,10 @@ class SAXDictionaryClassifier():
         """
         
         if self.metric in ['hist_euclidean']:
-            dist_mat = euclidean_vectorized(self.predict_hist,self.train_hist)
+            if scipy.sparse.issparse(self.predict_hist):
+                dist_mat = euclidean_sparse(self.predict_hist,self.train_hist)
+            else:
+                dist_mat = euclidean_vectorized(self.predict_hist,self.train_hist)
         
         elif self.metric in ['symbolic_l1']:
             pred_X = np.squeeze(self.predict_words_bps,axis=1)
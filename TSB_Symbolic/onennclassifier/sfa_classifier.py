@@ -2,16 +2,24 @@ import sys
 import math
 import time
 import numpy as np
-import multiprocessing
 
 from numba import prange,njit
 
 from ..util.distance import mindist,matching_distance,hist_euclidean_dist,pairwise_distance,pairwise_histogram_distance
-from ..util.distance_vectorized import symbol_vectorized,hamming_vectorized,sax_mindist,mindist_minmax,euclidean_vectorized,boss_vectorized,cosine_similarity_vectorized,kl_divergence
+from ..util.persistence import save_model,load_model,prefixed,unprefixed,pack_matrix,unpack_matrix,pack_labels
+from ..util.distance_blocked import symbol_vectorized,hamming_vectorized,sax_mindist,mindist_minmax,euclidean_vectorized,euclidean_sparse,boss_vectorized,cosine_similarity_vectorized,kl_divergence
 
 from TSB_Symbolic.symbolic.sfa.sfa_fast import SFAFast
 
 class SFADictionaryClassifier:
+    # constructor parameters, stored with their fitted values by save()
+    _PARAMS = (
+        "word_length", "alphabet_size", "window_size", "norm", "binning_method", "anova", "variance",
+        "bigrams", "skip_grams", "remove_repeat_words", "lower_bounding", "save_words",
+        "feature_selection", "max_feature_count", "p_threshold", "random_state", "return_sparse",
+        "return_pandas_data_series", "n_jobs", "metric", "build_histogram",
+    )
+
     def __init__(
         self,
         word_length=8,
@@ -30,7 +38,7 @@ class SFADictionaryClassifier:
         max_feature_count=256,
         p_threshold=0.05,
         random_state=None,
-        return_sparse=True,
+        return_sparse=False,
         return_pandas_data_series=False,
         n_jobs=-1,
         metric = 'sfa_mindist',
@@ -80,19 +88,11 @@ class SFADictionaryClassifier:
 
         self.build_histogram = build_histogram
 
-        if self.n_jobs < 1 or self.n_jobs > multiprocessing.cpu_count():
-            self.n_jobs = min(multiprocessing.cpu_count(), 5)
-        else:
-            self.n_jobs = min(self.n_jobs, 1)
-
-        # print(self.n_jobs)
+        # the SFA kernels run on n_jobs numba threads (clamped to
+        # NUMBA_NUM_THREADS, n_jobs < 1 keeps the current thread count)
 
         self.metric = metric
 
-        from numba import set_num_threads
-
-        set_num_threads(min(self.n_jobs, 1))
-
     def fit(self,X,y=None):
         self._y = y
 
@@ -133,7 +133,8 @@ class SFADictionaryClassifier:
             max_feature_count=self.max_feature_count,
             p_threshold=self.p_threshold,
             random_state=self.random_state,
-            return_sparse=self.return_sparse,
+            # csr bags, densified by _histogram unless return_sparse is set
+            return_sparse=True,
             return_pandas_data_series=self.return_pandas_data_series,
             build_histogram = self.build_histogram,
             n_jobs=self.n_jobs
@@ -151,21 +152,9 @@ class SFADictionaryClassifier:
         self.train_word_indices = X_words_indices
 
         if self.window_size > 0 and self.build_histogram:
-            self.train_hist = X_transform.toarray()
+            self.train_hist = self._histogram(X_transform)
         # print(self.train_hist[1])
 
-        if self.n_jobs < 1 or self.n_jobs > multiprocessing.cpu_count():
-            n_jobs = multiprocessing.cpu_count()
-        else:
-            n_jobs = self.n_jobs
-
-        # super raises numba import exception if not available
-        # so now we know we can use numba
-
-        from numba import set_num_threads
-
-        set_num_threads(n_jobs)
-
         return self
 
     def fit_transform(self,X,y=None):
@@ -198,7 +187,8 @@ class SFADictionaryClassifier:
             max_feature_count=self.max_feature_count,
             p_threshold=self.p_threshold,
             random_state=self.random_state,
-            return_sparse=self.return_sparse,
+            # csr bags, densified by _histogram unless return_sparse is set
+            return_sparse=True,
             return_pandas_data_series=self.return_pandas_data_series,
             build_histogram = self.build_histogram,
             n_jobs=self.n_jobs
@@ -214,15 +204,19 @@ class SFADictionaryClassifier:
 
         self.train_words = X_words
         self.train_word_indices = X_words_indices
-        self.train_hist = X_transform
+        self.train_hist = self._histogram(X_transform)
+
+        return self.train_hist
 
-        return X_transform
+    def _histogram(self, X_transform):
+        # SFA bags as csr_matrix if return_sparse is set, dense otherwise
+        return X_transform if self.return_sparse else X_transform.toarray()
 
     def predict(self,X):
         X_transform = self.sfa.transform(X)
 
         if self.build_histogram:
-            self.predict_hist = X_transform.toarray()
+            self.predict_hist = self._histogram(X_transform)
             self.pred_histogram = self.predict_hist.astype(float)
             print(self.pred_histogram.shape)
 
@@ -237,7 +231,7 @@ class SFADictionaryClassifier:
             if not self.build_histogram:
                 dist_mat = np.zeros((len(X), len(self.train_word_indices)))
             else:
-                dist_mat = euclidean_vectorized(self.predict_hist,self.train_hist)
+                dist_mat = euclidean_sparse(self.predict_hist,self.train_hist) if self.return_sparse else euclidean_vectorized(self.predict_hist,self.train_hist)
 
         elif self.metric in ['symbolic_l1']:
             pred_X = np.squeeze(self.pred_word_indices,axis=1)
@@ -263,6 +257,42 @@ class SFADictionaryClassifier:
         return pred
 
 
+    def save(self,path):
+        """Write the fitted classifier to a versioned .npz archive.
+
+        Stores the fitted SFA transformer, the labels and the training word
+        indices and histograms, not the training series or their DFTs.
+        """
+        params = {name: getattr(self, name) for name in self._PARAMS}
+        params["inverse_sqrt_win_size"] = self.inverse_sqrt_win_size
+        params["sfa"], sfa_arrays = self.sfa._get_state()
+
+        arrays = prefixed("sfa", sfa_arrays)
+        arrays["classes_"] = pack_labels(self.classes_)
+        arrays["_y"] = pack_labels(self._y)
+        arrays["train_word_indices"] = self.train_word_indices
+        arrays.update(prefixed("train_hist", pack_matrix(getattr(self, "train_hist", None))))
+        save_model(path, type(self).__name__, params, arrays)
+
+    @classmethod
+    def load(cls,path):
+        """Fitted classifier from an archive written by ``save``."""
+        params, arrays = load_model(path, cls.__name__)
+        model = cls(**{name: params[name] for name in cls._PARAMS})
+        model.inverse_sqrt_win_size = params["inverse_sqrt_win_size"]
+        model.sfa = SFAFast._from_state(params["sfa"], unprefixed("sfa", arrays))
+        model.breakpoints = model.sfa.breakpoints
+
+        model.classes_ = arrays["classes_"]
+        model.n_classes_ = model.classes_.shape[0]
+        model._class_dictionary = {class_val: index for index, class_val in enumerate(model.classes_)}
+        model._y = arrays.get("_y")
+        model.train_word_indices = arrays["train_word_indices"]
+        train_hist = unpack_matrix(unprefixed("train_hist", arrays))
+        if train_hist is not None:
+            model.train_hist = train_hist
+        return model
+
     def sfa_cell(self,r,c,breakpoints):
         partial_dist = 0
         breakpoints_i = breakpoints
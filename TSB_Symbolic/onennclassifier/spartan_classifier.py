@@ -1,9 +1,69 @@
 from TSB_Symbolic.symbolic.spartan import SPARTAN
 from ..util.distance import pairwise_distance,pairwise_histogram_distance
-from ..util.distance_vectorized import hamming_vectorized,symbol_vectorized,symbol_weighted,hamming_weighted,mindist_vectorized,sax_mindist,mindist_minmax,spartan_pca_mindist,euclidean_vectorized,boss_vectorized,cosine_similarity_vectorized,kl_divergence
+from ..util.distance_vectorized import symbol_weighted,hamming_weighted,mindist_vectorized
+from ..util.windowing import map_windows
+from ..util.persistence import save_model,load_model,prefixed,unprefixed,pack_matrix,unpack_matrix,pack_labels
+from ..util.distance_blocked import hamming_vectorized,symbol_vectorized,sax_mindist,mindist_minmax,spartan_pca_mindist,euclidean_vectorized,euclidean_sparse,boss_vectorized,cosine_similarity_vectorized,kl_divergence
 import numpy as np
+import scipy.sparse
+from numba import njit, prange
+
+
+@njit(parallel=True, cache=True)
+def _lb_pruned_knn(queries, train, lower_bounds, order, n_neighbors):
+    """Exact kNN under Euclidean distance, visiting candidates by increasing lower bound.
+
+    Candidates are verified until the next lower bound exceeds the current
+    k-th best distance; each verification abandons early once its partial sum
+    exceeds that distance. Ties are broken by the smaller training index, as
+    np.argmin does on the full distance matrix.
+    """
+    n_queries, series_length = queries.shape
+    n_train = train.shape[0]
+    distances = np.full((n_queries, n_neighbors), np.inf)
+    indices = np.full((n_queries, n_neighbors), -1, dtype=np.int64)
+    n_verified = np.zeros(n_queries, dtype=np.int64)
+
+    for q in prange(n_queries):
+        best_d = distances[q]
+        best_i = indices[q]
+        for rank in range(n_train):
+            c = order[q, rank]
+            if lower_bounds[q, c] > best_d[n_neighbors - 1]:
+                break
+            n_verified[q] += 1
+
+            bound = best_d[n_neighbors - 1] ** 2
+            dist = 0.0
+            for t in range(series_length):
+                diff = queries[q, t] - train[c, t]
+                dist += diff * diff
+                if dist > bound:
+                    break
+            if dist > bound:
+                continue
+            dist = np.sqrt(dist)
+
+            # insert (dist, c) into the sorted neighbor list
+            pos = n_neighbors
+            while pos > 0 and (dist < best_d[pos - 1] or (dist == best_d[pos - 1] and c < best_i[pos - 1])):
+                pos -= 1
+            if pos < n_neighbors:
+                for j in range(n_neighbors - 1, pos, -1):
+                    best_d[j] = best_d[j - 1]
+                    best_i[j] = best_i[j - 1]
+                best_d[pos] = dist
+                best_i[pos] = c
+
+    return distances, indices, n_verified
+
 
 class SPARTANClassifier:
+    # constructor parameters, stored with their fitted values by save()
+    _PARAMS = ('alphabet_size', 'window_size', 'word_length', 'bit_budget', 'binning_method', 'assignment_policy',
+               'remove_repeat_words', 'build_histogram', 'metric', 'lamda', 'downsample', 'pca_solver',
+               'return_sparse', 'sketch_size', 'retain_training_data')
+
     def __init__(self,
                  alphabet_size=[8,8,8,4,4,2,2,2],
                  window_size=0,
@@ -16,7 +76,10 @@ class SPARTANClassifier:
                  metric = 'symbolic_l1',
                  lamda=0.5,
                  downsample = 1.0,
-                 pca_solver = 'auto'
+                 pca_solver = 'auto',
+                 return_sparse = False,
+                 sketch_size = None,
+                 retain_training_data = False
                  ):
         self.alphabet_size = alphabet_size
         self.window_size = window_size
@@ -30,6 +93,9 @@ class SPARTANClassifier:
         self.build_histogram = build_histogram
         self.downsample = downsample
         self.pca_solver = pca_solver
+        self.return_sparse = return_sparse
+        self.sketch_size = sketch_size
+        self.retain_training_data = retain_training_data
 
         self.spartan = SPARTAN(
             alphabet_size=alphabet_size,
@@ -42,7 +108,10 @@ class SPARTANClassifier:
             bit_budget=self.bit_budget,
             build_histogram = window_size > 0 and self.build_histogram,
             downsample = self.downsample,
-            pca_solver = self.pca_solver
+            pca_solver = self.pca_solver,
+            return_sparse = self.return_sparse,
+            sketch_size = self.sketch_size,
+            retain_training_data = self.retain_training_data
         )
     def fit(self,X,y=None):
         self._y = y
@@ -50,7 +119,9 @@ class SPARTANClassifier:
         self._mean = np.mean(X)
         self._std = np.std(X)
 
-        self._X = X
+        # only the words are needed for the symbolic metrics; the lower-bound
+        # search verifies its candidates on the series
+        self._X = X if self.retain_training_data or self.metric == 'euclidean_lb' else None
         train_X = (X - self._mean) / self._std
 
 
@@ -69,7 +140,10 @@ class SPARTANClassifier:
 
 
         X_transform = self.spartan.fit_transform(train_X)
-        
+        self._store_train_words(X_transform)
+        return self
+
+    def _store_train_words(self,X_transform):
         self.pca_repr = self.spartan.pca_repr
         if self.window_size == 0:
             self.train_words = np.expand_dims(X_transform,axis=1)
@@ -77,7 +151,91 @@ class SPARTANClassifier:
             self.train_words = X_transform
             self.train_histogram = self.spartan.pred_histogram
         self.evcr = self.spartan.pca.explained_variance_ratio_
-        return self
+
+    def derive(self,word_length,alphabet_size,assignment_policy=None,lamda=None,bit_budget=None,max_bit_budget=None):
+        """Classifier for a smaller word length and another alphabet size that
+        reuses this classifier's fitted PCA (see ``SPARTAN.derive``).
+
+        Only the binning runs again and the training words are re-encoded, so
+        a grid of (word_length, alphabet_size) settings costs one PCA fit.
+        """
+        if self._X is None:
+            raise ValueError("derive re-encodes the training series, which are only kept with retain_training_data=True")
+        derived = SPARTANClassifier(
+            alphabet_size=alphabet_size,
+            window_size=self.window_size,
+            word_length=word_length,
+            bit_budget=self.bit_budget if bit_budget is None else bit_budget,
+            binning_method=self.binning_method,
+            assignment_policy=self.assignment_policy if assignment_policy is None else assignment_policy,
+            remove_repeat_words=self.remove_repeat_words,
+            build_histogram=self.build_histogram,
+            metric=self.metric,
+            lamda=self.lamda if lamda is None else lamda,
+            downsample=self.downsample,
+            pca_solver=self.pca_solver,
+            return_sparse=self.return_sparse,
+            sketch_size=self.sketch_size,
+            retain_training_data=self.retain_training_data
+        )
+        derived.spartan = self.spartan.derive(word_length,alphabet_size,
+                                              assignment_policy=assignment_policy,
+                                              lamda=lamda,
+                                              bit_budget=bit_budget,
+                                              max_bit_budget=max_bit_budget)
+        derived._y = self._y
+        derived._mean = self._mean
+        derived._std = self._std
+        derived._X = self._X
+
+        train_X = (self._X - self._mean) / self._std
+        derived._store_train_words(derived.spartan.transform(train_X))
+        return derived
+
+    def save(self,path):
+        """Write the fitted classifier to a versioned .npz archive.
+
+        Stores the fitted SPARTAN, the normalization, the labels and the
+        training words (and histograms for BOP). The training series are
+        stored when they are kept, i.e. with retain_training_data=True or for
+        the 'euclidean_lb' metric, whose search verifies candidates on them.
+        """
+        params = {name: getattr(self, name) for name in self._PARAMS}
+        params['_mean'] = float(self._mean)
+        params['_std'] = float(self._std)
+        params['spartan'], spartan_arrays = self.spartan._get_state()
+
+        arrays = prefixed('spartan', spartan_arrays)
+        arrays['_y'] = pack_labels(self._y)
+        arrays['train_words'] = self.train_words
+        arrays.update(prefixed('train_histogram', pack_matrix(getattr(self, 'train_histogram', None))))
+        if self._X is not None:
+            arrays['_X'] = self._X
+        save_model(path, type(self).__name__, params, arrays)
+
+    @classmethod
+    def load(cls,path):
+        """Fitted classifier from an archive written by ``save``."""
+        params, arrays = load_model(path, cls.__name__)
+        model = cls(**{name: params[name] for name in cls._PARAMS})
+        model.spartan = SPARTAN._from_state(params['spartan'], unprefixed('spartan', arrays))
+        model._mean = params['_mean']
+        model._std = params['_std']
+        model._y = arrays.get('_y')
+        model._X = arrays.get('_X')
+        model.train_words = arrays['train_words']
+        train_histogram = unpack_matrix(unprefixed('train_histogram', arrays))
+        if train_histogram is not None:
+            model.train_histogram = train_histogram
+        model.pca_repr = None
+        if model._X is not None and model.retain_training_data and model.pca_solver != 'incremental':
+            # derive bins the PCA representation of the training data, recompute it
+            train_X = (model._X - model._mean) / model._std
+            model.spartan._X = train_X
+            model.spartan.pca_repr = map_windows(model.spartan.pca.transform,train_X,model.spartan.window_size)[:,0:model.spartan.word_length]
+            model.pca_repr = model.spartan.pca_repr
+        model.evcr = model.spartan.pca.explained_variance_ratio_
+        return model
 
     def predict(self,X):
         
@@ -94,8 +252,17 @@ class SPARTANClassifier:
 
         self.predict_words_bps = self.pred_words
         
+        if self.metric in ['euclidean_lb']:
+            # exact 1NN on the normalized series, pruned by the SPARTAN lower bound
+            _, ind = self._lb_kneighbors(pred_X, n_neighbors=1)
+            self.dist_mat = None
+            return self._y[ind[:,0]]
+
         if self.metric in ['hist_euclidean']:
-            dist_mat =  euclidean_vectorized(self.pred_histogram,self.train_histogram)
+            if scipy.sparse.issparse(self.pred_histogram):
+                dist_mat = euclidean_sparse(self.pred_histogram,self.train_histogram)
+            else:
+                dist_mat = euclidean_vectorized(self.pred_histogram,self.train_histogram)
         elif self.metric in ['symbolic_l1']:
             pred_X = np.squeeze(self.pred_words,axis=1)
             train_X = np.squeeze(self.train_words,axis=1)
@@ -114,4 +281,43 @@ class SPARTANClassifier:
         ind = ind.T
         pred = self._y[ind]
 
-        return pred
\ No newline at end of file
+        return pred
+
+    def kneighbors(self,X,n_neighbors=1):
+        """Exact k nearest training series under Euclidean distance.
+
+        Candidates are ranked by the SPARTAN PCA lower bound and verified on
+        the normalized series until the next lower bound exceeds the k-th best
+        distance, so the result equals a brute-force search. The fraction of
+        training series that never had to be verified is stored in
+        ``self.pruning_ratio``.
+
+        Returns
+        -------
+        distances : 2d numpy array [N_instances,n_neighbors]
+        indices : 2d numpy array [N_instances,n_neighbors]
+        """
+        if self._X is None:
+            raise ValueError("kneighbors verifies candidates on the training series, which are only kept with retain_training_data=True or metric='euclidean_lb'")
+        pred_X = (X - self._mean) / self._std
+        self.pred_words = np.expand_dims(self.spartan.transform(pred_X),axis=1)
+        return self._lb_kneighbors(pred_X,n_neighbors)
+
+    def _lb_kneighbors(self,pred_X,n_neighbors):
+        if self.window_size != 0:
+            raise ValueError("lower-bound search requires whole-series words (window_size=0)")
+        n_neighbors = min(n_neighbors, len(self._X))
+
+        pred_words = np.squeeze(self.pred_words,axis=1)
+        train_words = np.squeeze(self.train_words,axis=1)
+        lower_bounds = spartan_pca_mindist(pred_words,train_words,self.spartan.mindist_breakpoints)
+        order = np.argsort(lower_bounds,axis=1,kind='stable')
+
+        train_X = (self._X - self._mean) / self._std
+        distances, indices, n_verified = _lb_pruned_knn(np.ascontiguousarray(pred_X,dtype=np.float64),
+                                                        np.ascontiguousarray(train_X,dtype=np.float64),
+                                                        lower_bounds, order, n_neighbors)
+
+        self.n_verified = n_verified
+        self.pruning_ratio = 1 - n_verified.sum() / lower_bounds.size
+        return distances, indices
\ No newline at end of file
@@ -1,4 +1,5 @@
 from .spartan.spartan import SPARTAN
+from .spartan.streaming import SPARTANStream
 from .sfa.sfa_fast import SFAFast as SFA
 from .sax.sax import SAX
 from .sax.esax import ESAX
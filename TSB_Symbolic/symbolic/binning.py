@@ -0,0 +1,320 @@
+"""Breakpoint learning for equi-depth and equi-width binning.
+
+``learn_breakpoints`` is shared by the SPARTAN and SFA transformers. Exact
+equi-depth breakpoints are order statistics of each column, found by a
+radix selection that reads the data in place instead of sorting a copy;
+with a sketch size, each column is summarized by a mergeable QuantileSketch
+instead, which also serves fits that never hold all values at once.
+"""
+
+import numpy as np
+
+from numba import njit
+
+# default k of QuantileSketch
+DEFAULT_SKETCH_SIZE = 2048
+# rows of a column fed to a sketch at a time
+SKETCH_CHUNK_SIZE = 2**20
+# candidate sets this small are sorted instead of refined by another radix pass
+SELECTION_SORT_SIZE = 4096
+
+_SIGN_BIT = np.uint64(1 << 63)
+
+
+class QuantileSketch:
+    """Mergeable KLL quantile sketch of a stream of floats.
+
+    Values are kept in a hierarchy of compactors, an item at level h standing
+    for 2^h input values. A level exceeding its capacity is sorted and every
+    other item (with a random offset) is promoted to the next level, so the
+    sketch holds O(k) items however many values it has seen, and the rank of
+    any value is estimated within roughly n / k. As long as no compaction
+    happened (fewer than k values) the sketch is exact.
+
+    Sketches of the same k can be merged, e.g. to combine the summaries of
+    chunks processed independently.
+
+    Parameters
+    ----------
+    k:                  int, capacity of the top level, the accuracy parameter
+    seed:               int, seed of the compaction offsets
+    """
+
+    def __init__(self, k=DEFAULT_SKETCH_SIZE, seed=0):
+        self.k = k
+        self.seed = seed
+        self._rng = np.random.default_rng(seed)
+        self.compactors = [np.empty(0)]
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _capacity(self, level):
+        # lower levels get geometrically smaller capacities
+        depth = len(self.compactors) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3)**depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.compactors):
+            items = self.compactors[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append(np.empty(0))
+                items = np.sort(items)
+                # an odd item stays behind, so the total weight is preserved
+                kept, items = items[len(items) - len(items) % 2:], items[:len(items) - len(items) % 2]
+                promoted = items[self._rng.integers(2)::2]
+                self.compactors[level] = kept
+                self.compactors[level + 1] = np.concatenate([self.compactors[level + 1], promoted])
+                # adding a level shrinks the capacities below it
+                level = 0
+                continue
+            level += 1
+
+    def update(self, values):
+        """Add a batch of values."""
+        values = np.ravel(np.asarray(values, dtype=np.float64))
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Add the values summarized by another sketch of the same k."""
+        if other.k != self.k:
+            raise ValueError("cannot merge sketches with k={} and k={}".format(self.k, other.k))
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0))
+        for level, items in enumerate(other.compactors):
+            self.compactors[level] = np.concatenate([self.compactors[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _weighted_items(self):
+        items = np.concatenate(self.compactors)
+        weights = np.concatenate([np.full(len(level_items), 2**level, dtype=np.int64)
+                                  for level, level_items in enumerate(self.compactors)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def value_at_rank(self, ranks):
+        """Estimated ``np.sort(values)[ranks]`` for 0-based ranks."""
+        if self.n == 0:
+            raise ValueError("empty sketch")
+        items, cumulative_weights = self._weighted_items()
+        ranks = np.clip(np.asarray(ranks), 0, self.n - 1)
+        return items[np.searchsorted(cumulative_weights, ranks, side='right')]
+
+    def quantile(self, q):
+        """Estimated lower quantile(s) q in [0, 1]."""
+        return self.value_at_rank((np.asarray(q) * (self.n - 1)).astype(np.int64))
+
+
+@njit(cache=True)
+def _radix_key(bits):
+    # order preserving unsigned key of a float64 bit pattern, NaNs last;
+    # branch free on the sign, which is unpredictable on centred data
+    if (bits & np.uint64(0x7FFFFFFFFFFFFFFF)) > np.uint64(0x7FF0000000000000):
+        return np.uint64(0xFFFFFFFFFFFFFFFF)
+    negative = bits >> np.uint64(63)
+    return bits ^ ((np.uint64(0) - negative) | np.uint64(0x8000000000000000))
+
+
+@njit(cache=True)
+def _radix_histogram(keys, shift):
+    # counts of the 16-bit key digit starting at bit `shift`
+    counts = np.zeros(2**16, dtype=np.int64)
+    for i in range(len(keys)):
+        counts[(keys[i] >> np.uint64(shift)) & np.uint64(0xFFFF)] += 1
+    return counts
+
+
+@njit(cache=True)
+def _radix_gather(keys, shift, digit, count):
+    gathered = np.empty(count, dtype=np.uint64)
+    j = 0
+    for i in range(len(keys)):
+        if (keys[i] >> np.uint64(shift)) & np.uint64(0xFFFF) == digit:
+            gathered[j] = keys[i]
+            j += 1
+    return gathered
+
+
+@njit(cache=True)
+def _column_histograms(bits):
+    # counts of the leading 16 key bits of every column, in one pass over the rows
+    counts = np.zeros((bits.shape[1], 2**16), dtype=np.int64)
+    for i in range(bits.shape[0]):
+        for column in range(bits.shape[1]):
+            counts[column, _radix_key(bits[i, column]) >> np.uint64(48)] += 1
+    return counts
+
+
+@njit(cache=True)
+def _column_gather(bits, slots, slot_starts):
+    # keys of every column whose leading digit has a slot, grouped by slot
+    positions = slot_starts[:-1].copy()
+    gathered = np.empty(slot_starts[-1], dtype=np.uint64)
+    for i in range(bits.shape[0]):
+        for column in range(bits.shape[1]):
+            key = _radix_key(bits[i, column])
+            slot = slots[column, key >> np.uint64(48)]
+            if slot >= 0:
+                gathered[positions[slot]] = key
+                positions[slot] += 1
+    return gathered
+
+
+def _keys_to_floats(keys):
+    bits = np.where(keys >> np.uint64(63), keys & ~_SIGN_BIT, ~keys)
+    return bits.view(np.float64)
+
+
+def _select_keys(keys, ranks, shift):
+    # np.sort(keys)[ranks] of keys sharing all digits above `shift`
+    selected = np.empty(len(ranks), dtype=np.uint64)
+    pending = [(keys, np.arange(len(ranks)), ranks, shift)]
+    while pending:
+        keys, index, local_ranks, shift = pending.pop()
+        if shift < 0 or len(keys) <= SELECTION_SORT_SIZE:
+            selected[index] = np.sort(keys)[local_ranks]
+            continue
+
+        counts = _radix_histogram(keys, shift)
+        ends = np.cumsum(counts)
+        digits = np.searchsorted(ends, local_ranks, side='right')
+        for digit in np.unique(digits):
+            in_digit = digits == digit
+            pending.append((_radix_gather(keys, shift, np.uint64(digit), counts[digit]), index[in_digit],
+                            local_ranks[in_digit] - (ends[digit] - counts[digit]), shift - 16))
+    return selected
+
+
+def column_order_statistics(data, ranks):
+    """``np.sort(data[:, column])[ranks[column]]`` for every column.
+
+    An MSD radix selection over order preserving 64-bit keys (NaNs last,
+    as in np.sort). The first pass counts the leading 16 key bits of all
+    columns at once and the second gathers only the keys sharing a leading
+    digit with a requested rank, so the data is read twice row by row and
+    never sorted or copied; the candidates are refined by further 16-bit
+    digits until they are few enough to sort.
+
+    Parameters
+    ----------
+    data : 2d float64 numpy array [N_values,N_columns], may be a strided view
+    ranks : sequence with a 1d int array of 0-based ranks per column
+
+    Returns
+    -------
+    list of 1d numpy arrays with the values at the ranks of each column
+    """
+    ranks = [np.asarray(column_ranks, dtype=np.int64) for column_ranks in ranks]
+    bits = data.view(np.uint64)
+    counts = _column_histograms(bits)
+    ends = np.cumsum(counts, axis=1)
+
+    # one slot per (column, leading digit) holding a requested rank
+    slots = np.full(counts.shape, -1, dtype=np.int64)
+    slot_ranks, slot_sizes = [], []
+    for column, column_ranks in enumerate(ranks):
+        digits = np.searchsorted(ends[column], column_ranks, side='right')
+        for digit in np.unique(digits):
+            slots[column, digit] = len(slot_ranks)
+            slot_ranks.append((column, digits == digit, column_ranks[digits == digit] - (ends[column, digit] - counts[column, digit])))
+            slot_sizes.append(counts[column, digit])
+    slot_starts = np.concatenate([[0], np.cumsum(slot_sizes, dtype=np.int64)])
+    gathered = _column_gather(bits, slots, slot_starts)
+
+    selected = [np.empty(len(column_ranks)) for column_ranks in ranks]
+    for slot, (column, in_slot, local_ranks) in enumerate(slot_ranks):
+        keys = gathered[slot_starts[slot]:slot_starts[slot + 1]]
+        selected[column][in_slot] = _keys_to_floats(_select_keys(keys, local_ranks, 32))
+    return selected
+
+
+def sketch_columns(data, sketch_size=DEFAULT_SKETCH_SIZE, chunk_size=SKETCH_CHUNK_SIZE):
+    """One QuantileSketch per column of data [N_values,N_columns], fed in row chunks."""
+    sketches = [QuantileSketch(sketch_size) for _ in range(data.shape[1])]
+    for start in range(0, len(data), chunk_size):
+        for column, sketch in enumerate(sketches):
+            sketch.update(data[start:start + chunk_size, column])
+    return sketches
+
+
+def equi_depth_ranks(n_values, alphabet_size):
+    """Ranks of the sorted values picked as equi-depth breakpoints.
+
+    The bin index is accumulated in floating point and truncated, as the
+    original per-breakpoint loops did.
+    """
+    return np.cumsum(np.full(alphabet_size - 1, n_values / alphabet_size)).astype(np.int64)
+
+
+def learn_breakpoints(data, alphabet_size, binning_method="equi-depth", decimals=None, sketch_size=None):
+    """Interior breakpoints of every column.
+
+    Exact equi-depth breakpoints are ``np.sort(column)[ranks]`` as found by
+    ``column_order_statistics``. Rounding is monotone, so rounding the
+    selected values gives the same breakpoints as rounding all values before
+    selecting, without a rounded copy of the data.
+
+    Parameters
+    ----------
+    data : 2d numpy array [N_values,N_columns], or list of QuantileSketch
+        (one per column)
+    alphabet_size : int, or sequence of int with one alphabet size per column
+    binning_method : {"equi-depth", "equi-width"}
+    decimals : int, optional, number of decimals the values are rounded to
+    sketch_size : int, optional, approximate the columns of an array with
+        QuantileSketch(sketch_size) instead of exact selection
+
+    Returns
+    -------
+    list of 1d numpy arrays, alphabet_size - 1 increasing breakpoints per column
+    """
+    if binning_method not in ("equi-depth", "equi-width"):
+        raise ValueError("binning_method must be 'equi-depth' or 'equi-width', got '{}'".format(binning_method))
+
+    if isinstance(data, list):
+        sketches = data
+    elif sketch_size is not None:
+        sketches = sketch_columns(data, sketch_size)
+    else:
+        sketches = None
+    n_columns = len(sketches) if sketches is not None else data.shape[1]
+    if np.ndim(alphabet_size) == 0:
+        alphabet_size = [alphabet_size] * n_columns
+
+    def rounded(values):
+        return values if decimals is None else np.round(values, decimals)
+
+    if sketches is None and binning_method == "equi-depth":
+        ranks = [equi_depth_ranks(len(data), alphabet_size[column]) for column in range(n_columns)]
+        selected = column_order_statistics(np.asarray(data, dtype=np.float64), ranks)
+
+    breakpoints = []
+    for column in range(n_columns):
+        column_alphabet_size = alphabet_size[column]
+        if binning_method == "equi-depth":
+            if sketches is not None:
+                ranks = equi_depth_ranks(sketches[column].n, column_alphabet_size)
+                breakpoints.append(rounded(sketches[column].value_at_rank(ranks)))
+            else:
+                breakpoints.append(rounded(selected[column]))
+        else:
+            if sketches is not None:
+                low, high = rounded(sketches[column].min), rounded(sketches[column].max)
+            else:
+                low, high = rounded(data[:, column].min()), rounded(data[:, column].max())
+            width = (high - low) / column_alphabet_size
+            breakpoints.append(np.arange(1, column_alphabet_size) * width + low)
+    return breakpoints
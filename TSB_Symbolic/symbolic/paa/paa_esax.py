@@ -2,6 +2,8 @@ import numpy as np
 import pandas as pd
 import ruptures as rpt
 
+from .paa_numba import paa_frames, paa_segments
+
 class PAAESAX():
     def __init__(self,
             num_intervals=8
@@ -24,118 +26,48 @@ class PAAESAX():
 
         Returns
         -------
-        dims: Pandas data frame with first dimension in column zero,
-              second in column one etc.
+        2d numpy array [n_instances, 3*num_intervals], the (min, max, mean)
+        of every frame in the order they occur
         """
-        # Get information about the dataframe
-        # num_atts = len(X.iloc[0, 0])
-        # col_names = X.columns
-
-        # Check the parameters are appropriate
-        # self._check_parameters(num_atts)
-
-        # On each dimension, perform PAA
-        dataFrames = []
-        # for x in col_names:
-        dataFrames.append(self._perform_paa_along_dim(X))
-
-        # Combine the dimensions together
-        result = pd.concat(dataFrames, axis=1, sort=False)
-        #result.columns = col_names
-
-        return result
+        return self._perform_paa_along_dim(X)
 
     def _perform_paa_along_dim(self, X):
-        # X = from_nested_to_2d_array(X, return_numpy=True)
+        # frames and their sample ranges come from the shared PAA kernels, the
+        # min/max of every segment are taken for all windows at once
+        X = np.asarray(X, dtype=np.float64)
         num_atts = X.shape[1]
         num_insts = X.shape[0]
-        dims = pd.DataFrame()
-        data = []
-
-        for i in range(num_insts):
-            series = X[i,:]
-
-            frames = []
-            current_frame = 0
-            current_frame_size = 0
-            frame_length = num_atts / self.num_intervals
-            frame_sum = 0
-
-            max_val, min_val, mid_val = -1e6, 1e6, -1e6
-            max_pt, min_pt, mid_pt = -1, -1, -1
-            s_pt = 0
-
-
-            
-            for n in range(num_atts):
-                remaining = frame_length - current_frame_size
-                # print(remaining)
-                if remaining > 1:
-                    frame_sum += series[n]
-                    current_frame_size += 1
-                else:
-                    frame_sum += remaining * series[n]
-                    current_frame_size += remaining
-
-                # compare max and min
-                if np.nan_to_num(series[n]) > max_val:
-                    max_val = np.nan_to_num(series[n])
-                    max_pt = n
-
-                if np.nan_to_num(series[n]) < min_val:
-                    min_val = np.nan_to_num(series[n])
-                    min_pt = n 
-
-                if current_frame_size == frame_length:
-                    
-                    mid_pt = (s_pt + n) / 2
-                    mid_val = frame_sum / frame_length
-                    
-                    # print(current_frame, series[n], mid_pt, min_pt, max_pt)
-                    sort_list = self._sort_order(min_val, max_val, mid_val, min_pt, max_pt, mid_pt)
-                    # add num
-                    frames.extend(sort_list)
-                    current_frame += 1
-
-
-                    # reset
-                    frame_sum = (1 - remaining) * series[n]
-                    current_frame_size = 1 - remaining
-                    
-                    max_val, min_val, mid_val = -1e6, 1e6, -1e6
-                    max_pt, min_pt, mid_pt = -1, -1, -1
-
-                    s_pt = n+1
-
-            # if the last frame was lost due to double imprecision
-            if current_frame == self.num_intervals - 1:
-                
-                mid_pt = (s_pt + n) / 2
-                # print(mid_pt, "llllll")
-                mid_val = frame_sum / frame_length
-
-                sort_list = self._sort_order(min_val, max_val, mid_val, min_pt, max_pt, mid_pt)
-                frames.extend(sort_list)
-                # frames.append(frame_sum / frame_length)
-                
-            
-            data.append(pd.Series(frames))
-
-        dims[0] = data
-
-        return dims
+
+        bounds, _ = paa_segments(num_atts, self.num_intervals)
+        mid_vals = paa_frames(np.ascontiguousarray(X), self.num_intervals)
+        values = np.nan_to_num(X)
+
+        data = np.zeros((num_insts, 3 * (len(bounds) - 1)))
+        for j in range(len(bounds) - 1):
+            segment = values[:, bounds[j]:bounds[j + 1]]
+            min_pt = segment.argmin(axis=1)
+            max_pt = segment.argmax(axis=1)
+            min_val = segment[np.arange(num_insts), min_pt]
+            max_val = segment[np.arange(num_insts), max_pt]
+            mid_pt = (bounds[j] + bounds[j + 1] - 1) / 2
+            data[:, 3 * j:3 * j + 3] = self._sort_order(
+                min_val, max_val, mid_vals[:, j], bounds[j] + min_pt, bounds[j] + max_pt, mid_pt)
+
+        return data
 
 
     def _sort_order(self, min_val, max_val, mid_val, min_pt, max_pt, mid_pt):
-        
-        assert min_pt > -1 and max_pt > -1 and mid_pt > -1
-        if min_pt == max_pt  or min_pt == mid_pt or max_pt == mid_pt:
-            return [mid_val, min_val, max_val]
+        # min, max and mean of each row in the order of their positions,
+        # [mean, min, max] if two positions coincide
+        pt_arr = np.stack(np.broadcast_arrays(min_pt, max_pt, mid_pt), axis=1).astype(np.float64)
+        val_arr = np.stack([min_val, max_val, mid_val], axis=1)
+
+        ind = np.argsort(pt_arr, axis=1)
+        val_sort = np.take_along_axis(val_arr, ind, axis=1)
 
-        pt_arr = np.array([min_pt, max_pt, mid_pt])
-        ind = np.argsort(pt_arr)
-        val_sort = np.array([min_val, max_val, mid_val])[ind]
-        return list(val_sort)
+        tie = (pt_arr[:, 0] == pt_arr[:, 1]) | (pt_arr[:, 0] == pt_arr[:, 2]) | (pt_arr[:, 1] == pt_arr[:, 2])
+        val_sort[tie] = val_arr[tie][:, [2, 0, 1]]
+        return val_sort
 
 
 
@@ -183,5 +115,4 @@ if __name__ == '__main__':
     # X = np.random.rand(1,9)
     print(X.shape, X)
     result = paae.transform(X)
-    result = np.asarray([a.values for a in result.iloc[:,0]])
     print(result)
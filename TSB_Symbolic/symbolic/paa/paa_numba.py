@@ -1,63 +1,282 @@
-import pandas as pd
+"""Compiled PAA kernels shared by SAX and its variants.
+
+A window of n samples is cut into num_intervals frames of n/num_intervals
+samples. When the frame length is not an integer, a sample that straddles a
+frame boundary contributes to both frames in proportion to its overlap (the
+fractional-frame walk of sktime's PAA, ``_paa_window``).
+
+``rolling_paa`` reads the frame means of every sliding window off prefix sums
+of the series, so all windows cost O(n_timepoints * num_intervals) instead of
+O(n_timepoints * window_size). ``paa_segments`` gives the samples each frame
+of the walk owns, which the variants use for their per-segment features
+(``template_matches`` counts the template matches of SAX-VFD's entropies).
+"""
 import numpy as np
 
 from numba import njit, prange
 
-@njit(parallel=True,cache=True)
-def paa_whole_dataset(X,num_intervals):
-    num_atts = X.shape[2]
-    num_win = X.shape[1]
+# multiple of the float64 machine epsilon used to bound the rounding error of
+# the prefix sums, frame means closer than that to a breakpoint are recomputed
+ROUNDING_SLACK = 4 * np.finfo(np.float64).eps
+
+
+@njit(cache=True)
+def _paa_window(window, num_intervals, out):
+    # PAA of one window, sequential frame sums when the frames are whole and
+    # the fractional-frame walk otherwise
+    num_atts = len(window)
+
+    if num_atts % num_intervals == 0:
+        frame_length = num_atts // num_intervals
+        for i in range(num_intervals):
+            frame_sum = 0.0
+            for t in range(i * frame_length, (i + 1) * frame_length):
+                frame_sum += window[t]
+            out[i] = frame_sum / frame_length
+        return
+
+    current_frame = 0
+    current_frame_size = 0.0
+    frame_length = num_atts / num_intervals
+    frame_sum = 0.0
+
+    for n in range(num_atts):
+        remaining = frame_length - current_frame_size
+
+        if remaining > 1:
+            frame_sum += window[n]
+            current_frame_size += 1
+        else:
+            frame_sum += remaining * window[n]
+            current_frame_size += remaining
+
+        if current_frame_size == frame_length:
+            out[current_frame] = frame_sum / frame_length
+            current_frame += 1
+
+            frame_sum = (1 - remaining) * window[n]
+            current_frame_size = 1 - remaining
+
+    # if the last frame was lost due to double imprecision
+    if current_frame == num_intervals - 1:
+        out[current_frame] = frame_sum / frame_length
+
+
+@njit(cache=True)
+def paa_segments(window_size, num_intervals):
+    """Samples owned by each frame of the fractional-frame walk.
+
+    Frame j owns samples ``bounds[j]:bounds[j+1]`` of a window, i.e. the
+    samples the walk visits until the frame is complete (the straddling
+    sample at its end included, the one at its start not). num_intervals may
+    be a float, as for SAX-VFD.
+
+    Returns
+    -------
+    bounds : 1d int64 array [N_frames+1]
+    n_closed : int, number of frames the walk completes, the rest (at most
+        the last one) was lost due to double imprecision and closed at the
+        end of the window
+    """
+    bounds = np.zeros(window_size + 1, dtype=np.int64)
+    current_frame = 0
+    current_frame_size = 0.0
+    frame_length = window_size / num_intervals
+
+    for n in range(window_size):
+        remaining = frame_length - current_frame_size
+
+        if remaining > 1:
+            current_frame_size += 1
+        else:
+            current_frame_size += remaining
+
+        if current_frame_size == frame_length:
+            current_frame += 1
+            bounds[current_frame] = n + 1
+            current_frame_size = 1 - remaining
+
+    n_closed = current_frame
+    if current_frame == num_intervals - 1:
+        current_frame += 1
+        bounds[current_frame] = window_size
+
+    return bounds[:current_frame + 1].copy(), n_closed
+
+
+@njit(cache=True)
+def _near_breakpoint(value, breakpoints, tol):
+    # whether a breakpoint lies within tol of value
+    letter = np.searchsorted(breakpoints, value)
+    if letter < len(breakpoints) and breakpoints[letter] - value <= tol:
+        return True
+    return letter > 0 and value - breakpoints[letter - 1] <= tol
+
+
+@njit(cache=True)
+def near_breakpoints(values, breakpoints, tol):
+    """Rows of values [N_rows,N] with a value within tol [N_rows] of a breakpoint."""
+    near = np.zeros(values.shape[0], dtype=np.bool_)
+    for n in range(values.shape[0]):
+        for j in range(values.shape[1]):
+            if _near_breakpoint(values[n, j], breakpoints, tol[n]):
+                near[n] = True
+                break
+    return near
+
+
+@njit(cache=True)
+def _rolling_paa_series(x, window_size, num_intervals, breakpoints, out):
+    # frame means of all windows of one series into out [N_windows,num_intervals];
+    # a mean within rounding error of one of the (possibly empty) breakpoints
+    # is recomputed by _paa_window, so digitizing it gives the PAA's letter
+    series_length = len(x)
+    num_windows = series_length - window_size + 1
+    frame_length = window_size / num_intervals
+
+    # frame j covers [j * frame_length, (j + 1) * frame_length) of the window,
+    # the sample under a boundary is split by the weight of its covered part
+    offsets = np.zeros(num_intervals + 1, dtype=np.int64)
+    weights = np.zeros(num_intervals + 1)
+    for j in range(num_intervals + 1):
+        if window_size % num_intervals == 0:
+            offsets[j] = j * (window_size // num_intervals)
+        else:
+            u = j * frame_length
+            if u < window_size:
+                offsets[j] = int(np.floor(u))
+                weights[j] = u - offsets[j]
+            else:
+                offsets[j] = window_size
+
+    # the prefix sums restart every window_size windows, which keeps their
+    # rounding error local to the block
+    prefix = np.zeros(2 * window_size)
+    abs_prefix = np.zeros(2 * window_size)
+    check = len(breakpoints) > 0
+    for block_start in range(0, num_windows, window_size):
+        block_end = min(block_start + window_size, num_windows)
+        for t in range(block_end - block_start + window_size - 1):
+            prefix[t + 1] = prefix[t] + x[block_start + t]
+            abs_prefix[t + 1] = abs_prefix[t] + abs(x[block_start + t])
+
+        for n in range(block_start, block_end):
+            walked = False
+            for j in range(num_intervals):
+                start = n - block_start + offsets[j]
+                end = n - block_start + offsets[j + 1]
+                frame_sum = prefix[end] - prefix[start]
+                if weights[j] > 0:
+                    frame_sum -= weights[j] * x[block_start + start]
+                last = end
+                if weights[j + 1] > 0:
+                    frame_sum += weights[j + 1] * x[block_start + end]
+                    last = end + 1
+                mean = frame_sum / frame_length
+
+                if check:
+                    # bound on the rounding error of the two prefix sums the frame
+                    # reads, a sum of k terms is off by at most ~k*eps*sum(|terms|)
+                    tol = ROUNDING_SLACK * (last * abs_prefix[last] + start * abs_prefix[start]) / frame_length
+                    if _near_breakpoint(mean, breakpoints, tol):
+                        walked = True
+                out[n, j] = mean
+
+            if walked:
+                # too close to call, compute the window as the PAA does
+                _paa_window(x[n:n + window_size], num_intervals, out[n])
+
+
+@njit(parallel=True, cache=True)
+def rolling_paa(X, window_size, num_intervals):
+    """PAA of all sliding windows of X from prefix sums.
+
+    Parameters
+    ----------
+    X : 2d numpy array [N_instances,N_timepoints]
+    window_size : int
+    num_intervals : int, number of frames per window
+
+    Returns
+    -------
+    3d numpy array [N_instances,N_windows,num_intervals], equal to
+    ``paa_whole_dataset(sliding_windows(X, window_size), num_intervals)`` up
+    to rounding
+    """
+    n_instances, series_length = X.shape
+    num_windows = series_length - window_size + 1
+    paa_all = np.zeros((n_instances, num_windows, num_intervals))
+    no_breakpoints = np.empty(0)
+    for i in prange(n_instances):
+        _rolling_paa_series(X[i], window_size, num_intervals, no_breakpoints, paa_all[i])
+    return paa_all
+
+
+@njit(parallel=True, cache=True)
+def paa_frames(X, num_intervals):
+    """PAA of every row of a 2d array [N_rows,N_timepoints]."""
     num_insts = X.shape[0]
-    paa_all = np.zeros((num_insts,num_win,num_intervals))
+    data = np.zeros((num_insts, num_intervals))
     for i in prange(num_insts):
-        x = X[i,:]
-        paa_value = _perform_paa_along_dim_numba(x,num_intervals)
-        paa_all[i,:,:] = paa_value
-    return paa_all
+        _paa_window(X[i], num_intervals, data[i])
+    return data
+
 
 @njit(cache=True)
-def _perform_paa_along_dim_numba(X,num_intervals):
-    # X = from_nested_to_2d_array(X, return_numpy=True)
-    num_atts = X.shape[1]
-    num_insts = X.shape[0]
-    # dims = pd.DataFrame()
-    # paa_output = np.zeros((num_insts))
-    data = np.zeros((num_insts,num_intervals))
-
-    for i in range(num_insts):
-        series = X[i,:]
-
-        frames = []
-        current_frame = 0
-        current_frame_size = 0
-        frame_length = num_atts / num_intervals
-        frame_sum = 0
-
-        if num_atts % num_intervals == 0:
-            series_split = np.array_split(series,num_intervals)
-            frames = [np.mean(interval) for interval in series_split]
-        else:
+def paa_whole_dataset(X, num_intervals):
+    """PAA of already materialized windows [N_instances,N_windows,N_timepoints].
+
+    Prefer ``rolling_paa`` on the series for sliding windows.
+    """
+    num_insts, num_win, num_atts = X.shape
+    paa_all = paa_frames(np.ascontiguousarray(X).reshape(num_insts * num_win, num_atts), num_intervals)
+    return paa_all.reshape(num_insts, num_win, num_intervals)
 
-            for n in range(num_atts):
-                remaining = frame_length - current_frame_size
 
-                if remaining > 1:
-                    frame_sum += series[n]
-                    current_frame_size += 1
-                else:
-                    frame_sum += remaining * series[n]
-                    current_frame_size += remaining
+@njit(parallel=True, cache=True)
+def template_matches(segs, m, tol):
+    """Matches of the length-m and length-(m+1) templates of every row of segs.
 
-                if current_frame_size == frame_length:
-                    frames.append(frame_sum / frame_length)
-                    current_frame += 1
+    The templates of a row are its subsequences of a given length, two
+    templates match when their Chebyshev distance is at most tol of the row
+    (a template matches itself unless tol is NaN). Both lengths are counted
+    in one pass, a pair that does not match over m samples does not match
+    over m+1 either. Used for the approximate and sample entropy of SAX-VFD.
 
-                    frame_sum = (1 - remaining) * series[n]
-                    current_frame_size = 1 - remaining
+    Parameters
+    ----------
+    segs : 2d numpy array [N_rows,N]
+    m : int, template length
+    tol : 1d numpy array [N_rows]
 
-            # if the last frame was lost due to double imprecision
-            if current_frame == num_intervals - 1:
-                frames.append(frame_sum / frame_length)
-        data[i,:] = np.array(frames)
+    Returns
+    -------
+    counts : 2d numpy array [N_rows,max(N-m+1,0)], number of length-m
+        templates matching each length-m template
+    counts_next : 2d numpy array [N_rows,max(N-m,0)], same for length m+1
+    """
+    n_rows, n = segs.shape
+    n_templates = max(n - m + 1, 0)
+    n_templates_next = max(n - m, 0)
+    counts = np.zeros((n_rows, n_templates))
+    counts_next = np.zeros((n_rows, n_templates_next))
+    for r in prange(n_rows):
+        x = segs[r]
+        for i in range(n_templates):
+            for j in range(i, n_templates):
+                match = True
+                for k in range(m):
+                    if not abs(x[i + k] - x[j + k]) <= tol[r]:
+                        match = False
+                        break
+                if not match:
+                    continue
+                counts[r, i] += 1
+                if j != i:
+                    counts[r, j] += 1
 
-    return data
\ No newline at end of file
+                if j < n_templates_next and abs(x[i + m] - x[j + m]) <= tol[r]:
+                    counts_next[r, i] += 1
+                    if j != i:
+                        counts_next[r, j] += 1
+    return counts, counts_next
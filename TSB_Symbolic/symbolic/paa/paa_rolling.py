@@ -0,0 +1,55 @@
+"""PAA of z-normalized sliding windows without materializing the windows.
+
+The z-normalized window is ``(window - mean) / std``, so its PAA is the PAA
+of the raw window normalized the same way. The transformers of the SAX
+variants read the raw PAA off prefix sums (``rolling_paa``) and the window
+statistics off running sums (``rolling_mean_std``) and only z-normalize the
+few windows where that could change a letter: flat windows, whose zscore is
+rounding noise, and windows with a value within rounding error of a
+breakpoint. Those are recomputed from the explicitly z-normalized windows, so
+the letters are the same as z-normalizing every window first.
+"""
+import numpy as np
+
+from .paa_numba import rolling_paa
+from ...util.windowing import rolling_mean_std, flat_windows
+
+# multiple of the float64 machine epsilon in the (loose) bound on the rounding
+# error of an analytically z-normalized frame mean
+ZNORM_SLACK = 64 * np.finfo(np.float64).eps
+
+
+def znorm_rolling_paa(x, window_size, num_intervals):
+    """PAA of the z-normalized sliding windows of one series.
+
+    Parameters
+    ----------
+    x : 1d numpy array [N_timepoints]
+    window_size : int
+    num_intervals : int, number of frames per window
+
+    Returns
+    -------
+    frames : 2d numpy array [N_windows,num_intervals]
+    means : 1d numpy array [N_windows], window means
+    stds : 1d numpy array [N_windows], window stds (1 on flat windows)
+    tol : 1d numpy array [N_windows], bound on the difference between frames
+        and the PAA of the z-normalized window, inf on flat windows
+    """
+    x = np.ascontiguousarray(x, dtype=np.float64).reshape(1, -1)
+    means, stds = rolling_mean_std(x, window_size)
+    means, stds = means[0], stds[0]
+    flat = flat_windows(means, stds)
+    stds[flat] = 1.0
+
+    frames = rolling_paa(x, window_size, num_intervals)[0]
+    frames -= means[:, None]
+    frames /= stds[:, None]
+
+    # the sums run over up to two windows of samples, each of magnitude at
+    # most |mean| + sqrt(window_size) * std
+    frame_length = window_size / num_intervals
+    magnitude = np.abs(means) / stds + np.sqrt(window_size)
+    tol = ZNORM_SLACK * window_size * (window_size / frame_length + 4) * magnitude * (1 + np.abs(frames).max(axis=1))
+    tol[flat] = np.inf
+    return frames, means, stds, tol
@@ -2,6 +2,10 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from .paa_numba import paa_frames, paa_segments, near_breakpoints
+from .paa_rolling import znorm_rolling_paa
+from ...util.windowing import sliding_windows, take_windows
+
 class PAASAXDR():
     def __init__(self,
             num_intervals=8
@@ -14,145 +18,168 @@ class PAASAXDR():
 
     # todo: looks like this just loops over series instances
     # so should be refactored to work on Series directly
-    def transform(self, X, y=None):
+    def transform(self, X, y=None, seg_stats=None):
         """Transform data.
 
         Parameters
         ----------
         X : nested numpy array of shape [n_instances, n_timepoints]
             Nested dataframe with multivariate time-series in cells.
+        seg_stats : tuple of four lists (cav_mean, cav_min, vex_mean, vex_max),
+            optional accumulator of per-chunk arrays shared across calls so
+            that the returned dr_stats cover every chunk of windows
+            transformed so far.
 
         Returns
         -------
-        dims: Pandas data frame with first dimension in column zero,
-              second in column one etc.
+        frames : 2d numpy array [n_instances, num_intervals], PAA
+        direct_feats : 2d int numpy array [n_instances, num_intervals], 0
+            convex, 1 flat and 2 concave segments
+        dr_stats : tuple of the mean cav_mean, cav_min, vex_mean and vex_max
         """
-        # Get information about the dataframe
-        # num_atts = len(X.iloc[0, 0])
-        # col_names = X.columns
-
-        # Check the parameters are appropriate
-        # self._check_parameters(num_atts)
+        return self._perform_paa_along_dim(X, seg_stats)
 
-        # On each dimension, perform PAA
-        dataFrames = []
-        # for x in col_names:
-        dataFrames.append(self._perform_paa_along_dim(X)[0])
+    def transform_series(self, x, window_size, breakpoints, seg_stats=None):
+        """Transform all z-normalized sliding windows of one series.
 
-        # Combine the dimensions together
-        result = pd.concat(dataFrames, axis=1, sort=False)
-        #result.columns = col_names
+        Same output as ``transform`` on the z-normalized windows, computed
+        from the raw series: the PAA and the segment means, minima and maxima
+        are normalized with the rolling window mean and std, the slope signs
+        do not change under z-normalization. Windows with a frame within
+        rounding error of a breakpoint (or flat windows) are recomputed from
+        the z-normalized windows, so their letters and direct features are
+        the same; dr_stats agree up to rounding.
 
-        return result, self._perform_paa_along_dim(X)[1], self._perform_paa_along_dim(X)[2]
+        Parameters
+        ----------
+        x : 1d numpy array [n_timepoints]
+        window_size : int
+        breakpoints : list, breakpoints of the frames
+        seg_stats : see ``transform``
 
-    def _perform_paa_along_dim(self, X):
-        # X = from_nested_to_2d_array(X, return_numpy=True)
+        Returns
+        -------
+        see ``transform``, with one row per window
+        """
+        x = np.asarray(x, dtype=np.float64)
+        frames, means, stds, tol = znorm_rolling_paa(x, window_size, self.num_intervals)
+        bounds, n_closed = paa_segments(window_size, self.num_intervals)
+        num_windows = len(frames)
+        starts = np.arange(num_windows)
+
+        indices = np.flatnonzero(near_breakpoints(frames, np.asarray(breakpoints, dtype=np.float64), tol))
+        if len(indices):
+            exact = self._segment_features(take_windows(x, window_size, indices, znorm=True))
+            frames[indices] = exact[0]
+
+        # rising and falling steps of the series, counted per segment
+        slope = np.diff(x)
+        rising = np.concatenate([[0], np.cumsum(slope > 0)])
+        falling = np.concatenate([[0], np.cumsum(slope < 0)])
+
+        if seg_stats is None:
+            seg_stats = ([], [], [], [])
+        cav_mean, cav_min, vex_mean, vex_max = seg_stats
+
+        # one segment at a time, so only [n_windows] vectors are alive; the
+        # stats are pooled segment by segment, which only changes their rounding
+        direct_feats = np.zeros((num_windows, len(bounds) - 1), dtype=np.int64)
+        for j in range(len(bounds) - 1):
+            lo, hi = bounds[j], bounds[j + 1]
+            pos_slope = rising[starts + hi - 1] - rising[starts + lo]
+            neg_slope = falling[starts + hi - 1] - falling[starts + lo]
+            feats = self._production_rule(pos_slope, neg_slope, hi - lo)
+
+            segments = sliding_windows(x[lo:lo + num_windows + hi - lo - 1], hi - lo)
+            seg_mean = (segments.mean(axis=1) - means) / stds
+            seg_min = (segments.min(axis=1) - means) / stds
+            seg_max = (segments.max(axis=1) - means) / stds
+
+            if len(indices):
+                for values, exact_values in zip((feats, seg_mean, seg_min, seg_max), exact[1:]):
+                    values[indices] = exact_values[:, j]
+            direct_feats[:, j] = feats
+
+            # a frame lost due to double imprecision does not count in the stats
+            if j < n_closed:
+                cav_mean.append(seg_mean[feats == 2])
+                cav_min.append(seg_min[feats == 2])
+                vex_mean.append(seg_mean[feats == 0])
+                vex_max.append(seg_max[feats == 0])
+
+        return frames, direct_feats, self._dr_stats(seg_stats)
+
+    def _perform_paa_along_dim(self, X, seg_stats=None):
+        X = np.asarray(X, dtype=np.float64)
+        frames, direct_feats, seg_mean, seg_min, seg_max = self._segment_features(X)
+        _, n_closed = paa_segments(X.shape[1], self.num_intervals)
+
+        dr_stats = self._pool_stats(direct_feats, seg_mean, seg_min, seg_max, n_closed, seg_stats)
+        return frames, direct_feats, dr_stats
+
+    def _segment_features(self, X):
+        # frames and their sample ranges come from the shared PAA kernels, the
+        # direct features of every segment are computed for all windows at once
         num_atts = X.shape[1]
         num_insts = X.shape[0]
-        dims = pd.DataFrame()
-        data = []
-
-        direct_feats_list = []
-
-        vex_max, vex_mean = [], []
-        cav_min, cav_mean = [], []
-
-        for i in range(num_insts):
-            series = X[i,:]
-
-            frames = []
-            current_frame = 0
-            current_frame_size = 0
-            frame_length = num_atts / self.num_intervals
-            frame_sum = 0
-
-            direct_feats = []
-            seg_list = []
-
-            for n in range(num_atts):
-                remaining = frame_length - current_frame_size
-
-                # add series item
-                seg_list.append(series[n])
-
-                if remaining > 1:
-                    frame_sum += series[n]
-                    current_frame_size += 1
-                else:
-                    frame_sum += remaining * series[n]
-                    current_frame_size += remaining
-
-                if current_frame_size == frame_length:
-                    frames.append(frame_sum / frame_length)
-                    current_frame += 1
 
-                    frame_sum = (1 - remaining) * series[n]
-                    current_frame_size = 1 - remaining
-
-
-                    # direct representation
-                    dr_feat = self._direct_feat(seg_list)
-                    direct_feats.append(dr_feat)
-
-                    if dr_feat == 2:
-                        cav_mean.append(np.mean(seg_list))
-                        cav_min.append(np.min(seg_list))
-                    elif dr_feat == 0:
-
-                        vex_mean.append(np.mean(seg_list))
-                        vex_max.append(np.max(seg_list))
-
-                    
-                    # reset seg_list
-                    seg_list = []
-
-            # if the last frame was lost due to double imprecision
-            if current_frame == self.num_intervals - 1:
-                frames.append(frame_sum / frame_length)
-                direct_feats.append(self._direct_feat(seg_list))
-                seg_list = []
-
-            data.append(pd.Series(frames))
-            direct_feats_list.append(direct_feats)
-
-
-        dims[0] = data
-        
+        bounds, _ = paa_segments(num_atts, self.num_intervals)
+        frames = paa_frames(np.ascontiguousarray(X), self.num_intervals)
+
+        n_segments = len(bounds) - 1
+        direct_feats = np.zeros((num_insts, n_segments), dtype=np.int64)
+        seg_mean = np.zeros((num_insts, n_segments))
+        seg_min = np.zeros((num_insts, n_segments))
+        seg_max = np.zeros((num_insts, n_segments))
+        for j in range(n_segments):
+            segment = X[:, bounds[j]:bounds[j + 1]]
+            direct_feats[:, j] = self._direct_feat(segment)
+            seg_mean[:, j] = segment.mean(axis=1)
+            seg_min[:, j] = segment.min(axis=1)
+            seg_max[:, j] = segment.max(axis=1)
+
+        return frames, direct_feats, seg_mean, seg_min, seg_max
+
+    def _pool_stats(self, direct_feats, seg_mean, seg_min, seg_max, n_closed, seg_stats=None):
+        if seg_stats is None:
+            seg_stats = ([], [], [], [])
+        cav_mean, cav_min, vex_mean, vex_max = seg_stats
+
+        # a frame lost due to double imprecision does not count in the stats,
+        # the segments are pooled window by window
+        closed = direct_feats[:, :n_closed]
+        cav_mean.append(seg_mean[:, :n_closed][closed == 2])
+        cav_min.append(seg_min[:, :n_closed][closed == 2])
+        vex_mean.append(seg_mean[:, :n_closed][closed == 0])
+        vex_max.append(seg_max[:, :n_closed][closed == 0])
+
+        return self._dr_stats(seg_stats)
+
+    def _dr_stats(self, seg_stats):
         # dr_stat
-        if len(cav_mean) == 0:
-            cav_mean = 0
-        if len(cav_min) == 0:
-            cav_min = 0
-        if len(vex_mean) == 0:
-            vex_mean = 0
-        if len(vex_max) == 0:
-            vex_max = 0
-
-        dr_stats = (np.mean(cav_mean), np.mean(cav_min), 
-                    np.mean(vex_mean), np.mean(vex_max))
-
-        return dims, direct_feats_list, dr_stats
+        cav_mean, cav_min, vex_mean, vex_max = (np.concatenate(stat) for stat in seg_stats)
+        return (np.mean(cav_mean) if len(cav_mean) else 0.0,
+                np.mean(cav_min) if len(cav_min) else 0.0,
+                np.mean(vex_mean) if len(vex_mean) else 0.0,
+                np.mean(vex_max) if len(vex_max) else 0.0)
 
     
 
     def _direct_feat(self, X):
+        # direct representation of the segments in the rows of X
 
-        N = len(X)
+        N = X.shape[1]
         
-        slope = np.array(X[1:]) - np.array(X[:-1])
-
-        pos_slope = np.sum(slope>0)
-        neg_slope = np.sum(slope<0)
-
-        # production rules
-        if pos_slope > (N / 2):
-            # concave
-            return 2
-        elif neg_slope > (N / 2):
-            # convex
-            return 0
-        else:
-            return 1
+        slope = X[:, 1:] - X[:, :-1]
+
+        pos_slope = np.sum(slope>0, axis=1)
+        neg_slope = np.sum(slope<0, axis=1)
+
+        return self._production_rule(pos_slope, neg_slope, N)
+
+    def _production_rule(self, pos_slope, neg_slope, N):
+        # concave, convex, otherwise flat
+        return np.where(pos_slope > (N / 2), 2, np.where(neg_slope > (N / 2), 0, 1))
 
 
 
@@ -1,7 +1,210 @@
 import numpy as np
-import pandas as pd
-# import tsfresh.feature_extraction
-from tsfresh.feature_extraction import feature_calculators
+
+from .paa_numba import paa_segments, template_matches
+from ...util.windowing import iter_window_chunks
+
+
+# The segment features, each computed for all rows of a 2d array of segments
+# [N_rows,seg_len] with the semantics of the per-series tsfresh / pandas
+# feature calculators they replace. The values agree with them up to
+# rounding (the benchmark of eval_runtime checks this with a tolerance),
+# except that skew and kurtosis of exactly constant segments are always 0,
+# where pandas' tolerance test sometimes returns rounding noise (see README).
+
+def _skew(segs):
+    # pandas.Series.skew(skipna=False), 0 for constant segments
+    count = np.float64(segs.shape[1])
+    adjusted = segs - segs.mean(axis=1, keepdims=True)
+    m2 = np.sum(adjusted ** 2, axis=1)
+    m3 = np.sum(adjusted ** 3, axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = (count * (count - 1) ** 0.5 / (count - 2)) * (m3 / np.power(m2, 1.5))
+    result[segs.max(axis=1) == segs.min(axis=1)] = 0
+    if count < 3:
+        result[:] = np.nan
+    return result
+
+
+def _kurtosis(segs):
+    # pandas.Series.kurtosis(), NaN are skipped, 0 for constant segments
+    mask = np.isnan(segs)
+    count = segs.shape[1] - mask.sum(axis=1).astype(np.float64)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(mask, 0, segs).sum(axis=1) / count
+    adjusted = np.where(mask, 0, segs - mean[:, None])
+    m2 = np.sum(adjusted ** 2, axis=1)
+    m4 = np.sum(adjusted ** 4, axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        adj = 3 * (count - 1) ** 2 / ((count - 2) * (count - 3))
+        numerator = count * (count + 1) * (count - 1) * m4
+        denominator = (count - 2) * (count - 3) * np.power(m2, 2)
+        result = numerator / denominator - adj
+    constant = np.where(mask, -np.inf, segs).max(axis=1) == np.where(mask, np.inf, segs).min(axis=1)
+    result[constant] = 0
+    result[count < 4] = np.nan
+    return result
+
+
+def _iqr(segs):
+    return np.percentile(segs, 75, axis=1) - np.percentile(segs, 25, axis=1)
+
+
+def _entropy(segs):
+    # PAASAXVFD.entropy: Shannon entropy of the distinct values (NaN count as
+    # one value, as in np.unique) normalized by log2 of the segment length
+    n_rows, seg_len = segs.shape
+    ordered = np.sort(segs, axis=1)
+    run_start = np.ones((n_rows, seg_len), dtype=bool)
+    run_start[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    run_start[:, 1:] &= ~(np.isnan(ordered[:, 1:]) & np.isnan(ordered[:, :-1]))
+
+    # every row opens a run, so the runs are the gaps between the run starts
+    starts = np.flatnonzero(run_start)
+    p = np.diff(np.append(starts, run_start.size)) / seg_len
+    terms = p * np.log2(p)
+
+    # sum the terms of the rows with the same number of distinct values
+    # together, as contiguous rows, so the sums round as np.sum on each row
+    n_distinct = run_start.sum(axis=1)
+    row_starts = np.cumsum(n_distinct) - n_distinct
+    total = np.empty(n_rows)
+    for k in np.unique(n_distinct):
+        rows = np.flatnonzero(n_distinct == k)
+        total[rows] = terms[row_starts[rows][:, None] + np.arange(k)].sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        norm = np.log2(seg_len)
+        result = np.where(total / norm == 0, 0.0, -total / norm)
+    if norm == 1:
+        result[:] = 0.0
+    return result
+
+
+def _binned_entropy(segs, max_bins=10):
+    # tsfresh binned_entropy: entropy of np.histogram(x, bins=max_bins)
+    n_rows, seg_len = segs.shape
+    first_edge = segs.min(axis=1)
+    last_edge = segs.max(axis=1)
+    if not (np.isfinite(first_edge).all() and np.isfinite(last_edge).all()):
+        has_nan = np.isnan(segs).any(axis=1)
+        result = np.full(n_rows, np.nan)
+        if not has_nan.all():
+            result[~has_nan] = _binned_entropy(segs[~has_nan], max_bins)
+        return result
+
+    flat = first_edge == last_edge
+    first_edge = np.where(flat, first_edge - 0.5, first_edge)
+    last_edge = np.where(flat, last_edge + 0.5, last_edge)
+    bin_edges = np.linspace(first_edge, last_edge, max_bins + 1, axis=1)
+
+    # bin index of every sample, corrected to the edges as np.histogram does
+    indices = ((segs - first_edge[:, None]) / (last_edge - first_edge)[:, None] * max_bins).astype(np.intp)
+    indices[indices == max_bins] -= 1
+    rows = np.arange(n_rows)[:, None]
+    indices[segs < bin_edges[rows, indices]] -= 1
+    indices[(segs >= bin_edges[rows, indices + 1]) & (indices != max_bins - 1)] += 1
+
+    hist = np.zeros((n_rows, max_bins), dtype=np.intp)
+    np.add.at(hist, (np.broadcast_to(rows, indices.shape), indices), 1)
+    probs = hist / seg_len
+    probs[probs == 0] = 1.0
+    return -np.sum(probs * np.log(probs), axis=1)
+
+
+def _approximate_entropy(segs, m=3, r=0.2):
+    # tsfresh approximate_entropy(x, m, r)
+    n_rows, seg_len = segs.shape
+    if seg_len <= m + 1:
+        return np.zeros(n_rows)
+    tol = r * np.std(segs, axis=1)
+
+    def _phi(counts, m):
+        C = counts / (seg_len - m + 1)
+        with np.errstate(divide="ignore"):
+            return np.sum(np.log(C), axis=1) / (seg_len - m + 1.0)
+
+    counts, counts_next = template_matches(segs, m, tol)
+    with np.errstate(invalid="ignore"):
+        return np.abs(_phi(counts, m) - _phi(counts_next, m + 1))
+
+
+def _sample_entropy(segs, m=2):
+    # tsfresh sample_entropy(x)
+    tol = 0.2 * np.std(segs, axis=1)
+    counts, counts_next = template_matches(segs, m, tol)
+    B = (counts - 1).sum(axis=1)
+    A = (counts_next - 1).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = -np.log(A / B)
+    result[np.isnan(segs).any(axis=1)] = np.nan
+    return result
+
+
+def _slope(segs):
+    # PAASAXVFD.slope
+    rows = np.arange(segs.shape[0])
+    max_pt = np.argmax(segs, axis=1)
+    min_pt = np.argmin(segs, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (segs[rows, max_pt] - segs[rows, min_pt]) / (max_pt - min_pt)
+
+
+def _abs_changes(segs):
+    return np.abs(np.diff(segs, axis=1))
+
+
+def _mean_second_derivative_central(segs):
+    seg_len = segs.shape[1]
+    if seg_len <= 2:
+        return np.full(segs.shape[0], np.nan)
+    return (segs[:, -1] - segs[:, -2] - segs[:, 1] + segs[:, 0]) / (2 * (seg_len - 2))
+
+
+SEGMENT_FEATURES = {
+    'max': lambda segs: np.max(segs, axis=1),
+    'min': lambda segs: np.min(segs, axis=1),
+    'mean': lambda segs: np.mean(segs, axis=1),
+    'median': lambda segs: np.median(segs, axis=1),
+    'var': lambda segs: np.var(segs, axis=1),
+    'skew': _skew,
+    'kurtosis': _kurtosis,
+    'range': lambda segs: np.max(segs, axis=1) - np.mean(segs, axis=1),
+    'IQR': _iqr,
+    'entropy': _entropy,
+    'bEn': _binned_entropy,
+    'apEn': _approximate_entropy,
+    'sampEn': _sample_entropy,
+    'slope': _slope,
+    'abs_en': lambda segs: np.matmul(segs[:, None, :], segs[:, :, None])[:, 0, 0],
+    'abs_sum_of_ch': lambda segs: np.sum(_abs_changes(segs), axis=1),
+    'mean_abs_ch': lambda segs: np.mean(_abs_changes(segs), axis=1),
+    'mean_sec_deri_central': _mean_second_derivative_central,
+}
+
+
+def segment_features(segs, feat_list):
+    """Features of every row of a 2d array of segments.
+
+    Parameters
+    ----------
+    segs : 2d numpy array [N_rows,seg_len]
+    feat_list : list of names in SEGMENT_FEATURES
+
+    Returns
+    -------
+    2d numpy array [N_rows,len(feat_list)]
+    """
+    segs = np.ascontiguousarray(segs, dtype=np.float64)
+    feats = np.empty((segs.shape[0], len(feat_list)))
+    for f, feat_name in enumerate(feat_list):
+        if feat_name not in SEGMENT_FEATURES:
+            raise ValueError("unknown segment feature '{}'".format(feat_name))
+        feats[:, f] = SEGMENT_FEATURES[feat_name](segs)
+    return feats
+
 
 class PAASAXVFD():
     def __init__(self,
@@ -32,142 +235,69 @@ class PAASAXVFD():
 
         Returns
         -------
-        dims: Pandas data frame with first dimension in column zero,
-              second in column one etc.
+        2d numpy array [n_instances, num_intervals*len(feat_list)], the
+        features of every segment
         """
-        # Get information about the dataframe
-        # num_atts = len(X.iloc[0, 0])
-        # col_names = X.columns
-
-        # Check the parameters are appropriate
-        # self._check_parameters(num_atts)
-
-        # On each dimension, perform PAA
-        dataFrames = []
-        # for x in col_names:
-        dataFrames.append(self._perform_paa_along_dim(X))
-
-        # Combine the dimensions together
-        result = pd.concat(dataFrames, axis=1, sort=False)
-        #result.columns = col_names
-
-        return result
-
-    def _perform_paa_along_dim(self, X):
-        # X = from_nested_to_2d_array(X, return_numpy=True)
-        num_atts = X.shape[1]
-        num_insts = X.shape[0]
-        dims = pd.DataFrame()
-        data = []
-
-        direct_feats_list = []
-
-        for i in range(num_insts):
-            series = X[i,:]
-
-            frames = []
-            current_frame = 0
-            current_frame_size = 0
-            frame_length = num_atts / self.num_intervals
-            frame_sum = 0
+        return self._perform_paa_along_dim(X)
 
-            direct_feats = []
-            seg_list = []
+    def transform_series(self, x, window_size):
+        """Transform all z-normalized sliding windows of one series.
 
-            for n in range(num_atts):
-                remaining = frame_length - current_frame_size
+        Same output as ``transform`` on the z-normalized windows. The windows
+        are z-normalized block by block right before their features are
+        taken, instead of materializing all normalized windows. Unlike the
+        frames of the other variants, the features are not normalized
+        analytically: the binned entropy and the moments of (near) constant
+        segments change with the last bit of the samples.
 
-                # add series item
-                seg_list.append(series[n])
-
-                if remaining > 1:
-                    frame_sum += series[n]
-                    current_frame_size += 1
-                else:
-                    frame_sum += remaining * series[n]
-                    current_frame_size += remaining
+        Parameters
+        ----------
+        x : 1d numpy array [n_timepoints]
+        window_size : int
 
-                if current_frame_size == frame_length:
-                    
-                    current_frame += 1
+        Returns
+        -------
+        2d numpy array [n_windows, num_intervals*len(feat_list)]
+        """
+        x = np.asarray(x, dtype=np.float64)
+        num_windows = len(x) - window_size + 1
 
-                    frame_sum = (1 - remaining) * series[n]
-                    current_frame_size = 1 - remaining
+        bounds, _ = paa_segments(window_size, self.num_intervals)
 
-                    assert len(seg_list) > 0
-                    frames.extend(self._feat_vec(seg_list))
+        data = np.zeros((num_windows, (len(bounds) - 1) * len(self.feat_list)))
+        for start, block in iter_window_chunks(x, window_size, znorm=True):
+            data[start:start + block.shape[0]] = self._window_features(block, bounds)
 
-                    # reset seg_list
-                    seg_list = []
+        return data
 
-            # if the last frame was lost due to double imprecision
-            if current_frame == self.num_intervals - 1:
-               
-                frames.extend(self._feat_vec(seg_list))
-                seg_list = []
+    def _perform_paa_along_dim(self, X):
+        # X = from_nested_to_2d_array(X, return_numpy=True)
+        X = np.asarray(X, dtype=np.float64)
+        num_atts = X.shape[1]
 
-            data.append(pd.Series(frames))
+        # sample ranges of the frames from the shared PAA kernels
+        bounds, _ = paa_segments(num_atts, self.num_intervals)
 
-        dims[0] = data
+        return self._window_features(X, bounds)
 
-        return dims
+    def _window_features(self, X, bounds):
+        # features of all segments of the rows of X, segment-major, one
+        # segment_features call per segment instead of per row
+        n_feat = len(self.feat_list)
+        data = np.zeros((X.shape[0], (len(bounds) - 1) * n_feat))
+        for j in range(len(bounds) - 1):
+            assert bounds[j + 1] > bounds[j]
+            data[:, j * n_feat:(j + 1) * n_feat] = segment_features(X[:, bounds[j]:bounds[j + 1]], self.feat_list)
+        return data
 
     def _feat_vec(self, X):
 
-        feat_val = []
-        
-        for feat_name in self.feat_list:
-
-            feat_val.append(self._feat_func(X, feat_name))
-
-        # print(feat_val)
-        return feat_val
+        return list(segment_features(np.array(X).reshape(1, -1), self.feat_list)[0])
 
 
     def _feat_func(self, X, func_name):
-        
-        X = np.array(X).reshape(-1,)
-        if func_name == 'max':
-            return feature_calculators.maximum(X)
-        elif func_name == 'min':
-            return feature_calculators.minimum(X)
-        elif func_name == 'mean':
-            return feature_calculators.mean(X)
-        elif func_name == 'median':
-            return feature_calculators.median(X)   
-        elif func_name == 'var':
-            return feature_calculators.variance(X)
-        elif func_name == 'skew':
-            return feature_calculators.skewness(X)
-        elif func_name == 'kurtosis':
-            return feature_calculators.kurtosis(X)
-        elif func_name == 'range':
-            return np.max(X) - np.mean(X)
-        elif func_name == 'IQR':
-            return np.percentile(X, 75) - np.percentile(X, 25)
-        elif func_name == 'entropy':
-            return self.entropy(X)
-        elif func_name == 'bEn':
-            return feature_calculators.binned_entropy(X, max_bins=10)
-        elif func_name == 'apEn':
-            return feature_calculators.approximate_entropy(X,m=3,r=0.2)
-        elif func_name == 'sampEn':
-            return feature_calculators.sample_entropy(X)
-        elif func_name == 'slope':
-            return self.slope(X)
-        elif func_name == 'abs_en':
-            return feature_calculators.abs_energy(X)
-        elif func_name == 'abs_sum_of_ch':
-            return feature_calculators.absolute_sum_of_changes(X)
-        elif func_name == 'mean_abs_ch':
-            return feature_calculators.mean_abs_change(X)
-        elif func_name == 'mean_sec_deri_central':
-            return feature_calculators.mean_second_derivative_central(X)
-
-        else:
 
-            print('no matching func!')
-            assert func_name == 'max'
+        return segment_features(np.array(X).reshape(1, -1), [func_name])[0, 0]
         
 
     def _check_parameters(self, num_atts):
@@ -3,6 +3,10 @@ import numpy as np
 import pandas as pd
 import ruptures as rpt
 
+from .paa_numba import paa_frames, paa_segments, near_breakpoints
+from .paa_rolling import znorm_rolling_paa
+from ...util.windowing import take_windows
+
 class PAATFSAX():
     def __init__(self,
             num_intervals=8,
@@ -27,126 +31,128 @@ class PAATFSAX():
 
         Returns
         -------
-        dims: Pandas data frame with first dimension in column zero,
-              second in column one etc.
+        frames : 2d numpy array [n_instances, num_intervals], PAA
+        trend_feats : 2d numpy array [n_instances, num_intervals], trend
+            angle of every segment in degrees
         """
-        # Get information about the dataframe
-        # num_atts = len(X.iloc[0, 0])
-        # col_names = X.columns
+        return self._perform_paa_along_dim(X)
 
-        # Check the parameters are appropriate
-        # self._check_parameters(num_atts)
+    def transform_series(self, x, window_size, breakpoints, breakpoints_angle):
+        """Transform all z-normalized sliding windows of one series.
 
-        # On each dimension, perform PAA
-        dataFrames = []
-        # for x in col_names:
-        sax_feat, trend_feat = self._perform_paa_along_dim(X)
-        dataFrames.append(sax_feat)
+        Same output as ``transform`` on the z-normalized windows, computed
+        from the raw series: the PAA and the trend rise are divided by the
+        window std, the turning points do not change under z-normalization.
+        Windows with a frame or angle within rounding error of a breakpoint
+        (or flat windows) are recomputed from the z-normalized windows, so
+        their letters are the same. Fixed segments only.
 
-        # Combine the dimensions together
-        sax_result = pd.concat(dataFrames, axis=1, sort=False)
-        trend_result = trend_feat
-        #result.columns = col_names
+        Parameters
+        ----------
+        x : 1d numpy array [n_timepoints]
+        window_size : int
+        breakpoints, breakpoints_angle : lists, breakpoints of the frames and
+            of the trend angles
 
-        return sax_result, trend_result
+        Returns
+        -------
+        frames, trend_feats : 2d numpy arrays [n_windows, num_intervals]
+        """
+        x = np.asarray(x, dtype=np.float64)
+        frames, _, stds, tol = znorm_rolling_paa(x, window_size, self.num_intervals)
+        bounds, _ = paa_segments(window_size, self.num_intervals)
+        starts = np.arange(len(frames))
+
+        # turning points of the series, turns[t] counts those among samples 1..t
+        left = x[1:-1] - x[:-2]
+        right = x[2:] - x[1:-1]
+        turn = left * right
+        turns = np.zeros(len(x), dtype=np.int64)
+        turns[1:-1] = np.cumsum((turn < 0) | ((turn == 0) & (left != right)))
+        turns[-1] = turns[-2]
+
+        trend_feats = np.zeros_like(frames)
+        for j in range(len(bounds) - 1):
+            lo, hi = bounds[j], bounds[j + 1]
+            td = (x[starts + hi - 1] - x[starts + lo]) / stds
+            # turning points strictly inside the segment
+            K = turns[starts + hi - 2] - turns[starts + lo] if hi - lo > 2 else 0
+            trend_feats[:, j] = np.arctan(td / np.maximum(K, 1)) * 180 / np.pi
+
+        unsure = near_breakpoints(frames, np.asarray(breakpoints, dtype=np.float64), tol) | near_breakpoints(trend_feats, np.asarray(breakpoints_angle, dtype=np.float64), np.degrees(2 * tol))
+        indices = np.flatnonzero(unsure)
+        if len(indices):
+            frames[indices], trend_feats[indices] = self.transform(take_windows(x, window_size, indices, znorm=True))
+
+        return frames, trend_feats
 
     def _perform_paa_along_dim(self, X):
         # X = from_nested_to_2d_array(X, return_numpy=True)
+        X = np.asarray(X, dtype=np.float64)
         num_atts = X.shape[1]
         num_insts = X.shape[0]
-        dims = pd.DataFrame()
-        data = []
 
+        if not self.variable_segment:
+            # frames and their sample ranges come from the shared PAA kernels,
+            # the trends of every segment are computed for all windows at once
+            bounds, _ = paa_segments(num_atts, self.num_intervals)
+            frames = paa_frames(np.ascontiguousarray(X), self.num_intervals)
+
+            trend_feats = np.zeros((num_insts, len(bounds) - 1))
+            for j in range(len(bounds) - 1):
+                trend_feats[:, j] = self._trend_feat(X[:, bounds[j]:bounds[j + 1]])
+
+            return frames, trend_feats
+
+        data = []
         trend_feats_list = []
 
         for i in range(num_insts):
             series = X[i,:]
 
             frames = []
-            current_frame = 0
-            current_frame_size = 0
-            frame_length = num_atts / self.num_intervals
-            frame_sum = 0
-
             trend_feats = []
-            seg_list = []
-
-            if not self.variable_segment:    
-                for n in range(num_atts):
-                    remaining = frame_length - current_frame_size
-
-                    # add series item
-                    seg_list.append(series[n])
-
-                    if remaining > 1:
-                        frame_sum += series[n]
-                        current_frame_size += 1
-                    else:
-                        frame_sum += remaining * series[n]
-                        current_frame_size += remaining
-
-                    if current_frame_size == frame_length:
-                        frames.append(frame_sum / frame_length)
-                        # print(frame_sum / frame_length)
-                        current_frame += 1
-
-                        frame_sum = (1 - remaining) * series[n]
-                        current_frame_size = 1 - remaining
-
-                        trend_feats.append(self._trend_feat(seg_list))
-                        
-                        # reset seg_list
-                        seg_list = []
-
-                # if the last frame was lost due to double imprecision
-                if current_frame == self.num_intervals - 1:
-                    frames.append(frame_sum / frame_length)
-                    trend_feats.append(self._trend_feat(seg_list))
-                    seg_list = []
-
-            else:
-                algo = rpt.Binseg(model='l2')
-                # algo = rpt.Window(width=int(0.1*len(series)), model='l2')
-
-                algo.fit(series)
-                # result = algo.predict(pen=1)
-
-                try:
-                    bkps = algo.predict(n_bkps=self.num_intervals-1)
-                    segments = np.split(series, bkps[:-1])
-                except:
-                    print("Segmentation failed. Even segment is used instead.")
-                    segments = np.split(series, self.num_intervals)
-
-                if len(segments) != self.num_intervals:
-                    # print("Segmentation failed. Even segment is used instead.")
-                    print(bkps)
-                    segments = np.split(series, self.num_intervals)
-
-                # print(series)
-                # print(bkps)
-                # print(segments)
-
-                for j in range(len(segments)):
-                    
-                    frames.append(np.mean(segments[j]))
-                    trend_feats.append(self._trend_feat(segments[j]))
-                    
-
-            data.append(pd.Series(frames))
-            trend_feats_list.append(trend_feats)
 
+            algo = rpt.Binseg(model='l2')
+            # algo = rpt.Window(width=int(0.1*len(series)), model='l2')
+
+            algo.fit(series)
+            # result = algo.predict(pen=1)
+
+            try:
+                bkps = algo.predict(n_bkps=self.num_intervals-1)
+                segments = np.split(series, bkps[:-1])
+            except:
+                print("Segmentation failed. Even segment is used instead.")
+                segments = np.split(series, self.num_intervals)
 
-        dims[0] = data
+            if len(segments) != self.num_intervals:
+                # print("Segmentation failed. Even segment is used instead.")
+                print(bkps)
+                segments = np.split(series, self.num_intervals)
 
-        return dims, np.array(trend_feats_list)
+            # print(series)
+            # print(bkps)
+            # print(segments)
+
+            for j in range(len(segments)):
+                
+                frames.append(np.mean(segments[j]))
+                trend_feats.append(self._trend_feat(segments[j][None, :])[0])
+                
+
+            data.append(frames)
+            trend_feats_list.append(trend_feats)
+
+        return np.array(data), np.array(trend_feats_list)
 
     
 
     def _trend_feat(self, X):
+        # trend angle of the segments in the rows of X
 
-        mean_val = np.mean(X)
-        td = (X[-1] - mean_val) - (X[0] - mean_val)
+        mean_val = np.mean(X, axis=1)
+        td = (X[:, -1] - mean_val) - (X[:, 0] - mean_val)
         K = self._trend_point(X)
 
         tan = td / K
@@ -156,16 +162,15 @@ class PAATFSAX():
         return angle
 
     def _trend_point(self, X):
-        
-        K = 0
-        for i in range(1, len(X)-1):
+        # turning points inside each row, at least 1
+
+        left = X[:, 1:-1] - X[:, :-2]
+        right = X[:, 2:] - X[:, 1:-1]
+        turn = left * right
 
-            if (X[i] - X[i-1])*(X[i+1] - X[i]) < 0:
-                K += 1
-            elif ((X[i] - X[i-1])*(X[i+1] - X[i]) == 0) and ((X[i] - X[i-1]) != (X[i+1] - X[i])): 
-                K += 1
+        K = np.sum((turn < 0) | ((turn == 0) & (left != right)), axis=1)
 
-        return max(K, 1)
+        return np.maximum(K, 1)
 
     def _check_parameters(self, num_atts):
         """Check parameters of PAA.
@@ -2,7 +2,7 @@
 import pandas as pd
 import numpy as np
 
-from paa.paa_numba import _perform_paa_along_dim_numba,paa_whole_dataset
+from .paa_numba import paa_whole_dataset
 
 class PAATWA():
     def __init__(self,
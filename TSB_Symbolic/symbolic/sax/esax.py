@@ -9,6 +9,7 @@ import scipy.stats
 
 from ..paa.paa_esax import PAAESAX
 from ..paa.paa_approx import PAA
+from ...util.windowing import iter_window_chunks
 
 class ESAX():
     """.
@@ -103,22 +104,18 @@ class ESAX():
             
             num_windows_per_inst = series_length - self.window_size + 1
 
-            split = X[i,np.arange(self.window_size)[None,:] + np.arange(num_windows_per_inst)[:,None]]
-            split = scipy.stats.zscore(split,axis=1)
-
-
             """calculate the mean for each
             """
-            # print(split.shape)
             paae = PAAESAX(num_intervals=int(self.word_length/3))
             # paa = PAA(num_intervals=3)
-            
-            # data = pd.DataFrame()
-            # data[0] = [pd.Series(x,dtype=np.float32) for x in split]
 
-            data = split
-            patterns = paae.transform(data)
-            patterns = np.asarray([a.values for a in patterns.iloc[:,0]])
+            # z-normalized windows are processed chunk by chunk
+            patterns = []
+            for _, split in iter_window_chunks(X[i],self.window_size,znorm=True):
+                # print(split.shape)
+                data = split
+                patterns.append(paae.transform(data))
+            patterns = np.concatenate(patterns)
 
             # print(patterns.shape)
             """quantization
@@ -6,9 +6,11 @@ import sys
 import numpy as np
 import pandas as pd
 import scipy.stats
+from scipy.sparse import csr_matrix
 from scipy.stats import norm
 
-from TSB_Symbolic.symbolic.paa.paa_approx import PAA
+from TSB_Symbolic.symbolic.sax.sax_numba import sax_words, repeat_word_mask
+from TSB_Symbolic.util.persistence import save_model,load_model
 
 class SAX():
     """Symbolic Aggregate approXimation (SAX) transformer.
@@ -46,10 +48,18 @@ class SAX():
         setting to true reduces speed significantly but is required for
         automatic test.
 
+    return_sparse:          boolean, default = False
+        set to true to build the histogram as a scipy sparse matrix instead
+        of a dense (n_instances, 4 ** word_length) array.
+
     Attributes
     ----------
     words:      history = []
     """
+    # constructor parameters, stored by save()
+    _PARAMS = ('word_length', 'alphabet_size', 'window_size', 'remove_repeat_words', 'save_words',
+               'return_pandas_data_series', 'build_histogram', 'return_sparse')
+
     def __init__(
         self,
         word_length=8,
@@ -58,7 +68,8 @@ class SAX():
         remove_repeat_words=False,
         save_words=False,
         return_pandas_data_series=False,
-        build_histogram = False
+        build_histogram = False,
+        return_sparse = False
     ):
         self.word_length = word_length
         self.alphabet_size = alphabet_size
@@ -67,10 +78,28 @@ class SAX():
         self.save_words = save_words
         self.return_pandas_data_series = return_pandas_data_series
         self.build_histogram = build_histogram
+        self.return_sparse = return_sparse
         self.words = []
         self.bp_words = []
         
 
+    def _get_state(self):
+        # the Gaussian breakpoints follow from the alphabet size
+        return {name: getattr(self, name) for name in self._PARAMS}, {}
+
+    @classmethod
+    def _from_state(cls, params, arrays):
+        return cls(**{name: params[name] for name in cls._PARAMS})
+
+    def save(self, path):
+        """Write the transformer parameters to a versioned .npz archive."""
+        save_model(path, type(self).__name__, *self._get_state())
+
+    @classmethod
+    def load(cls, path):
+        """Transformer from an archive written by ``save``."""
+        return cls._from_state(*load_model(path, cls.__name__))
+
     def transform(self,X,y=None):
         """Transform data.
 
@@ -101,51 +130,29 @@ class SAX():
         self.window_size = max(self.word_length, self.window_size)
 
         bags = pd.DataFrame()
-        self.words = []
-        dim = []
-        num_windows_per_inst = series_length - self.window_size + 1
-        self.bp_words = np.zeros((n_instances,num_windows_per_inst,self.word_length))
-
-        paa = PAA(num_intervals=self.word_length)
-
-        num_windows_per_inst = series_length - self.window_size + 1
+        self.bp_words, words = sax_words(np.asarray(X, dtype=np.float64), self.window_size, self.word_length,
+                                         np.asarray(breakpoints, dtype=np.float64))
 
-        split = X[:,np.arange(self.window_size)[None,:] + np.arange(num_windows_per_inst)[:,None]]
-        # print("sliding shape: ", split.shape)
-        patterns_all = paa.transform(split)
-        # print(patterns_all.shape)
+        # numerosity reduction
+        keep = np.ones(words.shape, dtype=bool)
+        if self.remove_repeat_words:
+            keep = repeat_word_mask(words)
 
+        self.words = [instance_words.tolist() for instance_words in words] if self.save_words else []
 
+        dim = []
         for i in range(n_instances):
-            bag = {}
-            lastWord = -1
-
-            words = []
-            
-            num_windows_per_inst = series_length - self.window_size + 1
-
-            patterns = patterns_all[i]
-
-            for n in range(patterns.shape[0]):
-                pattern = patterns[n,:]
-                word, bp_indices = self._create_word(pattern,breakpoints)
-                words.append(word)
-
-                self.bp_words[i,n,:] = bp_indices
-                
-                lastWord = self._add_to_bag(bag,word,lastWord)
-            
-            if self.save_words:
-                self.words.append(words)
-                
-
+            # word counts in order of first occurrence
+            kept = words[i][keep[i]]
+            unique_words, first_index, counts = np.unique(kept, return_index=True, return_counts=True)
+            order = np.argsort(first_index)
+            bag = dict(zip(unique_words[order].tolist(), counts[order].tolist()))
             dim.append(pd.Series(bag) if self.return_pandas_data_series else bag)
 
-
         bags[0] = dim
 
         if self.build_histogram:
-            histogram = self.create_hist(dim)
+            histogram = self.create_hist(words, keep)
             self.histogram = histogram
         else:
             self.histogram=np.zeros([1,1])
@@ -157,24 +164,6 @@ class SAX():
         self.transform(X, y)
         return self.bp_words
 
-    def _create_word(self, pattern, breakpoints):
-        word = 0
-        bp_indices = np.zeros(self.word_length)
-        for i in range(self.word_length):
-            for bp in range(self.alphabet_size):
-                if pattern[i] <= breakpoints[bp]:
-                    bp_indices[i] = bp
-                    word = (word << 2) | bp
-                    break
-
-        return word,bp_indices
-
-    def _add_to_bag(self, bag, word, last_word):
-        if self.remove_repeat_words and word == last_word:
-            return False
-        bag[word] = bag.get(word, 0) + 1
-        return True
-
     def _generate_breakpoints(self):
         # Pre-made gaussian curve breakpoints from UEA TSC codebase
         return {
@@ -211,22 +200,20 @@ class SAX():
                 feature_names.add(t_word)
         return feature_names
     
-    def create_hist(self,bags):
-        bag_of_words = None
-        n_instances = len(bags)
+    def create_hist(self,words,keep):
+        """Word counts per instance, columns indexed by the packed word."""
+        n_instances = words.shape[0]
+        feature_count = np.uint32(4 ** self.word_length)
+
+        rows = np.repeat(np.arange(n_instances), keep.sum(axis=1))
+        cols = words[keep]
 
-        breakpoints = self.breakpoints
-        word_length = self.word_length
+        if self.return_sparse:
+            counts = np.ones(len(rows), dtype=np.uint32)
+            return csr_matrix((counts, (rows, cols)), shape=(n_instances, feature_count), dtype=np.uint32)
 
-        feature_count = np.uint32(4 ** word_length)
         all_win_words = np.zeros((n_instances,feature_count),dtype=np.uint32)
-        
-        for j in range(n_instances):
-            bag = bags[j]
-            
-            for key in bag.keys():
-                v = bag[key]
-                all_win_words[j,key] = v
+        np.add.at(all_win_words, (rows, cols), 1)
         return all_win_words
 
 
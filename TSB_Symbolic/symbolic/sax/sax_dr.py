@@ -116,22 +116,14 @@ class SAXDR():
             
             num_windows_per_inst = series_length - self.window_size + 1
 
-            split = X[i,np.arange(self.window_size)[None,:] + np.arange(num_windows_per_inst)[:,None]]
-            split = scipy.stats.zscore(split,axis=1)
-
-
             """calculate the mean for each
             """
-            # print(split.shape)
             paadr = PAASAXDR(num_intervals=int(self.word_length/2))
             # paa = PAA(num_intervals=3)
-            
-            # data = pd.DataFrame()
-            # data[0] = [pd.Series(x,dtype=np.float32) for x in split]
 
-            data = split
-            patterns, trend, dr_stat = paadr.transform(data)
-            patterns = np.asarray([a.values for a in patterns.iloc[:,0]])
+            # windows are z-normalized analytically from rolling statistics,
+            # dr_stat covers every window of the instance
+            patterns, trend, dr_stat = paadr.transform_series(X[i],self.window_size,breakpoints)
             
 
             if self.dirdist_table is None:
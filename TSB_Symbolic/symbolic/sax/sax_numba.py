@@ -0,0 +1,83 @@
+"""Compiled sliding-window SAX kernels."""
+
+import numpy as np
+
+from numba import njit, prange
+
+from ..paa.paa_numba import _rolling_paa_series
+
+
+@njit(parallel=True, cache=True)
+def sax_words(X, window_size, word_length, breakpoints):
+    """SAX letters and words of all sliding windows of X.
+
+    The PAA of every window is read off prefix sums of the series by the
+    shared rolling PAA (windows with a frame mean within rounding error of a
+    breakpoint are recomputed directly, so the letters match the PAA), each
+    PAA value is digitized with a binary search on the breakpoints and the
+    letters are packed into an integer word with ``(word << 2) | letter``.
+    A value above the last breakpoint (or NaN) adds no letter and keeps
+    letter 0, as the linear scan of ``SAX._create_word`` did.
+
+    Parameters
+    ----------
+    X : 2d numpy array [N_instances,N_timepoints]
+    window_size : int
+    word_length : int, number of PAA frames per window
+    breakpoints : 1d numpy array, increasing, last one is the largest float
+
+    Returns
+    -------
+    bp_words : 3d numpy array [N_instances,N_windows,word_length], letters
+    words : 2d numpy array [N_instances,N_windows], packed words
+    """
+    n_instances, series_length = X.shape
+    num_windows = series_length - window_size + 1
+    alphabet_size = len(breakpoints)
+    bp_words = np.zeros((n_instances, num_windows, word_length))
+    words = np.zeros((n_instances, num_windows), dtype=np.int64)
+
+    for a in prange(n_instances):
+        patterns = np.empty((num_windows, word_length))
+        _rolling_paa_series(X[a], window_size, word_length, breakpoints, patterns)
+
+        for n in range(num_windows):
+            pattern = patterns[n]
+            word = 0
+            for i in range(word_length):
+                letter = np.searchsorted(breakpoints, pattern[i])
+                if letter < alphabet_size and not np.isnan(pattern[i]):
+                    bp_words[a, n, i] = letter
+                    word = (word << 2) | letter
+            words[a, n] = word
+
+    return bp_words, words
+
+
+@njit(cache=True)
+def repeat_word_mask(words):
+    """Windows kept by SAX's numerosity reduction.
+
+    As in the original per-window loop, the previous word it compares a
+    word with is the marker of whether the previous window was added to the
+    bag (1 or 0, and -1 before the first window), so only the words 0 and 1
+    can be dropped.
+
+    Parameters
+    ----------
+    words : 2d numpy array [N_instances,N_windows], packed words
+
+    Returns
+    -------
+    keep : 2d bool numpy array [N_instances,N_windows]
+    """
+    keep = np.ones(words.shape, dtype=np.bool_)
+    for i in range(words.shape[0]):
+        last_word = -1
+        for n in range(words.shape[1]):
+            if words[i, n] == last_word:
+                keep[i, n] = False
+                last_word = 0
+            else:
+                last_word = 1
+    return keep
@@ -123,23 +123,14 @@ class SAXVFD():
             
             num_windows_per_inst = series_length - self.window_size + 1
 
-            split = X[i,np.arange(self.window_size)[None,:] + np.arange(num_windows_per_inst)[:,None]]
-            split = scipy.stats.zscore(split,axis=1)
-
-
             """calculate the features for each
             """
-            # print(split.shape)
             paavfd = PAASAXVFD(num_intervals=self.word_length/4, feat_list=self.feat_list)
             # paa = PAA(num_intervals=3)
-            
-            # data = pd.DataFrame()
-            # data[0] = [pd.Series(x,dtype=np.float32) for x in split]
 
-            data = split
-            patterns= paavfd.transform(data)
-            patterns = np.asarray([a.values for a in patterns.iloc[:,0]])
-            
+            # windows are z-normalized analytically from rolling statistics
+            patterns = paavfd.transform_series(X[i],self.window_size)
+
             patterns = patterns.reshape(-1, len(self.feat_list))
             patterns = np.nan_to_num(patterns, nan=0.0) # nan value
 
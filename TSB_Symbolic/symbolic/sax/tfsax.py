@@ -9,6 +9,7 @@ import scipy.stats
 
 from ..paa.paa_tfsax import PAATFSAX
 from ..paa.paa_approx import PAA
+from ...util.windowing import iter_window_chunks
 
 class TFSAX():
     """.
@@ -112,22 +113,25 @@ class TFSAX():
             
             num_windows_per_inst = series_length - self.window_size + 1
 
-            split = X[i,np.arange(self.window_size)[None,:] + np.arange(num_windows_per_inst)[:,None]]
-            split = scipy.stats.zscore(split,axis=1)
-
-
             """calculate the mean for each
             """
-            # print(split.shape)
             paatf = PAATFSAX(num_intervals=int(self.word_length/2), variable_segment=self.variable_segment)
             # paa = PAA(num_intervals=3)
-            
-            # data = pd.DataFrame()
-            # data[0] = [pd.Series(x,dtype=np.float32) for x in split]
 
-            data = split
-            patterns, trends = paatf.transform(data)
-            patterns = np.asarray([a.values for a in patterns.iloc[:,0]])
+            if not self.variable_segment:
+                # windows are z-normalized analytically from rolling statistics
+                patterns, trends = paatf.transform_series(X[i],self.window_size,breakpoints,breakpoints_angle)
+            else:
+                # z-normalized windows are processed chunk by chunk
+                patterns, trends = [], []
+                for _, split in iter_window_chunks(X[i],self.window_size,znorm=True):
+                    # print(split.shape)
+                    data = split
+                    chunk_patterns, chunk_trends = paatf.transform(data)
+                    patterns.append(chunk_patterns)
+                    trends.append(chunk_trends)
+                patterns = np.concatenate(patterns)
+                trends = np.concatenate(trends)
             
             # pattern2 = paa.transform(data)
             # pattern2 = np.asarray([a.values for a in pattern2.iloc[:,0]])
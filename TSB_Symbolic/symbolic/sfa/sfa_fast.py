@@ -8,7 +8,6 @@ __author__ = ["patrickzib"]
 __all__ = ["SFAFast"]
 
 import math
-import multiprocessing
 import sys
 
 import numpy as np
@@ -19,6 +18,10 @@ from sklearn.preprocessing import KBinsDiscretizer
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.utils import check_random_state
 
+from ..binning import learn_breakpoints
+from ...util.parallel import numba_threads
+from ...util.persistence import save_model,load_model
+
 
 
 # The binning methods to use: equi-depth, equi-width, information gain or kmeans
@@ -101,14 +104,20 @@ class SFAFast():
             arrays are much more compact.
 
         n_jobs:     int, optional, default = 1
-            The number of jobs to run in parallel for both `transform`.
-            ``-1`` means using all processors.
+            The number of numba threads of the `fit_transform` and `transform`
+            kernels, at most NUMBA_NUM_THREADS. ``-1`` keeps the current
+            numba thread count.
 
         return_pandas_data_series:          boolean, default = False
             set to true to return Pandas Series as a result of transform.
             setting to true reduces speed significantly but is required for
             automatic test.
 
+        sketch_size:    int, optional, default = None
+            If set, equi-depth and equi-width breakpoints are learnt from
+            quantile sketches with this accuracy parameter instead of exact
+            order statistics of the Fourier coefficients.
+
     Attributes
     ----------
     breakpoints: = []
@@ -123,6 +132,19 @@ class SFAFast():
     15th international conference on extending database technology. 2012.
     """
 
+    # constructor parameters, stored with the fitted state by save()
+    _PARAMS = (
+        "word_length", "alphabet_size", "window_size", "norm", "binning_method", "anova", "variance",
+        "bigrams", "skip_grams", "remove_repeat_words", "lower_bounding", "save_words",
+        "feature_selection", "max_feature_count", "p_threshold", "random_state", "return_sparse",
+        "return_pandas_data_series", "n_jobs", "build_histogram", "sketch_size",
+    )
+    # fitted scalars needed by transform
+    _FITTED = (
+        "dft_length", "word_length_actual", "inverse_sqrt_win_size", "feature_count",
+        "n_instances", "series_length",
+    )
+
     def __init__(
         self,
         word_length=8,
@@ -144,7 +166,8 @@ class SFAFast():
         return_sparse=True,
         return_pandas_data_series=False,
         n_jobs=1,
-        build_histogram=True
+        build_histogram=True,
+        sketch_size=None
     ):
         self.words = []
         self.breakpoints = []
@@ -190,18 +213,7 @@ class SFAFast():
         self.random_state = random_state
 
         self.build_histogram = build_histogram
-
-        if self.n_jobs < 1 or self.n_jobs > multiprocessing.cpu_count():
-            n_jobs = multiprocessing.cpu_count()
-        else:
-            n_jobs = self.n_jobs
-
-        # super raises numba import exception if not available
-        # so now we know we can use numba
-
-        from numba import set_num_threads
-
-        set_num_threads(n_jobs)
+        self.sketch_size = sketch_size
 
     def fit_transform(self, X, y=None):
         """Fit to data, then transform it."""
@@ -261,26 +273,27 @@ class SFAFast():
         self.breakpoints = self._binning(X, y)
         self._is_fitted = True
 
-        words, dfts = _transform_case(
-            X,
-            self.window_size,
-            self.dft_length,
-            self.word_length_actual,
-            self.norm,
-            self.remove_repeat_words,
-            self.support,
-            self.anova,
-            self.variance,
-            self.breakpoints,
-            self.letter_bits,
-            self.bigrams,
-            self.skip_grams,
-            self.inverse_sqrt_win_size,
-            self.lower_bounding,
-        )
+        with numba_threads(self.n_jobs):
+            words, dfts = _transform_case(
+                X,
+                self.window_size,
+                self.dft_length,
+                self.word_length_actual,
+                self.norm,
+                self.remove_repeat_words,
+                self.support,
+                self.anova,
+                self.variance,
+                self.breakpoints,
+                self.letter_bits,
+                self.bigrams,
+                self.skip_grams,
+                self.inverse_sqrt_win_size,
+                self.lower_bounding,
+            )
+            if self.remove_repeat_words:
+                words = remove_repeating_words(words)
         self.dfts = dfts
-        if self.remove_repeat_words:
-            words = remove_repeating_words(words)
 
         if self.save_words:
             self.words = words
@@ -328,23 +341,24 @@ class SFAFast():
         
         #X = X.squeeze(1)
 
-        words, dfts = _transform_case(
-            X,
-            self.window_size,
-            self.dft_length,
-            self.word_length_actual,
-            self.norm,
-            self.remove_repeat_words,
-            self.support,
-            self.anova,
-            self.variance,
-            self.breakpoints,
-            self.letter_bits,
-            self.bigrams,
-            self.skip_grams,
-            self.inverse_sqrt_win_size,
-            self.lower_bounding,
-        )
+        with numba_threads(self.n_jobs):
+            words, dfts = _transform_case(
+                X,
+                self.window_size,
+                self.dft_length,
+                self.word_length_actual,
+                self.norm,
+                self.remove_repeat_words,
+                self.support,
+                self.anova,
+                self.variance,
+                self.breakpoints,
+                self.letter_bits,
+                self.bigrams,
+                self.skip_grams,
+                self.inverse_sqrt_win_size,
+                self.lower_bounding,
+            )
         self.pred_dfts= dfts
         # only save at fit
         if self.save_words:
@@ -358,14 +372,15 @@ class SFAFast():
 
         if self.build_histogram and self.window_size != X.shape[1]:
             # transform
-            bags = create_bag_transform(
-                self.feature_count,
-                self.feature_selection,
-                self.relevant_features if self.relevant_features else empty_dict,
-                words,
-                self.bigrams,
-                self.remove_repeat_words,
-            )[0]
+            with numba_threads(self.n_jobs):
+                bags = create_bag_transform(
+                    self.feature_count,
+                    self.feature_selection,
+                    self.relevant_features if self.relevant_features else empty_dict,
+                    words,
+                    self.bigrams,
+                    self.remove_repeat_words,
+                )[0]
 
             if self.return_pandas_data_series:
                 bb = pd.DataFrame()
@@ -543,28 +558,18 @@ class SFAFast():
         breakpoints = np.zeros((self.word_length_actual, self.alphabet_size))
         mindist_breakpoints = np.zeros((self.word_length_actual,self.alphabet_size+1))
         mindist_breakpoints[0,:] = - sys.float_info.max
-        # print(self.word_length_actual)
-        dft = np.round(dft, 2)
-        for letter in range(self.word_length_actual):
-            column = np.sort(dft[:, letter])
-            bin_index = 0
-
-            # use equi-depth binning
-            if self.binning_method == "equi-depth":
-                target_bin_depth = len(dft) / self.alphabet_size
-
-                for bp in range(self.alphabet_size - 1):
-                    bin_index += target_bin_depth
-                    breakpoints[letter, bp] = column[int(bin_index)]
-                    mindist_breakpoints[letter,bp+1] = column[int(bin_index)]
-
-            # use equi-width binning aka equi-frequency binning
-            elif self.binning_method == "equi-width":
-                target_bin_width = (column[-1] - column[0]) / self.alphabet_size
 
-                for bp in range(self.alphabet_size - 1):
-                    breakpoints[letter, bp] = (bp + 1) * target_bin_width + column[0]
-                    mindist_breakpoints[letter,bp+1] = (bp + 1) * target_bin_width + column[0]
+        # coefficients rounded to 2 decimals, selected without a full sort
+        letter_breakpoints = learn_breakpoints(
+            dft[:, : self.word_length_actual],
+            self.alphabet_size,
+            self.binning_method,
+            decimals=2,
+            sketch_size=self.sketch_size,
+        )
+        for letter in range(self.word_length_actual):
+            breakpoints[letter, : self.alphabet_size - 1] = letter_breakpoints[letter]
+            mindist_breakpoints[letter, 1 : self.alphabet_size] = letter_breakpoints[letter]
 
         breakpoints[:, self.alphabet_size - 1] = sys.float_info.max
         mindist_breakpoints[:,self.alphabet_size] = sys.float_info.max
@@ -677,6 +682,61 @@ class SFAFast():
         """Whether `fit` has been called."""
         self._is_fitted = True
 
+    def _get_state(self):
+        params = {name: getattr(self, name) for name in self._PARAMS + self._FITTED}
+        params["n_classes_"] = getattr(self, "n_classes_", None)
+        params["letter_bits"] = int(self.letter_bits)
+        params["word_bits"] = int(self.word_bits)
+
+        arrays = {
+            "support": self.support,
+            "breakpoints": self.breakpoints,
+            "mindist_breakpoints": getattr(self, "mindist_breakpoints", None),
+        }
+        if self.relevant_features is not None:
+            items = np.array(list(self.relevant_features.items()), dtype=np.uint32).reshape(-1, 2)
+            arrays["relevant_features_keys"] = items[:, 0]
+            arrays["relevant_features_values"] = items[:, 1]
+        return params, arrays
+
+    @classmethod
+    def _from_state(cls, params, arrays):
+        from numba.core import types
+        from numba.typed import Dict
+
+        model = cls(**{name: params[name] for name in cls._PARAMS})
+        for name in cls._FITTED:
+            setattr(model, name, params[name])
+        if params["n_classes_"] is not None:
+            model.n_classes_ = params["n_classes_"]
+        model.letter_bits = np.uint32(params["letter_bits"])
+        model.word_bits = np.uint32(params["word_bits"])
+
+        model.support = arrays["support"]
+        model.breakpoints = arrays["breakpoints"]
+        if "mindist_breakpoints" in arrays:
+            model.mindist_breakpoints = arrays["mindist_breakpoints"]
+        if "relevant_features_keys" in arrays:
+            model.relevant_features = Dict.empty(key_type=types.uint32, value_type=types.uint32)
+            for key, value in zip(arrays["relevant_features_keys"], arrays["relevant_features_values"]):
+                model.relevant_features[key] = value
+        model._is_fitted = True
+        return model
+
+    def save(self, path):
+        """Write the fitted transformer to a versioned .npz archive.
+
+        Stores the parameters, the selected Fourier coefficients, the
+        breakpoints and the selected features; the words and DFTs of the
+        training data are not kept.
+        """
+        save_model(path, type(self).__name__, *self._get_state())
+
+    @classmethod
+    def load(cls, path):
+        """Fitted transformer from an archive written by ``save``."""
+        return cls._from_state(*load_model(path, cls.__name__))
+
     def __getstate__(self):
         """Return state as dictionary for pickling, required for typed Dict objects."""
         from numba.typed import Dict
@@ -16,6 +16,10 @@ from numba.typed import Dict
 # The binning methods to use: equi-depth, equi-width, information gain or kmeans
 binning_methods = {"equi-depth", "equi-width", "information-gain", "kmeans", "quantile"}
 
+# windows per parallel task of the MFT; each block restarts from an exact DFT,
+# so the result does not depend on the number of threads
+MFT_BLOCK_SIZE = 4096
+
 
 @njit(fastmath=True, cache=True)
 def _binning_dft(
@@ -149,10 +153,10 @@ def _transform_case(
     return words, dfts
 
 
-@njit(fastmath=True, cache=True)
+@njit(fastmath=True, cache=True, parallel=True)
 def remove_repeating_words(words):
     """Remove repeating words."""
-    for i in range(words.shape[0]):
+    for i in prange(words.shape[0]):
         last_word = 0
         for j in range(words.shape[1]):
             if last_word == words[i, j]:
@@ -199,7 +203,7 @@ def _get_phis(window_size, length):
     return phis
 
 
-@njit(fastmath=True, cache=True)
+@njit(fastmath=True, cache=True, parallel=True)
 def generate_words(
     dfts, bigrams, skip_grams, window_size, breakpoints, word_length, letter_bits
 ):
@@ -217,23 +221,26 @@ def generate_words(
     letter_bits = np.uint32(letter_bits)
     word_bits = word_length * letter_bits  # dfts.shape[2] * letter_bits
 
-    # special case: binary breakpoints
+    # special case: binary breakpoints, letter i is bit i of the word
     if breakpoints.shape[1] == 2:
-        vector = np.zeros((breakpoints.shape[0]), dtype=np.float32)
-        for i in range(breakpoints.shape[0]):
-            vector[i] = breakpoints.shape[1] ** i
-
         for a in prange(dfts.shape[0]):
-            match = (dfts[a] <= breakpoints[:, 0]).astype(np.float32)
-            words[a, : dfts.shape[1]] = np.dot(match, vector).astype(np.uint32)
+            for j in range(dfts.shape[1]):
+                word = np.uint32(0)
+                for i in range(breakpoints.shape[0]):
+                    if dfts[a, j, i] <= breakpoints[i, 0]:
+                        word |= np.uint32(1) << np.uint32(i)
+                words[a, j] = word
 
     # general case: alphabet-size many breakpoints
     else:
         for a in prange(dfts.shape[0]):
-            for i in range(word_length):  # range(dfts.shape[2]):
-                words[a, : dfts.shape[1]] = (
-                    words[a, : dfts.shape[1]] << letter_bits
-                ) | np.digitize(dfts[a, :, i], breakpoints[i], right=True)
+            for j in range(dfts.shape[1]):
+                word = np.uint32(0)
+                for i in range(word_length):  # range(dfts.shape[2]):
+                    # np.digitize(..., right=True)
+                    letter = np.searchsorted(breakpoints[i], dfts[a, j, i])
+                    word = (word << letter_bits) | np.uint32(letter)
+                words[a, j] = word
 
     # add bigrams
     if bigrams:
@@ -263,7 +270,7 @@ def create_feature_names(sfa_words):
     return feature_names
 
 
-@njit(fastmath=True, cache=True)
+@njit(fastmath=True, cache=True, parallel=True)
 def _mft(
     X,
     window_size,
@@ -295,52 +302,58 @@ def _mft(
     else:
         indices = np.full(length, True)
 
-    phis = _get_phis(window_size, length)
-    transformed = np.zeros((X.shape[0], end, length))
-
-    # 1. First run using DFT
-    with objmode(X_ffts="complex128[:,:]"):
-        X_ffts = np.fft.rfft(X[:, :window_size], axis=1)  # complex128
-    reals = np.real(X_ffts)  # float64[]
-    imags = np.imag(X_ffts)  # float64[]
-    transformed[:, 0, 0::2] = reals[:, 0 : length // 2]
-    transformed[:, 0, 1::2] = imags[:, 0 : length // 2]
-
-    # 2. Other runs using MFT
-    # X2 = X.reshape(X.shape[0], X.shape[1], 1)
-    # Bugfix to allow for slices on original X like in TEASER
-    X2 = X.copy().reshape(X.shape[0], X.shape[1], 1)
-
     # compute only those indices needed and not all
-    phis2 = phis[indices]
-    transformed2 = transformed[:, :, indices]
-    for i in range(1, end):
-        reals = transformed2[:, i - 1, 0::2] + X2[:, i + window_size - 1] - X2[:, i - 1]
-        imags = transformed2[:, i - 1, 1::2]
-        transformed2[:, i, 0::2] = (
-            reals * phis2[:length:2] - imags * phis2[1 : (length + 1) : 2]
-        )
-        transformed2[:, i, 1::2] = (
-            reals * phis2[1 : (length + 1) : 2] + phis2[:length:2] * imags
+    phis2 = _get_phis(window_size, length)[indices]
+    n_kept = len(phis2)
+
+    # the windows of every series are split into blocks that are transformed
+    # in parallel, each block starts from the DFT of its first window
+    n_blocks = (end + MFT_BLOCK_SIZE - 1) // MFT_BLOCK_SIZE
+    n_tasks = X.shape[0] * n_blocks
+
+    # 1. First window of each block using DFT
+    first_windows = np.empty((n_tasks, window_size))
+    for task in range(n_tasks):
+        a = task // n_blocks
+        block_start = (task % n_blocks) * MFT_BLOCK_SIZE
+        first_windows[task] = X[a, block_start : block_start + window_size]
+    with objmode(X_ffts="complex128[:,:]"):
+        X_ffts = np.fft.rfft(first_windows, axis=1)  # complex128
+    first_dfts = np.zeros((n_tasks, length))
+    first_dfts[:, 0::2] = np.real(X_ffts)[:, 0 : length // 2]
+    first_dfts[:, 1::2] = np.imag(X_ffts)[:, 0 : length // 2]
+
+    # 2. Other windows of the block using MFT
+    transformed = np.empty((X.shape[0], end, n_kept))
+    for task in prange(n_tasks):
+        a = task // n_blocks
+        block_start = (task % n_blocks) * MFT_BLOCK_SIZE
+        block_end = min(block_start + MFT_BLOCK_SIZE, end)
+
+        transformed[a, block_start] = first_dfts[task][indices]
+        for i in range(block_start + 1, block_end):
+            for k in range(0, n_kept, 2):
+                real = transformed[a, i - 1, k] + X[a, i + window_size - 1] - X[a, i - 1]
+                imag = transformed[a, i - 1, k + 1]
+                transformed[a, i, k] = real * phis2[k] - imag * phis2[k + 1]
+                transformed[a, i, k + 1] = real * phis2[k + 1] + phis2[k] * imag
+
+        # scale, lower bound and divide by the window stds
+        stds = _calc_incremental_mean_std(
+            X[a, block_start : block_end + window_size - 1], block_end - block_start, window_size
         )
-
-    transformed2 = transformed2 * inverse_sqrt_win_size
-
-    if lower_bounding:
-        transformed2[:, :, 1::2] = transformed2[:, :, 1::2] * -1
-
-    # compute STDs
-    stds = np.zeros((X.shape[0], end))
-    for a in range(X.shape[0]):
-        stds[a] = _calc_incremental_mean_std(X[a], end, window_size)
-
-    # divide all by stds and use only the best indices
+        for i in range(block_start, block_end):
+            for k in range(n_kept):
+                value = transformed[a, i, k] * inverse_sqrt_win_size
+                if lower_bounding and k % 2 == 1:
+                    value = value * -1
+                transformed[a, i, k] = value / stds[i - block_start]
+
+    # use only the best indices
     if anova or variance:
-        return transformed2[:, :, mask] / stds.reshape(stds.shape[0], stds.shape[1], 1)
+        return transformed[:, :, mask]
     else:
-        return (transformed2 / stds.reshape(stds.shape[0], stds.shape[1], 1))[
-            :, :, start_offset:
-        ]
+        return transformed[:, :, start_offset:]
 
 
 @njit(cache=True, fastmath=True)
@@ -1,14 +1,124 @@
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
 
 import os
 import sys
+import copy
+import functools
 import time
 import numpy as np
 
-from itertools import product
+from numba import njit, prange
+from scipy.sparse import csr_matrix
 from sklearn.cluster import KMeans
 
+from ...util.windowing import sliding_windows,map_windows,take_windows,iter_window_chunks
+from ..binning import QuantileSketch,DEFAULT_SKETCH_SIZE,learn_breakpoints
+from ...util.persistence import save_model,load_model,prefixed,unprefixed,pack_ragged,unpack_ragged,pack_pca,unpack_pca
+
+
+def word_dtype(breakpoints):
+    """Smallest signed integer dtype able to hold words over `breakpoints`."""
+    max_alphabet_size = max(len(breakpoints_i) for breakpoints_i in breakpoints)
+    for dtype in (np.int8, np.int16, np.int32):
+        if max_alphabet_size < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def truncate_pca(pca, n_components):
+    """Copy of a fitted PCA keeping only its first `n_components` components."""
+    truncated = copy.copy(pca)
+    truncated.n_components = n_components
+    truncated.n_components_ = n_components
+    truncated.components_ = pca.components_[:n_components]
+    truncated.explained_variance_ = pca.explained_variance_[:n_components]
+    truncated.explained_variance_ratio_ = pca.explained_variance_ratio_[:n_components]
+    truncated.singular_values_ = pca.singular_values_[:n_components]
+
+    # the dropped components join the noise estimate
+    rank = min(pca.n_samples_, pca.n_features_in_)
+    if n_components < rank:
+        noise = pca.noise_variance_ * (rank - pca.n_components_) + np.sum(pca.explained_variance_[n_components:])
+        truncated.noise_variance_ = noise / (rank - n_components)
+    return truncated
+
+
+@njit(cache=True)
+def _daa_dp(EV, lamda, N):
+    # DP[i][j]: best reward of spending j bits on the first i components
+    N = np.int64(N)
+    K = len(EV)
+    A = N // K
+    min_bit = 1
+    max_bit = int(np.max(EV) * N)
+
+    DP = np.full((K+1,N+1), -1e9)
+    DP[0,0] = 0
+    alloc = np.full((K+1,N+1), N, dtype=np.int32) # store the num of bits for each component
+
+    for i in range(1, K+1):
+        for j in range(0, N+1):
+            max_reward = -1e9
+            for x in range(min_bit, max_bit+1):
+                if j - x >= 0 and x <= alloc[i-1,j-x]:
+                    # reward plus the regularization -lamda * (x-A)^2 * EV
+                    current_reward = DP[i-1,j-x] + x*EV[i-1] + -lamda * (x-A)**2 * EV[i-1]
+                    if current_reward > max_reward:
+                        alloc[i,j] = x
+                        max_reward = current_reward
+                        DP[i,j] = current_reward
+
+    # backtrack, the first component takes the remaining bits; budgets too
+    # small to backtrack (index outside [-(N+1), N]) are flagged as infeasible
+    bit_arr = np.empty(K, dtype=np.int64)
+    feasible = True
+    unused_bit = N
+    for i in range(K, 1, -1):
+        if unused_bit < -(N+1):
+            feasible = False
+            break
+        bit_arr[i-1] = alloc[i,unused_bit]
+        unused_bit -= alloc[i,unused_bit]
+    bit_arr[0] = unused_bit
+
+    return DP[K,N], bit_arr, feasible
+
+@njit(parallel=True, cache=True)
+def _daa_dp_all(EV, lamda, max_total_bit):
+    # the average allocation and the per-component cap depend on the budget,
+    # so every budget runs its own DP
+    rewards = np.empty(max_total_bit+1)
+    bit_arrs = np.empty((max_total_bit+1,len(EV)), dtype=np.int64)
+    feasible = np.empty(max_total_bit+1, dtype=np.bool_)
+    for N in prange(max_total_bit+1):
+        rewards[N], bit_arrs[N], feasible[N] = _daa_dp(EV, lamda, N)
+    return rewards, bit_arrs, feasible
+
+DAA_CACHE_SIZE = 32
+
+@functools.lru_cache(maxsize=DAA_CACHE_SIZE)
+def _daa_table(EV, lamda, max_total_bit):
+    # EV is a tuple so the arguments are hashable
+    return _daa_dp_all(np.asarray(EV, dtype=np.float64), lamda, max_total_bit)
+
+def daa_allocations(EV, lamda, max_total_bit):
+    """DAA rewards, bit allocations and feasibility flags for every budget
+    0..max_total_bit.
+
+    For sweeps over bit budgets: the tables of the last DAA_CACHE_SIZE
+    (EV, lamda, max_total_bit) are cached, so a sweep passing the same
+    largest budget for every cell runs the DPs once per spectrum.
+    """
+    EV = tuple(np.asarray(EV, dtype=np.float64).tolist())
+    return _daa_table(EV, float(lamda), int(max_total_bit))
+
+
 class SPARTAN:
+    # constructor parameters, stored with their fitted values by save()
+    _PARAMS = ('alphabet_size', 'window_size', 'word_length', 'binning_method', 'remove_repeat_words',
+               'assignment_policy', 'bit_budget', 'lamda', 'build_histogram', 'downsample', 'pca_solver',
+               'return_sparse', 'sketch_size', 'retain_training_data')
+
     def __init__(self,
                  alphabet_size=[8,4,4,2],
                  window_size=0,
@@ -20,7 +130,10 @@ class SPARTAN:
                  lamda=0.5,
                  build_histogram=True,
                  downsample = 1.0,
-                 pca_solver = 'auto'):
+                 pca_solver = 'auto',
+                 return_sparse = False,
+                 sketch_size = None,
+                 retain_training_data = False):
         
         if isinstance(alphabet_size,int):
             self.alphabet_size = [alphabet_size]*word_length
@@ -36,22 +149,24 @@ class SPARTAN:
         self.build_histogram = build_histogram
         self.downsample = downsample
         self.pca_solver = pca_solver
-
-        self.word_to_num = None
-        
+        self.return_sparse = return_sparse
+        self.sketch_size = sketch_size # k of the quantile sketches, None for exact breakpoints
+        self.retain_training_data = retain_training_data # keep _X and pca_repr after fit, needed by derive
 
     def fit(self, X, y=None):
 
         self.pca = PCA(n_components=self.word_length, svd_solver=self.pca_solver)
-        self._X = X
-        self._y = y
+        self._X = X if self.retain_training_data else None
+        self._y = y if self.retain_training_data else None
 
 
         # do random (down)sampling if required
         if self.downsample < 1.0:
             sampling_num = min(max(int(np.ceil(len(X)*self.downsample)), 10), 1000)
             random_indices = np.random.choice(X.shape[0], sampling_num, replace=False)
-            self._X_downsampled = self._X[random_indices]
+            X_downsampled = X[random_indices]
+            if self.retain_training_data:
+                self._X_downsampled = X_downsampled
 
         # check data statistics
         n_instances, series_length = X.shape
@@ -68,7 +183,11 @@ class SPARTAN:
         
         # split data (for BOP)
         num_windows_per_inst = series_length - window_size + 1
-        split = X[:,np.arange(window_size)[None,:] + np.arange(num_windows_per_inst)[:,None]]
+
+        if self.pca_solver == 'incremental':
+            sketches = self._fit_incremental(X, random_indices if self.downsample < 1.0 else None)
+            self._fit_discretization(None, sketches)
+            return
 
         start_time = time.time()
 
@@ -77,22 +196,26 @@ class SPARTAN:
             if self.downsample < 1.0:
                 
                 print("original shape: ", X.shape)
-                print("downsampled shape: ", self._X_downsampled.shape)
+                print("downsampled shape: ", X_downsampled.shape)
                 
-                self.pca.fit(self._X_downsampled)
+                self.pca.fit(X_downsampled)
                 X_transform = self.pca.transform(X)
             else:
                 X_transform = self.pca.fit_transform(X)
         elif self.window_size != 0 and self.window_size != series_length:
             
-            flat_split = np.reshape(split,(-1,split.shape[2]))
             if self.downsample < 1.0:
-                print("bop original shape: ", flat_split.shape)
-                print("bop downsampled shape: ", flat_split[random_indices].shape)
-                self.pca.fit(flat_split[random_indices])
-                split_transorm = self.pca.transform(flat_split)
+                # only the sampled windows are gathered, the rest are projected chunk by chunk
+                sampled_split = take_windows(X,window_size,random_indices)
+                print("bop original shape: ", (n_instances*num_windows_per_inst,window_size))
+                print("bop downsampled shape: ", sampled_split.shape)
+                self.pca.fit(sampled_split)
+                split_transorm = map_windows(self.pca.transform,X,window_size)
             else:
+                # the full SVD needs every window, materialize them once
+                flat_split = sliding_windows(X,window_size).reshape(-1,window_size)
                 split_transorm = self.pca.fit_transform(flat_split)
+                del flat_split
 
         self.evcr = self.pca.explained_variance_ratio_
 
@@ -101,6 +224,55 @@ class SPARTAN:
         # print(f"[Training] PCA time: {(end_time-start_time)/n_instances:.2e}")
 
         # --- Discretization ---
+        if num_windows_per_inst == 1:
+            self._fit_discretization(X_transform[:,0:self.word_length])
+        else:
+            self._fit_discretization(split_transorm[:,0:self.word_length])
+
+        return 
+
+    def _fit_incremental(self, X, random_indices=None):
+        """Fit an IncrementalPCA and sketch the kept components block by block.
+
+        The PCA is fit with ``partial_fit`` on bounded blocks of windows (or
+        of the downsampled windows), then all windows are projected block by
+        block into one QuantileSketch per letter, so memory does not grow
+        with the number of windows.
+
+        Returns
+        -------
+        list of QuantileSketch, one per letter
+        """
+        window_size = self.window_size
+        if random_indices is None:
+            fit_source = X
+        elif X.shape[1] == window_size:
+            fit_source = X[random_indices]
+        else:
+            fit_source = take_windows(X,window_size,random_indices)
+
+        self.pca = IncrementalPCA(n_components=self.word_length)
+        for _, block in iter_window_chunks(fit_source, window_size if fit_source is X else fit_source.shape[1]):
+            self.pca.partial_fit(block)
+        self.evcr = self.pca.explained_variance_ratio_
+
+        sketches = [QuantileSketch(self.sketch_size or DEFAULT_SKETCH_SIZE) for _ in range(self.word_length)]
+        for _, block in iter_window_chunks(X, window_size):
+            kept_components = self.pca.transform(block)[:,0:self.word_length]
+            for letter in range(self.word_length):
+                sketches[letter].update(kept_components[:,letter])
+        return sketches
+
+    def _fit_discretization(self, pca_repr, sketches=None, max_bit_budget=None):
+        """Alphabet allocation and binning of the kept PCA components.
+
+        Shared by ``fit`` and ``derive``; sets ``alphabet_size``,
+        ``pca_repr``, ``breakpoints`` and ``mindist_breakpoints``. With
+        ``sketches`` (incremental fits) the breakpoints come from the
+        per-letter quantile sketches and ``pca_repr`` is None, as it is
+        unless ``retain_training_data`` is set. ``max_bit_budget`` is passed
+        on to ``dynamic_alphabet_allocation``.
+        """
 
         # alphabet allocation
         if self.assignment_policy == 'direct':
@@ -134,32 +306,116 @@ class SPARTAN:
 
             DP_reward, bit_arr = self.dynamic_alphabet_allocation(total_bit=total_bit, 
                                                                   EV=assigned_evc, 
-                                                                  lamda=self.lamda)
+                                                                  lamda=self.lamda,
+                                                                  max_total_bit=max_bit_budget)
             self.alphabet_size = [int(2**bit_arr[i]) for i in range(len(bit_arr))]
             # print("dp result: ", bit_arr)
 
             end_time = time.time()
             # print(f"[Training] DAA time: {(end_time-start_time)/n_instances:.2e}")
-        
-        # binning
-        if num_windows_per_inst == 1:
 
-            kept_components = X_transform[:,0:self.word_length]
-            self.pca_repr = kept_components
-            start_time = time.time()
-            self.breakpoints = self.binning(kept_components)
-
-            # print("bkpts: ", self.breakpoints)
-            end_time = time.time()
-            # print(f"[Training] Binning time: {(end_time-start_time)/n_instances:.2e}")
-             
-        else:
-            breakpoints = self.binning(split_transorm)
+        # binning
+        self.pca_repr = pca_repr if self.retain_training_data else None
+        start_time = time.time()
+        self.breakpoints = self.binning(pca_repr if sketches is None else sketches)
 
-            self.pca_repr = split_transorm[:,0:self.word_length]
-            self.breakpoints = breakpoints
+        # print("bkpts: ", self.breakpoints)
+        end_time = time.time()
+        # print(f"[Training] Binning time: {(end_time-start_time)/n_instances:.2e}")
+
+    def derive(self, word_length, alphabet_size, assignment_policy=None, lamda=None, bit_budget=None, max_bit_budget=None):
+        """SPARTAN transformer for a smaller word length sharing this fitted PCA.
+
+        The first `word_length` principal components of the fitted PCA are the
+        components a PCA with n_components=word_length would find, so the
+        projection is truncated instead of refit and only the alphabet
+        allocation and binning run again on ``pca_repr[:, :word_length]``.
+        With the 'full' (or 'auto' on small inputs) SVD solver the result is
+        identical to fitting from scratch.
+
+        Parameters
+        ----------
+        word_length : int, at most the fitted word length
+        alphabet_size : int or list, as in the constructor
+        assignment_policy, lamda, bit_budget : optional overrides of the
+            fitted parameters
+        max_bit_budget : int, optional, the largest DAA bit budget of a sweep
+            over alphabet sizes at this word length; the allocations of all
+            budgets up to it are computed once and cached
+
+        Returns
+        -------
+        fitted SPARTAN
+        """
+        if word_length > self.word_length:
+            raise ValueError("cannot derive word length {} from a fit with word length {}".format(word_length, self.word_length))
+        if self.pca_repr is None:
+            raise ValueError("derive requires the PCA representation of the training data, which is only kept with retain_training_data=True (and never by incremental fits or loaded models)")
+
+        derived = SPARTAN(
+            alphabet_size=alphabet_size,
+            window_size=self.window_size,
+            word_length=word_length,
+            binning_method=self.binning_method,
+            remove_repeat_words=self.remove_repeat_words,
+            assignment_policy=self.assignment_policy if assignment_policy is None else assignment_policy,
+            bit_budget=self.bit_budget if bit_budget is None else bit_budget,
+            lamda=self.lamda if lamda is None else lamda,
+            build_histogram=self.build_histogram,
+            downsample=self.downsample,
+            pca_solver=self.pca_solver,
+            return_sparse=self.return_sparse,
+            sketch_size=self.sketch_size,
+            retain_training_data=self.retain_training_data
+        )
+        derived.pca = truncate_pca(self.pca, word_length)
+        derived._X = self._X
+        derived._y = self._y
+        if hasattr(self, '_X_downsampled'):
+            derived._X_downsampled = self._X_downsampled
+        derived.evcr = derived.pca.explained_variance_ratio_
+
+        derived._fit_discretization(self.pca_repr[:,0:word_length], max_bit_budget=max_bit_budget)
+        return derived
+    
+    def _get_state(self):
+        params = {name: getattr(self, name) for name in self._PARAMS}
+        params['avg_alphabet_size'] = getattr(self, 'avg_alphabet_size', None)
+        params['pca'], pca_arrays = pack_pca(self.pca)
+
+        arrays = prefixed('pca', pca_arrays)
+        arrays.update(prefixed('breakpoints', pack_ragged(self.breakpoints)))
+        if hasattr(self, 'mindist_breakpoints'):
+            arrays.update(prefixed('mindist_breakpoints', pack_ragged(self.mindist_breakpoints)))
+        return params, arrays
+
+    @classmethod
+    def _from_state(cls, params, arrays):
+        model = cls(**{name: params[name] for name in cls._PARAMS})
+        model.avg_alphabet_size = params['avg_alphabet_size']
+        model.pca = unpack_pca(params['pca'], unprefixed('pca', arrays))
+        model.evcr = model.pca.explained_variance_ratio_
+        model.breakpoints = unpack_ragged(unprefixed('breakpoints', arrays))
+        if 'mindist_breakpoints.offsets' in arrays:
+            model.mindist_breakpoints = unpack_ragged(unprefixed('mindist_breakpoints', arrays))
+        model.pca_repr = None
+        model._X = None
+        model._y = None
+        return model
+
+    def save(self, path):
+        """Write the fitted transformer to a versioned .npz archive.
+
+        Only the state ``transform`` needs is stored (PCA projection,
+        per-letter breakpoints and alphabet allocation), not the training
+        data, so a loaded model cannot ``derive``.
+        """
+        save_model(path, type(self).__name__, *self._get_state())
 
-        return 
+    @classmethod
+    def load(cls, path):
+        """Fitted transformer from an archive written by ``save``."""
+        return cls._from_state(*load_model(path, cls.__name__))
     
     def transform(self, X):
         n_instances, series_length = X.shape
@@ -189,10 +445,7 @@ class SPARTAN:
             else:
                 self.pred_histogram = np.zeros((1,1))
         else:
-            split = X[:,np.arange(window_size)[None,:] + np.arange(num_windows_per_inst)[:,None]]
-
-            flat_split = np.reshape(split,(-1,split.shape[2]))
-            split_transorm = self.pca.transform(flat_split)
+            split_transorm = map_windows(self.pca.transform,X,window_size)
 
             breakpoints = self.binning(split_transorm)
 
@@ -216,15 +469,17 @@ class SPARTAN:
     def fit_transform2(self,X,y=None):
         
         self.pca = PCA(n_components=self.word_length, svd_solver=self.pca_solver)
-        self._X = X
-        self._y = y
+        self._X = X if self.retain_training_data else None
+        self._y = y if self.retain_training_data else None
 
 
         # do random (down)sampling if required
         if self.downsample < 1.0:
             sampling_num = min(max(int(np.ceil(len(X)*self.downsample)), 10), 1000)
             random_indices = np.random.choice(X.shape[0], sampling_num, replace=False)
-            self._X_downsampled = self._X[random_indices]
+            X_downsampled = X[random_indices]
+            if self.retain_training_data:
+                self._X_downsampled = X_downsampled
 
         # check data statistics
         n_instances, series_length = X.shape
@@ -241,7 +496,17 @@ class SPARTAN:
         
         # split data (for BOP)
         num_windows_per_inst = series_length - window_size + 1
-        split = X[:,np.arange(window_size)[None,:] + np.arange(num_windows_per_inst)[:,None]]
+
+        if self.pca_solver == 'incremental':
+            self._fit_discretization(None, self._fit_incremental(X, random_indices if self.downsample < 1.0 else None))
+
+            kept_components = map_windows(self.pca.transform,X,window_size)[:,0:self.word_length]
+            words = np.reshape(self.generate_words(kept_components,self.breakpoints),(n_instances,num_windows_per_inst,self.word_length))
+            if self.build_histogram:
+                self.train_histogram = self.bag_to_hist_DAA(self.create_bags(words))
+            else:
+                self.train_histogram = np.zeros((1,1))
+            return words[:,0,:] if num_windows_per_inst == 1 else words
 
         start_time = time.time()
 
@@ -250,22 +515,26 @@ class SPARTAN:
             if self.downsample < 1.0:
                 
                 print("original shape: ", X.shape)
-                print("downsampled shape: ", self._X_downsampled.shape)
+                print("downsampled shape: ", X_downsampled.shape)
                 
-                self.pca.fit(self._X_downsampled)
+                self.pca.fit(X_downsampled)
                 X_transform = self.pca.transform(X)
             else:
                 X_transform = self.pca.fit_transform(X)
         elif self.window_size != 0 and self.window_size != series_length:
             
-            flat_split = np.reshape(split,(-1,split.shape[2]))
             if self.downsample < 1.0:
-                print("bop original shape: ", flat_split.shape)
-                print("bop downsampled shape: ", flat_split[random_indices].shape)
-                self.pca.fit(flat_split[random_indices])
-                split_transorm = self.pca.transform(flat_split)
+                # only the sampled windows are gathered, the rest are projected chunk by chunk
+                sampled_split = take_windows(X,window_size,random_indices)
+                print("bop original shape: ", (n_instances*num_windows_per_inst,window_size))
+                print("bop downsampled shape: ", sampled_split.shape)
+                self.pca.fit(sampled_split)
+                split_transorm = map_windows(self.pca.transform,X,window_size)
             else:
+                # the full SVD needs every window, materialize them once
+                flat_split = sliding_windows(X,window_size).reshape(-1,window_size)
                 split_transorm = self.pca.fit_transform(flat_split)
+                del flat_split
 
         self.evcr = self.pca.explained_variance_ratio_
 
@@ -274,57 +543,10 @@ class SPARTAN:
         # print(f"[Training] PCA time: {(end_time-start_time)/n_instances:.2e}")
 
         # --- Discretization ---
-
-        # alphabet allocation
-        if self.assignment_policy == 'direct':
-            self.alphabet_size = self.alphabet_size
-            self.avg_alphabet_size = int(np.mean(self.alphabet_size))
-            assigned_evc = self.evcr[0:self.word_length]
-
-            assigned_evc = assigned_evc / np.sum(assigned_evc)
-
-            # print("after norm: ", assigned_evc)
-        elif self.assignment_policy in ['DAA', 'dp']:
-
-            start_time = time.time()
-            if isinstance(self.alphabet_size, list):
-                self.alphabet_size = int(np.mean(self.alphabet_size))
-
-            self.avg_alphabet_size = self.alphabet_size
-            if self.bit_budget != int(np.log2(self.alphabet_size)*self.word_length):
-                total_bit = self.bit_budget = int(np.log2(self.alphabet_size)*self.word_length)
-            else:
-                total_bit = self.bit_budget
-
-            # truncate and re-norm
-            assigned_evc = self.evcr[0:self.word_length]
-            # print("before norm: ", assigned_evc)
-            assigned_evc = assigned_evc / np.sum(assigned_evc)
-            # print("after norm: ", assigned_evc)
-
-            avg_allocation = self.bit_budget // self.word_length
-
-
-            DP_reward, bit_arr = self.dynamic_alphabet_allocation(total_bit=total_bit, 
-                                                                  EV=assigned_evc, 
-                                                                  lamda=self.lamda)
-            self.alphabet_size = [int(2**bit_arr[i]) for i in range(len(bit_arr))]
-            # print("dp result: ", bit_arr)
-
-            end_time = time.time()
-            # print(f"[Training] DAA time: {(end_time-start_time)/n_instances:.2e}")
-        
-        # binning
         if num_windows_per_inst == 1:
 
             kept_components = X_transform[:,0:self.word_length]
-            self.pca_repr = kept_components
-            start_time = time.time()
-            self.breakpoints = self.binning(kept_components)
-
-            # print("bkpts: ", self.breakpoints)
-            end_time = time.time()
-            # print(f"[Training] Binning time: {(end_time-start_time)/n_instances:.2e}")
+            self._fit_discretization(kept_components)
 
             start_time = time.time()
             words = self.generate_words(kept_components,self.breakpoints)
@@ -337,11 +559,8 @@ class SPARTAN:
                 self.train_histogram = np.zeros((1,1))
              
         else:
-            breakpoints = self.binning(split_transorm)
-
-            self.pca_repr = split_transorm[:,0:self.word_length]
-            self.breakpoints = breakpoints
-            flat_words = self.generate_words(split_transorm,breakpoints)
+            self._fit_discretization(split_transorm[:,0:self.word_length])
+            flat_words = self.generate_words(split_transorm,self.breakpoints)
 
             words = np.reshape(flat_words,(n_instances,num_windows_per_inst,self.word_length))
             # print("sliding win: ", words.shape)
@@ -354,11 +573,17 @@ class SPARTAN:
         return words
 
     def generate_words(self,pca,breakpoints):
-        words = np.zeros((pca.shape[0],self.word_length))
-        for a in range(pca.shape[0]):
-            for i in range(self.word_length):
-                words[a,i] = np.digitize(pca[a,i],breakpoints[i],right=True)
-        
+        """Discretize the kept PCA components into words.
+
+        Each letter is digitized for all rows in a single call against its own
+        (ragged) breakpoints, and the words are stored in the smallest signed
+        integer type that holds the largest alphabet, so symbolic distances
+        (differences, +1 offsets) never wrap around.
+        """
+        words = np.empty((pca.shape[0],self.word_length),dtype=word_dtype(breakpoints))
+        for i in range(self.word_length):
+            words[:,i] = np.digitize(pca[:,i],breakpoints[i],right=True)
+
         return words
 
     def binning(self,pca):
@@ -367,40 +592,35 @@ class SPARTAN:
         return breakpoints
 
     def _mcb(self,pca):
+        """Per-letter breakpoints of the PCA components rounded to 4 decimals.
+
+        `pca` is the [N_windows,word_length] PCA representation, or one
+        QuantileSketch per letter for incremental fits. Equi-depth and
+        equi-width breakpoints come from ``learn_breakpoints`` (exact
+        selection, or sketches when ``sketch_size`` is set).
+        """
         breakpoints = []
         mindist_breakpoints =[]
 
-        pca = np.round(pca,4)
+        if self.binning_method in ["equi-depth", "equi-width"]:
+            letter_breakpoints = learn_breakpoints(pca, self.alphabet_size[:self.word_length], self.binning_method,
+                                                   decimals=4, sketch_size=self.sketch_size)
+        elif isinstance(pca, list):
+            raise ValueError("binning_method '{}' is not supported by incremental fits".format(self.binning_method))
+
         for letter in range(self.word_length):
-            column = np.sort(pca[:,letter])
-            column_min = np.min(column)
-            bin_index = 0
-            
             letter_alphabet_size = self.alphabet_size[letter]
             breakpoint_i = np.zeros(letter_alphabet_size)
             mindist_breakpoint_i = np.zeros(letter_alphabet_size+1)
 
             mindist_breakpoint_i[0] = - sys.float_info.max
 
-            #use equi-depth binning
-            if self.binning_method == "equi-depth":
-                target_bin_depth = len(pca) / letter_alphabet_size
-
-                for bp in range(letter_alphabet_size - 1):
-                    bin_index += target_bin_depth 
-                    breakpoint_i[bp] = column[int(bin_index)]
-                    mindist_breakpoint_i[bp+1] = column[int(bin_index)]
-            
-            #equi-width binning aka equi-frequency binning
-            elif self.binning_method == "equi-width":
-                target_bin_width = (column[-1] - column[0]) / letter_alphabet_size
-
-                for bp in range(letter_alphabet_size - 1):
-                    breakpoint_i[bp] = (bp + 1) * target_bin_width + column[0]
-                    mindist_breakpoint_i[bp+1] = (bp + 1) * target_bin_width + column[0]
+            if self.binning_method in ["equi-depth", "equi-width"]:
+                breakpoint_i[:-1] = letter_breakpoints[letter]
+                mindist_breakpoint_i[1:letter_alphabet_size] = letter_breakpoints[letter]
 
             elif self.binning_method == "kmeans":
-                
+                column = np.sort(np.round(pca[:,letter],4))
                 binning_clust_model = KMeans(n_clusters=letter_alphabet_size, random_state=0, n_init="auto").fit(column.reshape(-1,1))
                 centroids = np.sort(binning_clust_model.cluster_centers_, axis=0)
                 bkps = (centroids[:-1] + centroids[1:]) / 2
@@ -415,165 +635,80 @@ class SPARTAN:
 
             # print(f"Letter: {letter}, breakpoints: {breakpoint_i}")
             
-        # breakpoints[:, self.alphabet_size - 1] = sys.float_info.max
         self.mindist_breakpoints = mindist_breakpoints
 
         return breakpoints
     
-    def create_bags(self,wordslists):
-        n_instances,n_words_per_inst,word_length = wordslists.shape
-
-        remove_repeat_words = self.remove_repeat_words
-        wordslists = wordslists.astype(np.int32)
-        bags = []
-        last_word = None
-        for i in range(n_instances):
-            bag = {}
-            wordlist = wordslists[i]
-            for j in range(n_words_per_inst):
-                word = wordlist[j]
-                # print(word)
-                text = ''.join(map(str,word))
-                if (not remove_repeat_words) or (text != last_word):
-                    bag[text] = bag.get(text, 0) + 1 
-
-                last_word = text
-            bags.append(bag)
-
-        return bags
-
-    def bag_to_hist(self,bags):
-        n_instances = len(bags)
-
-        word_length = self.word_length
-
-        possible_words = self.alphabet_size[0] ** word_length
-        print("possible_words: ", possible_words)
-        word_to_num = [np.base_repr(i,base=self.alphabet_size[0]) for i in range(possible_words)]
+    def word_radices(self):
+        """Per-letter alphabet sizes used as the mixed-radix base of word codes."""
+        if isinstance(self.alphabet_size, list):
+            return np.asarray(self.alphabet_size, dtype=np.int64)
+        return np.full(self.word_length, self.alphabet_size, dtype=np.int64)
 
-        word_to_num = ['0'*(word_length - len(word)) + word for word in word_to_num]
-        all_win_words = np.zeros((n_instances,possible_words))
+    def encode_words(self,words):
+        """Encode words as mixed-radix integers over the per-letter alphabet sizes.
 
-        # print(word_to_num)
+        The first letter is the most significant digit, so codes enumerate the
+        vocabulary in the same order as ``itertools.product`` over the letters.
+        """
+        radices = self.word_radices()
+        place_values = np.ones(len(radices), dtype=np.int64)
+        place_values[:-1] = np.cumprod(radices[:0:-1])[::-1]
 
-        for j in range(n_instances):
-            bag = bags[j]
-            # print(bag)
+        return words.astype(np.int64) @ place_values
 
-            for key in bag.keys():
-                v = bag[key]
+    def create_bags(self,wordslists):
+        """Encode the words of each instance; with numerosity reduction a word
+        repeating the previous window of the same instance is masked with -1."""
+        codes = self.encode_words(wordslists)
 
-                n = word_to_num.index(key)
+        if self.remove_repeat_words:
+            repeated = np.zeros(codes.shape, dtype=bool)
+            repeated[:,1:] = codes[:,1:] == codes[:,:-1]
+            codes[repeated] = -1
 
-                all_win_words[j,n] = v
-        return all_win_words
+        return codes
 
+    def bag_to_hist_DAA(self,bags):
+        """Count the word codes of each instance into a (n_instances, vocabulary) histogram.
 
-    def combination_words_DAA(self, alphabet_sizes):
-        """
-        Generate all possible words given the alphabet sizes for each letter and the word length.
-        
-        :param alphabet_sizes: List[int], List where each element specifies the number of choices for that letter position.
-        :param word_length: int, Length of the word to be generated.
-        :return: List[str], List of all possible words.
+        With ``return_sparse`` the histogram is a ``csr_matrix`` holding only the
+        words that occur, so the vocabulary size does not bound memory.
         """
-        # Create a list of ranges based on the alphabet sizes
-        ranges = [range(size) for size in alphabet_sizes]
-        
-        # Generate all possible combinations
-        all_combinations = product(*ranges)
-        
-        # Convert each combination to a string and store in the list
-        all_words = [''.join(map(str, combination)) for combination in all_combinations]
-        
-        return all_words
-    
-    def bag_to_hist_DAA(self,bags):
         n_instances = len(bags)
+        possible_words = int(np.prod(self.word_radices()))
 
-        word_length = self.word_length
-
-        if isinstance(self.alphabet_size, list):
-            possible_words = int(np.prod(self.alphabet_size))
-        else:
-            possible_words = int(self.alphabet_size ** word_length)
-
-        if self.word_to_num is None:
-            word_to_num = self.combination_words_DAA(self.alphabet_size)
-            self.word_to_num = word_to_num
-
-        all_win_words = np.zeros((n_instances,possible_words))
-
-        # print(word_to_num)
-
-        for j in range(n_instances):
-            bag = bags[j]
-            # print(bag)
-
-            for key in bag.keys():
-                v = bag[key]
+        rows = np.broadcast_to(np.arange(n_instances)[:,None], bags.shape)
+        kept = bags >= 0
 
-                n = self.word_to_num.index(key)
+        if self.return_sparse:
+            counts = np.ones(np.count_nonzero(kept))
+            return csr_matrix((counts, (rows[kept], bags[kept])), shape=(n_instances, possible_words))
 
-                all_win_words[j,n] = v
+        # float64 weights make bincount count straight into the float histogram
+        codes = rows[kept] * possible_words + bags[kept]
+        all_win_words = np.bincount(codes, weights=np.ones(len(codes)),
+                                    minlength=n_instances * possible_words)
 
-        return all_win_words
+        return all_win_words.reshape(n_instances, possible_words)
 
-    def dynamic_alphabet_allocation(self, total_bit, EV, lamda=0.5):
+    def dynamic_alphabet_allocation(self, total_bit, EV, lamda=0.5, max_total_bit=None):
+        """Optimal DAA bit allocation of `total_bit` bits over the components.
 
-        def regularization_term(x, ev_value, avg_bit, lamda=0.5, pos=1.0):
-            
-            return -lamda * (x-avg_bit)**2 * ev_value
-
-
-        K = len(EV)
-        N = total_bit
-        A = int(N/K)
-        DP = np.zeros((K+1,N+1))
-        min_bit = 1
-        max_bit = int(np.max(EV) * N)
-        alloc = np.zeros_like(DP).astype(np.int32) + N # store the num of bits for each component
-
-        # init
-        for i in range(0, K+1):
-            for j in range(0, N+1):
-                
-                DP[i][j] = -1e9
-
-        DP[0][0] = 0
-
-        # non-recursive
-        for i in range(1, K+1):
-            for j in range(0, N+1):
-                
-                max_reward = -1e9
-
-                for x in range(min_bit, max_bit+1):
-
-                    if j - x >= 0 and x <= alloc[i-1][j-x]:  
-                        
-                        current_reward = DP[i-1][j-x] + x*EV[i-1] + regularization_term(x, EV[i-1], A, lamda, i/K)
-
-                        if current_reward > max_reward:
-
-                            alloc[i][j] = x
-                            max_reward = current_reward
-                            DP[i][j] = current_reward
-
-        def print_sol(alloc, K, N):
-            
-            bit_arr = []  
-            unused_bit = N
-            for i in range(K, 1, -1):
-                bit_arr.append(alloc[i][unused_bit])
-                unused_bit -= alloc[i][unused_bit]
-
-            bit_arr.append(unused_bit)
-            return bit_arr
-        
-        bit_arr = print_sol(alloc, K, N)
+        Without `max_total_bit` only the DP of `total_bit` runs. Sweeps pass
+        their largest budget as `max_total_bit`; the DPs of all budgets up to
+        it then run once and are cached (see ``daa_allocations``).
+        """
+        if max_total_bit is None:
+            reward, bit_arr, feasible = _daa_dp(np.asarray(EV, dtype=np.float64), float(lamda), total_bit)
+        else:
+            rewards, bit_arrs, feasible = daa_allocations(EV, lamda, max(total_bit, max_total_bit))
+            reward, bit_arr, feasible = rewards[total_bit], bit_arrs[total_bit], feasible[total_bit]
+        if not feasible:
+            raise IndexError("cannot allocate {} bits over {} components".format(total_bit, len(EV)))
 
-        assert np.sum(bit_arr) == N
+        bit_arr = [int(bit) for bit in bit_arr]
+        assert np.sum(bit_arr) == total_bit
 
-        return DP[K][N], bit_arr[::-1]
+        return reward, bit_arr
 
@@ -0,0 +1,113 @@
+"""Online SPARTAN encoding of an unbounded series."""
+
+import numpy as np
+
+from numba import njit
+
+from .spartan import word_dtype
+
+
+@njit(cache=True)
+def _stream_words(buffer, position, n_seen, values, components, mean, breakpoints, n_breakpoints, words):
+    # buffer holds every sample twice, at t and t + window_size, so the last
+    # window is always the contiguous slice buffer[position:position+window_size]
+    window_size = len(mean)
+    word_length = components.shape[0]
+    n_words = 0
+    for value in values:
+        buffer[position] = value
+        buffer[position + window_size] = value
+        position += 1
+        if position == window_size:
+            position = 0
+        n_seen += 1
+        if n_seen < window_size:
+            continue
+
+        for letter in range(word_length):
+            projection = 0.0
+            for t in range(window_size):
+                projection += components[letter, t] * (buffer[position + t] - mean[t])
+            # np.digitize(projection, breakpoints, right=True)
+            symbol = np.searchsorted(breakpoints[letter], projection)
+            words[n_words, letter] = min(symbol, n_breakpoints[letter])
+        n_words += 1
+    return position, n_seen, n_words
+
+
+class SPARTANStream:
+    """Streaming encoder emitting one SPARTAN word per incoming sample.
+
+    The last ``window_size`` samples are kept in a ring buffer. Once it is
+    full, every new sample projects the current window onto the kept
+    principal components of the fitted SPARTAN and digitizes the projection
+    with its breakpoints, i.e. O(word_length * window_size) work per sample
+    and O(window_size) memory regardless of the length of the stream.
+
+    The words match ``SPARTAN.generate_words`` on the PCA projection of the
+    sliding windows, up to the rounding of the dot products. Unlike the
+    batch BOP ``transform``, the breakpoints learnt at fit time are kept
+    fixed, as a stream has no complete set of windows to re-bin on.
+
+    Parameters
+    ----------
+    spartan:            fitted SPARTAN, its PCA input length is the window size
+    """
+
+    def __init__(self, spartan):
+        self.spartan = spartan
+        pca = spartan.pca
+        word_length = len(spartan.breakpoints)
+
+        self.window_size = int(pca.n_features_in_)
+        self.word_length = word_length
+        self.mean = np.ascontiguousarray(pca.mean_, dtype=np.float64)
+        components = np.array(pca.components_[:word_length], dtype=np.float64)
+        if pca.whiten:
+            components /= np.sqrt(pca.explained_variance_[:word_length])[:, None]
+        self.components = np.ascontiguousarray(components)
+
+        # ragged breakpoints padded with +inf, which searchsorted never passes
+        self.n_breakpoints = np.array([len(breakpoints_i) for breakpoints_i in spartan.breakpoints], dtype=np.int64)
+        self.breakpoints = np.full((word_length, self.n_breakpoints.max()), np.inf)
+        for i, breakpoints_i in enumerate(spartan.breakpoints):
+            self.breakpoints[i, :len(breakpoints_i)] = breakpoints_i
+        self.dtype = word_dtype(spartan.breakpoints)
+
+        self.reset()
+
+    def reset(self):
+        """Forget all samples seen so far."""
+        self._buffer = np.zeros(2 * self.window_size)
+        self._position = 0
+        self.n_seen = 0
+        return self
+
+    def extend(self, values):
+        """Consume a batch of samples.
+
+        Returns
+        -------
+        words : 2d numpy array [N_words,word_length], one word per sample that
+            completes a window (the first window_size - 1 samples of the
+            stream emit none)
+        """
+        values = np.ascontiguousarray(np.ravel(values), dtype=np.float64)
+        n_words = max(0, min(len(values), self.n_seen + len(values) - self.window_size + 1))
+        words = np.empty((n_words, self.word_length), dtype=self.dtype)
+        self._position, self.n_seen, _ = _stream_words(self._buffer, self._position, self.n_seen, values,
+                                                       self.components, self.mean, self.breakpoints,
+                                                       self.n_breakpoints, words)
+        return words
+
+    def update(self, value):
+        """Consume one sample; returns its word, or None while the first
+        window is still being filled."""
+        words = self.extend(np.array([value], dtype=np.float64))
+        if len(words) == 0:
+            return None
+        return words[0]
+
+    def window(self):
+        """Copy of the last window_size samples, oldest first."""
+        return self._buffer[self._position:self._position + self.window_size].copy()
@@ -0,0 +1,121 @@
+"""Memory-bounded pairwise distances.
+
+Every metric in ``distance_vectorized`` broadcasts to an
+(n_X, n_Y, n_features) intermediate. The engine below tiles the query and
+reference sets so that each tile's intermediates fit in a memory budget,
+writes the tiles into one reused output buffer and optionally runs them on
+a thread pool (numpy releases the GIL inside the broadcast kernels). The
+MINDIST metrics run numba-parallel kernels, their tiles are evaluated one
+after the other and ``prange`` spreads each tile over the numba threads
+(numba's workqueue threading layer aborts when such kernels are launched
+from several threads).
+
+The module exposes a drop-in replacement with the same name and positional
+signature for each metric, e.g.::
+
+    from TSB_Symbolic.util.distance_blocked import spartan_pca_mindist
+    dist_mat = spartan_pca_mindist(X, Y, breakpoints, memory_budget=2**28, n_jobs=4)
+
+Each (i, j) entry only depends on X[i] and Y[j], so the blocked results are
+identical to the unblocked ones.
+"""
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse
+
+from . import distance_vectorized
+
+# bytes the intermediates of all concurrently running tiles may use
+DEFAULT_MEMORY_BUDGET = 256 * 2**20
+
+
+def _tile_shape(n_x, n_y, pair_bytes, memory_budget, n_jobs):
+    pairs_per_tile = max(1, int(memory_budget // n_jobs // pair_bytes))
+
+    tile_y = min(n_y, pairs_per_tile)
+    tile_x = max(1, min(n_x, pairs_per_tile // tile_y))
+    if n_jobs > 1 and tile_y == n_y:
+        # make sure every worker gets at least one tile
+        tile_x = min(tile_x, -(-n_x // n_jobs))
+    return tile_x, tile_y
+
+
+def pairwise_blocked(metric, X, Y, *args, memory_budget=DEFAULT_MEMORY_BUDGET,
+                     n_jobs=1, out=None, n_temporaries=4, thread_tiles=True, **kwargs):
+    """Evaluate ``metric(X, Y, *args, **kwargs)`` tile by tile.
+
+    Parameters
+    ----------
+    metric : callable, pairwise metric returning an [n_X, n_Y] matrix
+    X, Y : 2d numpy arrays or scipy.sparse matrices [N_instances, N_features]
+    memory_budget : int, bytes available to the intermediates of all tiles
+    n_jobs : int, number of threads evaluating tiles concurrently
+    out : optional [n_X, n_Y] array reused as the output buffer
+    n_temporaries : int, (n_X, n_Y, n_features) float64 temporaries the
+        metric allocates, used to size the tiles
+    thread_tiles : bool, whether tiles may run on the thread pool, False for
+        metrics that parallelize internally with numba (n_jobs is ignored)
+
+    Returns
+    -------
+    dist_mat : 2d numpy array [n_X, n_Y]
+    """
+    n_x, n_y = X.shape[0], Y.shape[0]
+    if n_x == 0 or n_y == 0:
+        return metric(X, Y, *args, **kwargs)
+
+    if scipy.sparse.issparse(X) or scipy.sparse.issparse(Y):
+        # sparse metrics only materialize (tile_x, tile_y) products
+        pair_bytes = 8 * n_temporaries
+    else:
+        pair_bytes = 8 * n_temporaries * max(1, int(np.prod(X.shape[1:])))
+
+    n_jobs = max(1, int(n_jobs)) if thread_tiles else 1
+    tile_x, tile_y = _tile_shape(n_x, n_y, pair_bytes, memory_budget, n_jobs)
+    tiles = [(i, j) for i in range(0, n_x, tile_x) for j in range(0, n_y, tile_y)]
+
+    def run_tile(tile):
+        i, j = tile
+        return metric(X[i:i + tile_x], Y[j:j + tile_y], *args, **kwargs)
+
+    # the first tile fixes the output dtype
+    first = np.asarray(run_tile(tiles[0]))
+    if out is None:
+        out = np.empty((n_x, n_y), dtype=first.dtype)
+    out[:first.shape[0], :first.shape[1]] = first
+
+    def store_tile(tile):
+        i, j = tile
+        out[i:i + tile_x, j:j + tile_y] = run_tile(tile)
+
+    if n_jobs > 1 and len(tiles) > 2:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            list(executor.map(store_tile, tiles[1:]))
+    else:
+        for tile in tiles[1:]:
+            store_tile(tile)
+
+    return out
+
+
+def _blocked(metric, n_temporaries, thread_tiles=True):
+    @functools.wraps(metric)
+    def blocked_metric(X, Y, *args, memory_budget=DEFAULT_MEMORY_BUDGET, n_jobs=1, out=None, **kwargs):
+        return pairwise_blocked(metric, X, Y, *args, memory_budget=memory_budget, n_jobs=n_jobs,
+                                out=out, n_temporaries=n_temporaries, thread_tiles=thread_tiles, **kwargs)
+    return blocked_metric
+
+
+symbol_vectorized = _blocked(distance_vectorized.symbol_vectorized, 2)
+hamming_vectorized = _blocked(distance_vectorized.hamming_vectorized, 2)
+euclidean_vectorized = _blocked(distance_vectorized.euclidean_vectorized, 3)
+cosine_similarity_vectorized = _blocked(distance_vectorized.cosine_similarity_vectorized, 2)
+kl_divergence = _blocked(distance_vectorized.kl_divergence, 3)
+boss_vectorized = _blocked(distance_vectorized.boss_vectorized, 4)
+euclidean_sparse = _blocked(distance_vectorized.euclidean_sparse, 4)
+# the MINDIST kernels are numba-parallel
+sax_mindist = _blocked(distance_vectorized.sax_mindist, 1, thread_tiles=False)
+spartan_pca_mindist = _blocked(distance_vectorized.spartan_pca_mindist, 1, thread_tiles=False)
+mindist_minmax = _blocked(distance_vectorized.mindist_minmax, 10)
@@ -1,5 +1,6 @@
 import numpy as np
 from numba import njit, prange
+from scipy.sparse import csr_matrix
 
 def symbol_vectorized(X,Y):
     dist = np.sum(np.abs(X[:,None,:] - Y[None,:,:]),axis=2)
@@ -62,6 +63,22 @@ def boss_vectorized(X,Y):
 
     dist = np.sum(diff**2,axis=2)
     return dist
+# Sparse histogram counterpart: expand the squared differences into sparse
+# products so no (n_X, n_Y, vocab) intermediate is materialized.
+def _sparse_row_sum(X):
+    return np.asarray(X.sum(axis=1)).ravel()
+
+def euclidean_sparse(X,Y):
+    X = csr_matrix(X, dtype=np.float64)
+    Y = csr_matrix(Y, dtype=np.float64)
+
+    xx = _sparse_row_sum(X.multiply(X))
+    yy = _sparse_row_sum(Y.multiply(Y))
+    xy = (X @ Y.T).toarray()
+
+    dist = np.sqrt(np.maximum(xx[:,None] + yy[None,:] - 2 * xy, 0))
+    return dist
+
 def symbol_weighted(X,Y,weights):
     dist = np.sum(np.abs(X[:,None,:] - Y[None,:,:]) * weights[None,None,:],axis=2)
     return dist
@@ -95,67 +112,93 @@ def l1_mindist(X,Y,breakpoints):
 
     return dist
 
-def sax_mindist(X,Y,breakpoints, ts_len=None):
-    
-    # bug fix: \sqrt{n/w} scaling
-    n_instances,word_length = X.shape
-    n_yinstances,word_length = Y.shape
-    z = np.zeros((n_instances,n_yinstances,word_length))
+# Lower bounding distances (SAX, SFA and SPARTAN PCA) through per-letter
+# lookup tables: cell(a,b)^2 = (bp[max(a,b)] - bp[min(a,b)+1])^2 when |a-b| > 1,
+# else 0. Above this alphabet size the kernel reads the breakpoints directly
+# instead of building (word_length, a_max, a_max) tables.
+MINDIST_TABLE_MAX_ALPHABET = 256
+
+def padded_mindist_breakpoints(breakpoints):
+    """Stack ragged per-letter breakpoints [w][a_i+1] into a (w, a_max+1) array,
+    padding each letter with its last breakpoint."""
+    lengths = [len(bp) for bp in breakpoints]
+    padded = np.empty((len(breakpoints), max(lengths)))
+    for i, bp in enumerate(breakpoints):
+        padded[i,:lengths[i]] = bp
+        padded[i,lengths[i]:] = bp[-1]
+    return padded
+
+def mindist_tables(breakpoints):
+    """Per-letter squared cell distances, shape (word_length, a_max, a_max)."""
+    padded = padded_mindist_breakpoints(breakpoints)
+    alphabet_size = padded.shape[1] - 1
+
+    symbols = np.arange(alphabet_size)
+    ind_max = np.maximum(symbols[:,None],symbols[None,:])
+    ind_min = np.minimum(symbols[:,None],symbols[None,:]) + 1
+    cond = np.abs(symbols[:,None] - symbols[None,:]) <= 1
+
+    # cells with |a-b| <= 1 may touch the +-float max sentinels, they are masked anyway
+    with np.errstate(over='ignore', invalid='ignore'):
+        bp_diff = padded[:,ind_max] - padded[:,ind_min]
+        return np.where(cond[None,:,:],0.0,bp_diff**2)
+
+@njit(parallel=True, cache=True)
+def _mindist_table_kernel(X, Y, tables):
+    n_instances, word_length = X.shape
+    n_yinstances = Y.shape[0]
+    dist = np.empty((n_instances, n_yinstances))
+    for p in prange(n_instances):
+        for q in range(n_yinstances):
+            cell_sum = 0.0
+            for i in range(word_length):
+                cell_sum += tables[i, X[p,i], Y[q,i]]
+            dist[p,q] = cell_sum
+    return dist
 
-    # print(breakpoints)
+@njit(parallel=True, cache=True)
+def _mindist_breakpoint_kernel(X, Y, breakpoints):
+    n_instances, word_length = X.shape
+    n_yinstances = Y.shape[0]
+    dist = np.empty((n_instances, n_yinstances))
+    for p in prange(n_instances):
+        for q in range(n_yinstances):
+            cell_sum = 0.0
+            for i in range(word_length):
+                x, y = X[p,i], Y[q,i]
+                if abs(x - y) > 1:
+                    bp_diff = breakpoints[i, max(x, y)] - breakpoints[i, min(x, y) + 1]
+                    cell_sum += bp_diff * bp_diff
+            dist[p,q] = cell_sum
+    return dist
 
-    X_ind = X + 1
-    X_ind = X_ind.astype(np.int32)
-    Y_ind = Y + 1
-    Y_ind = Y_ind.astype(np.int32)
+def mindist_squared(X,Y,breakpoints):
+    """Sum over letters of the squared lower-bound cells, shape (n_X, n_Y)."""
+    X = np.ascontiguousarray(X, dtype=np.int64)
+    Y = np.ascontiguousarray(Y, dtype=np.int64)
 
-    cond = (np.abs((X_ind[:,None,:] - Y_ind[None,:,:])) <= 1)
+    alphabet_size = max(len(bp) for bp in breakpoints) - 1
+    if alphabet_size <= MINDIST_TABLE_MAX_ALPHABET:
+        return _mindist_table_kernel(X, Y, mindist_tables(breakpoints))
+    return _mindist_breakpoint_kernel(X, Y, padded_mindist_breakpoints(breakpoints))
 
-    ind_max = np.maximum(X_ind[:,None,:],Y_ind[None,:,:]) - 1
-    ind_min = np.minimum(X_ind[:,None,:],Y_ind[None,:,:])
-    breakpoint_max = np.concatenate([np.expand_dims(breakpoints[i][ind_max[:,:,i]],axis=2) for i in range(word_length)],axis=2)
-    breakpoint_min = np.concatenate([np.expand_dims(breakpoints[i][ind_min[:,:,i]],axis=2) for i in range(word_length)],axis=2)
+def sax_mindist(X,Y,breakpoints, ts_len=None):
     
-    bp_diff = breakpoint_max - breakpoint_min
-
-    # print(z.shape)
-    # print(bp_diff.shape)
+    # bug fix: \sqrt{n/w} scaling
+    n_instances,word_length = X.shape
 
-    cell = np.where(cond,z,bp_diff)
+    cell_sum = mindist_squared(X,Y,breakpoints)
 
     if ts_len is None:
-        dist_mat = np.sqrt(np.sum(np.abs(cell)**2,axis=2))
+        dist_mat = np.sqrt(cell_sum)
     else:
-        dist_mat = np.sqrt(np.sum(np.abs(cell)**2,axis=2)*ts_len/word_length)
+        dist_mat = np.sqrt(cell_sum*ts_len/word_length)
 
-    # print(dist_mat)
     return dist_mat
 
 # Lower bounding distance for Spartan PCA
 def spartan_pca_mindist(X,Y,breakpoints):
-    n_instances,word_length = X.shape
-    n_yinstances,word_length = Y.shape
-    z = np.zeros((n_instances,n_yinstances,word_length))
-
-    X_ind = X + 1
-    Y_ind = Y + 1
-
-    cond = (np.abs((X_ind[:,None,:] - Y_ind[None,:,:])) <= 1)
-
-    ind_max = np.maximum(X_ind[:,None,:],Y_ind[None,:,:]) - 1
-    ind_max = ind_max.astype(np.int32)
-    ind_min = np.minimum(X_ind[:,None,:],Y_ind[None,:,:])
-    ind_min = ind_min.astype(np.int32)
-        
-
-    breakpoint_max = np.concatenate([np.expand_dims(breakpoints[i][ind_max[:,:,i]],axis=2) for i in range(word_length)],axis=2)
-    breakpoint_min = np.concatenate([np.expand_dims(breakpoints[i][ind_min[:,:,i]],axis=2) for i in range(word_length)],axis=2)
-    
-    bp_diff = breakpoint_max - breakpoint_min
-
-    cell = np.where(cond,z,bp_diff)
-
-    dist_mat = np.sqrt(np.sum((cell**2),axis=2))
+    dist_mat = np.sqrt(mindist_squared(X,Y,breakpoints))
     return dist_mat
 
 def mindist_minmax(X,Y,breakpoints):
@@ -0,0 +1,31 @@
+"""Thread count of the numba-parallel kernels.
+
+The models run their kernels inside ``numba_threads(n_jobs)`` instead of
+calling ``numba.set_num_threads`` when they are built, so constructing a
+model never changes the thread count of the process (e.g. the per-worker
+split set by main.py) and never asks numba for more threads than it has.
+"""
+import contextlib
+
+import numba
+
+
+def numba_thread_count(n_jobs):
+    """n_jobs clamped to the threads numba was started with.
+
+    n_jobs < 1 keeps the current thread count.
+    """
+    if n_jobs is None or n_jobs < 1:
+        return numba.get_num_threads()
+    return min(int(n_jobs), numba.config.NUMBA_NUM_THREADS)
+
+
+@contextlib.contextmanager
+def numba_threads(n_jobs):
+    """Run the enclosed numba kernels on ``numba_thread_count(n_jobs)`` threads."""
+    previous = numba.get_num_threads()
+    numba.set_num_threads(numba_thread_count(n_jobs))
+    try:
+        yield
+    finally:
+        numba.set_num_threads(previous)
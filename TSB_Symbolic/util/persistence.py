@@ -0,0 +1,179 @@
+"""Versioned on-disk format for fitted transformers and classifiers.
+
+A model is stored as one uncompressed .npz archive of named numpy arrays
+plus a JSON header with the format version, the model class and its scalar
+parameters. Archives are read with ``allow_pickle=False``, so loading never
+runs pickled code, and the models only store what inference needs (e.g. the
+PCA projection and breakpoints, not the training series)::
+
+    model.save("spartan.npz")
+    model = SPARTAN.load("spartan.npz")
+
+Nested models (the transformer inside a classifier) are stored in the same
+archive under a name prefix, see ``prefixed`` and ``unprefixed``.
+"""
+import json
+
+import numpy as np
+import scipy.sparse
+
+# bump when the layout of a stored model changes; older readers refuse newer files
+FORMAT_VERSION = 1
+
+_HEADER = "__header__"
+
+
+def _json_default(value):
+    # numpy scalars and arrays that end up in the parameters
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError("cannot store parameter of type {}".format(type(value).__name__))
+
+
+def save_model(path, kind, params, arrays):
+    """Write a model archive.
+
+    Parameters
+    ----------
+    path : str or file object, ``np.savez`` appends .npz to names without it
+    kind : str, model class name checked by ``load_model``
+    params : dict of JSON serializable parameters
+    arrays : dict of numpy arrays, None values are skipped
+    """
+    header = {"format_version": FORMAT_VERSION, "kind": kind, "params": params}
+    payload = {_HEADER: np.frombuffer(json.dumps(header, default=_json_default).encode("utf-8"), dtype=np.uint8)}
+    for name, value in arrays.items():
+        if value is None:
+            continue
+        value = np.asarray(value)
+        if value.dtype == object:
+            raise TypeError("cannot store object array '{}'".format(name))
+        payload[name] = value
+    np.savez(path, **payload)
+
+
+def load_model(path, kind):
+    """Read a model archive written by ``save_model``.
+
+    Returns
+    -------
+    params : dict
+    arrays : dict of numpy arrays
+    """
+    with np.load(path, allow_pickle=False) as archive:
+        if _HEADER not in archive.files:
+            raise ValueError("{} is not a model archive".format(path))
+        header = json.loads(archive[_HEADER].tobytes().decode("utf-8"))
+        arrays = {name: archive[name] for name in archive.files if name != _HEADER}
+
+    if header["format_version"] > FORMAT_VERSION:
+        raise ValueError("model format version {} is newer than the supported version {}".format(
+            header["format_version"], FORMAT_VERSION))
+    if header["kind"] != kind:
+        raise ValueError("archive holds a {}, not a {}".format(header["kind"], kind))
+    return header["params"], arrays
+
+
+def prefixed(prefix, arrays):
+    """Arrays of a nested model, named ``prefix.name``."""
+    return {prefix + "." + name: value for name, value in arrays.items()}
+
+
+def unprefixed(prefix, arrays):
+    """Inverse of ``prefixed``: the arrays under ``prefix`` with the prefix stripped."""
+    start = len(prefix) + 1
+    return {name[start:]: value for name, value in arrays.items() if name.startswith(prefix + ".")}
+
+
+def pack_ragged(rows):
+    """A list of 1d arrays as concatenated values and offsets."""
+    lengths = [len(row) for row in rows]
+    return {
+        "values": np.concatenate([np.asarray(row, dtype=np.float64) for row in rows]) if rows else np.empty(0),
+        "offsets": np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]),
+    }
+
+
+def unpack_ragged(arrays):
+    """Inverse of ``pack_ragged``."""
+    values, offsets = arrays["values"], arrays["offsets"]
+    return [values[offsets[i]:offsets[i + 1]].copy() for i in range(len(offsets) - 1)]
+
+
+def pack_matrix(matrix):
+    """A dense array or scipy.sparse matrix (stored as CSR)."""
+    if matrix is None:
+        return {}
+    if scipy.sparse.issparse(matrix):
+        matrix = scipy.sparse.csr_matrix(matrix)
+        return {"data": matrix.data, "indices": matrix.indices, "indptr": matrix.indptr,
+                "shape": np.asarray(matrix.shape, dtype=np.int64)}
+    return {"dense": np.asarray(matrix)}
+
+
+def unpack_matrix(arrays):
+    """Inverse of ``pack_matrix``; None if nothing was stored."""
+    if "dense" in arrays:
+        return arrays["dense"]
+    if "data" in arrays:
+        return scipy.sparse.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]),
+                                       shape=tuple(arrays["shape"]))
+    return None
+
+
+def pack_labels(y):
+    """Class labels as a non-object array (object arrays need pickle)."""
+    if y is None:
+        return None
+    y = np.asarray(y)
+    if y.dtype == object:
+        y = np.asarray(y.tolist())
+    return y
+
+
+def pack_pca(pca):
+    """Parameters and arrays of a fitted sklearn PCA or IncrementalPCA."""
+    params = {
+        "class": type(pca).__name__,
+        "n_components": pca.n_components,
+        "n_components_": int(pca.n_components_),
+        "n_features_in_": int(pca.n_features_in_),
+        "whiten": bool(pca.whiten),
+        "n_samples": int(getattr(pca, "n_samples_", getattr(pca, "n_samples_seen_", 0))),
+    }
+    arrays = {
+        "mean": pca.mean_,
+        "components": pca.components_,
+        "explained_variance": pca.explained_variance_,
+        "explained_variance_ratio": pca.explained_variance_ratio_,
+        "singular_values": pca.singular_values_,
+        "noise_variance": np.asarray(pca.noise_variance_, dtype=np.float64),
+    }
+    return params, arrays
+
+
+def unpack_pca(params, arrays):
+    """Fitted PCA (or IncrementalPCA) from ``pack_pca`` output, ready to transform."""
+    from sklearn.decomposition import PCA, IncrementalPCA
+
+    if params["class"] == "IncrementalPCA":
+        pca = IncrementalPCA(n_components=params["n_components"], whiten=params["whiten"])
+        pca.n_samples_seen_ = params["n_samples"]
+    else:
+        pca = PCA(n_components=params["n_components"], whiten=params["whiten"])
+        pca.n_samples_ = params["n_samples"]
+    pca.n_components_ = params["n_components_"]
+    pca.n_features_in_ = params["n_features_in_"]
+    pca.mean_ = arrays["mean"]
+    pca.components_ = arrays["components"]
+    pca.explained_variance_ = arrays["explained_variance"]
+    pca.explained_variance_ratio_ = arrays["explained_variance_ratio"]
+    pca.singular_values_ = arrays["singular_values"]
+    pca.noise_variance_ = float(arrays["noise_variance"])
+    return pca
@@ -0,0 +1,171 @@
+import math
+
+import numpy as np
+import scipy.stats
+
+from numba import njit, prange
+from numpy.lib.stride_tricks import sliding_window_view
+
+# upper bound on the bytes of a materialized window block handed to a consumer
+WINDOW_CHUNK_BYTES = 64 * 2**20
+
+# windows whose std is below this fraction of their |mean| are flat: their
+# z-normalization is dominated by rounding (scipy's zscore gives nan or +-1)
+FLAT_STD_RTOL = 1e-8
+
+
+def sliding_windows(X, window_size):
+    """Zero-copy view of all sliding windows of X.
+
+    Parameters
+    ----------
+    X : 1d or 2d numpy array [N_instances,N_timepoints]
+    window_size : int, length of each window
+
+    Returns
+    -------
+    read-only strided view of shape [N_instances,N_windows,window_size]
+    (or [N_windows,window_size] for a 1d series)
+    """
+    return sliding_window_view(X, window_size, axis=-1)
+
+
+def window_chunk_size(window_size, chunk_bytes=WINDOW_CHUNK_BYTES):
+    """Number of float64 windows that fit in one block of chunk_bytes."""
+    return max(1, int(chunk_bytes // (8 * window_size)))
+
+
+def iter_window_chunks(X, window_size, chunk_size=None, znorm=False):
+    """Iterate over the sliding windows of X in bounded blocks.
+
+    Blocks are 2d arrays [N_rows,window_size] that follow the instance-major
+    order of ``sliding_windows(X, window_size).reshape(-1, window_size)``, so
+    concatenating the per-block results of a row-wise consumer gives the same
+    output as running it on the fully materialized window matrix, while only
+    one block of windows is alive at a time.
+
+    Parameters
+    ----------
+    X : 1d or 2d numpy array [N_instances,N_timepoints]
+    window_size : int, length of each window
+    chunk_size : int, windows per block (default: WINDOW_CHUNK_BYTES worth)
+    znorm : bool, z-normalize every window (scipy.stats.zscore semantics)
+
+    Yields
+    ------
+    start : int, flat index of the first window in the block
+    block : 2d numpy array [N_rows,window_size]
+    """
+    windows = sliding_windows(np.atleast_2d(X), window_size)
+    n_instances, num_windows = windows.shape[:2]
+    if chunk_size is None:
+        chunk_size = window_chunk_size(window_size)
+
+    start = 0
+    if num_windows >= chunk_size:
+        # split the windows of each instance
+        for i in range(n_instances):
+            for j in range(0, num_windows, chunk_size):
+                block = np.ascontiguousarray(windows[i, j:j + chunk_size])
+                yield start, _znorm(block) if znorm else block
+                start += block.shape[0]
+    else:
+        # group whole instances into one block
+        insts_per_chunk = chunk_size // num_windows
+        for i in range(0, n_instances, insts_per_chunk):
+            block = windows[i:i + insts_per_chunk].reshape(-1, window_size)
+            yield start, _znorm(block) if znorm else block
+            start += block.shape[0]
+
+
+def map_windows(func, X, window_size, chunk_size=None, znorm=False):
+    """Apply a row-wise function to all windows of X block by block.
+
+    Equivalent to ``func(sliding_windows(X, window_size).reshape(-1, window_size))``
+    with peak memory proportional to one block plus the output.
+
+    Returns
+    -------
+    2d numpy array [N_instances*N_windows, ...]
+    """
+    windows = sliding_windows(np.atleast_2d(X), window_size)
+    n_rows = windows.shape[0] * windows.shape[1]
+
+    out = None
+    for start, block in iter_window_chunks(X, window_size, chunk_size, znorm):
+        result = func(block)
+        if out is None:
+            out = np.empty((n_rows,) + result.shape[1:], dtype=result.dtype)
+        out[start:start + result.shape[0]] = result
+    return out
+
+
+def take_windows(X, window_size, indices, znorm=False):
+    """Gather windows by flat (instance-major) index without materializing the rest."""
+    windows = sliding_windows(np.atleast_2d(X), window_size)
+    indices = np.asarray(indices)
+    block = windows[indices // windows.shape[1], indices % windows.shape[1]]
+    return _znorm(block) if znorm else block
+
+
+@njit(cache=True)
+def _rolling_mean_std_series(x, window_size, means, stds):
+    # running sums of x - shift, restarted (and re-shifted) every window_size
+    # windows so that neither the cancellation nor the drift of the updates grows
+    num_windows = len(x) - window_size + 1
+    r_window_length = 1.0 / window_size
+
+    for block_start in range(0, num_windows, window_size):
+        shift = x[block_start]
+        series_sum = 0.0
+        square_sum = 0.0
+        for t in range(block_start, block_start + window_size):
+            value = x[t] - shift
+            series_sum += value
+            square_sum += value * value
+
+        for w in range(block_start, min(block_start + window_size, num_windows)):
+            if w > block_start:
+                value_in = x[w + window_size - 1] - shift
+                value_out = x[w - 1] - shift
+                series_sum += value_in - value_out
+                square_sum += value_in * value_in - value_out * value_out
+            mean = series_sum * r_window_length
+            means[w] = shift + mean
+            stds[w] = math.sqrt(max(square_sum * r_window_length - mean * mean, 0.0))
+
+
+@njit(parallel=True, cache=True)
+def rolling_mean_std(X, window_size):
+    """Mean and (ddof=0) standard deviation of all sliding windows of X.
+
+    O(N_timepoints) per instance, the windows are never materialized. Used
+    to z-normalize window statistics analytically, e.g. the PAA of the
+    z-normalized window is ``(paa - mean) / std``; see ``flat_windows`` for
+    the windows where that does not reproduce ``scipy.stats.zscore``.
+
+    Parameters
+    ----------
+    X : 2d numpy array [N_instances,N_timepoints]
+    window_size : int, length of each window
+
+    Returns
+    -------
+    means, stds : 2d numpy arrays [N_instances,N_windows]
+    """
+    n_instances, series_length = X.shape
+    num_windows = series_length - window_size + 1
+    means = np.zeros((n_instances, num_windows))
+    stds = np.zeros((n_instances, num_windows))
+    for i in prange(n_instances):
+        _rolling_mean_std_series(X[i], window_size, means[i], stds[i])
+    return means, stds
+
+
+def flat_windows(means, stds):
+    """Mask of the (near) constant windows among ``rolling_mean_std`` output."""
+    return stds <= FLAT_STD_RTOL * np.abs(means)
+
+
+def _znorm(block):
+    return scipy.stats.zscore(block, axis=1)
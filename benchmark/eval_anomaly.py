@@ -14,7 +14,7 @@ from TSB_Symbolic.onennclassifier.sax_classifier import SAXDictionaryClassifier
 from TSB_Symbolic.onennclassifier.sfa_classifier import SFADictionaryClassifier
 from TSB_Symbolic.onennclassifier.spartan_classifier import SPARTANClassifier
 
-def parse_arguments():
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("-d", "--data", required=False, default="../Univariate_ts/")
     parser.add_argument("-p", "--problem", required=False, default="NAB")  # see data_loader.regression_datasets
@@ -31,12 +31,11 @@ def parse_arguments():
     parser.add_argument("-t","--repr_type",default='single', type=str, choices=['single', 'bop'])
 
 
-    arguments = parser.parse_args()
+    arguments = parser.parse_args(argv)
     return arguments
 
-if __name__ == "__main__":
+def run(arguments):
 
-    arguments = parse_arguments()
     module = 'SymbolicRepresentationExperiments'
 
     data_path = arguments.data
@@ -186,4 +185,11 @@ if __name__ == "__main__":
 
     filename = output_directory + 'anomaly_results.csv'
     with open(filename, 'a') as f:
-        results.to_csv(f, mode='a', header=f.tell()==0,index=False)
\ No newline at end of file
+        results.to_csv(f, mode='a', header=f.tell()==0,index=False)
+
+    return results
+
+
+if __name__ == "__main__":
+
+    run(parse_arguments())
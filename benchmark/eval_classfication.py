@@ -22,7 +22,7 @@ from TSB_Symbolic.onennclassifier.sax_vfd_classifier import SAXVFDDictionaryClas
 from TSB_Symbolic.onennclassifier.sfa_classifier import SFADictionaryClassifier
 from TSB_Symbolic.onennclassifier.spartan_classifier import SPARTANClassifier
 
-def parse_arguments():
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("-d", "--data", required=False, default="data/ucr/Univariate_ts/")
     parser.add_argument("-p", "--problem", required=False, default="ArrowHead")  # see data_loader.regression_datasets
@@ -35,17 +35,17 @@ def parse_arguments():
     parser.add_argument("-m","--dataset_num",required=False,default=1, type=int)
     parser.add_argument("-w","--store_words",default=None)
     parser.add_argument("-t","--downsample",default=1.0, type=float)
+    parser.add_argument("--cache_dir", required=False, default=None) # cache of the parsed datasets, disabled if None
 
-    arguments = parser.parse_args()
+    arguments = parser.parse_args(argv)
 
     return arguments
 
 
-if __name__ == "__main__":
+def run(arguments):
     
     module = 'SymbolicRepresentationExperiments'
 
-    arguments = parse_arguments()
     data_path = arguments.data
     classifier_name = arguments.classifier
     normalization = arguments.norm
@@ -76,7 +76,7 @@ if __name__ == "__main__":
 
     #Call Datasets
     print("[{}] Loading data".format(module))
-    X_train,y_train,X_test,y_test = create_numpy_dataset(name=problem,path=data_path)
+    X_train,y_train,X_test,y_test = create_numpy_dataset(name=problem,path=data_path,cache_dir=arguments.cache_dir)
 
     #Create Normalizer & Normalize Data
     print("[{}] X_train: {}".format(module, X_train.shape))
@@ -200,6 +200,8 @@ if __name__ == "__main__":
 
         print(f'Fit time: {(fit_end - fit_start):.4f}s')
         print(f'Pred time: {(pred_end - pred_start):.4f}s')
+        if getattr(clf, 'pruning_ratio', None) is not None:
+            print(f'Pruning ratio: {clf.pruning_ratio:.4f}')
 
         avg_results = avg_results.mean().to_frame().T
         model_params = pd.DataFrame([model_kwargs])
@@ -212,3 +214,10 @@ if __name__ == "__main__":
         filename = output_directory + 'classification_results.csv'
         with open(filename, 'a') as f:
             final_results.to_csv(f, mode='a', header=f.tell()==0,index=False)
+
+    return final_results
+
+
+if __name__ == "__main__":
+
+    run(parse_arguments())
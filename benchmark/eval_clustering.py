@@ -4,6 +4,7 @@ import os
 import time
 import numpy as np
 import pandas as pd
+import scipy.sparse
 
 from .util.dataset import create_numpy_dataset
 from .util.normalization import create_normalizer
@@ -27,7 +28,7 @@ from TSB_Symbolic.onennclassifier.spartan_classifier import SPARTANClassifier
 from sklearn.cluster import KMeans
 
 
-def parse_arguments():
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("-d", "--data", required=False, default="data/ucr/Univariate_ts/")
     parser.add_argument("-p", "--problem", required=False, default="ArrowHead")  # see data_loader.regression_datasets
@@ -45,16 +46,16 @@ def parse_arguments():
     parser.add_argument("-e","--repeat_num",default=10, type=int)
     parser.add_argument("-b","--data_split",default='merge', type=str, choices=['split', 'merge'])
     parser.add_argument("-t","--repr_type",default='single', type=str, choices=['single', 'bop'])
+    parser.add_argument("--cache_dir", required=False, default=None) # cache of the parsed datasets, disabled if None
 
 
-    arguments = parser.parse_args()
+    arguments = parser.parse_args(argv)
 
     return arguments
 
 
-if __name__ == "__main__":
+def run(arguments):
 
-    arguments = parse_arguments()
     module = 'SymbolicRepresentationExperiments'
 
     data_path = arguments.data
@@ -92,7 +93,7 @@ if __name__ == "__main__":
 
     #Call Datasets
     print("[{}] Loading data".format(module))
-    X_train,y_train,X_test,y_test = create_numpy_dataset(name=problem,path=data_path)
+    X_train,y_train,X_test,y_test = create_numpy_dataset(name=problem,path=data_path,cache_dir=arguments.cache_dir)
 
     #Create Normalizer & Normalize Data
     X_train = X_train[:,0,:]
@@ -192,6 +193,8 @@ if __name__ == "__main__":
 
     elif repr_type == 'bop':
         test_repr = clf.pred_histogram
+        if scipy.sparse.issparse(test_repr):
+            test_repr = test_repr.toarray()
         test_repr = test_repr.reshape(len(test_repr), -1)
         
         test_dist_mat = symbol_vectorized(test_repr,test_repr)
@@ -277,6 +280,9 @@ if __name__ == "__main__":
     with open(filename, 'a') as f:
         results.to_csv(f, mode='a', header=f.tell()==0,index=False)
 
+    return results
 
 
+if __name__ == "__main__":
 
+    run(parse_arguments())
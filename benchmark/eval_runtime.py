@@ -0,0 +1,610 @@
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+import scipy.sparse
+import numba
+from tsfresh.feature_extraction import feature_calculators
+
+from TSB_Symbolic.symbolic.spartan.spartan import SPARTAN
+from TSB_Symbolic.symbolic.spartan.streaming import SPARTANStream
+from TSB_Symbolic.onennclassifier.spartan_classifier import SPARTANClassifier
+from TSB_Symbolic.symbolic.sfa.sfa_fast_numba import _mft, generate_words as sfa_generate_words
+from TSB_Symbolic.index import SPARTANIndex
+from TSB_Symbolic.symbolic.paa.paa_tfsax import PAATFSAX
+from TSB_Symbolic.symbolic.paa.paa_sax_dr import PAASAXDR
+from TSB_Symbolic.symbolic.paa.paa_sax_vfd import PAASAXVFD
+from TSB_Symbolic.symbolic.paa.paa_numba import paa_segments
+from TSB_Symbolic.util.windowing import map_windows, iter_window_chunks
+from TSB_Symbolic.util import distance_vectorized, distance_blocked
+
+from .util import distance_vectorized as legacy_distance_vectorized
+from .util.dataset import load_from_tsfile
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--bench", required=False, default="generate_words", type=str, choices=['generate_words', 'sliding_windows', 'pairwise_distance', 'mindist', 'index', 'ts_parser', 'streaming', 'memory', 'sfa_threads', 'rolling_znorm', 'vfd_features'])
+    parser.add_argument("-n", "--num_windows", required=False, default=[10**5, 10**6, 10**7], type=int, nargs='+')
+    parser.add_argument("-w", "--word_length", required=False, default=8, type=int)
+    parser.add_argument("-a", "--alphabet_size", required=False, default=4, type=int)
+    parser.add_argument("-l", "--legacy_max", required=False, default=10**5, type=int) # rows timed with the old loop, larger sizes are extrapolated
+    parser.add_argument("-r", "--repeat", required=False, default=3, type=int)
+    parser.add_argument("-s", "--series_length", required=False, default=[10**5, 10**6], type=int, nargs='+')
+    parser.add_argument("--window_size", required=False, default=100, type=int)
+    parser.add_argument("-v", "--vocab_size", required=False, default=4**6, type=int)
+    parser.add_argument("-i", "--num_instances", required=False, default=[100, 200], type=int, nargs='+')
+    parser.add_argument("-m", "--memory_budget", required=False, default=distance_blocked.DEFAULT_MEMORY_BUDGET, type=int)
+    parser.add_argument("-j", "--n_jobs", required=False, default=1, type=int)
+    parser.add_argument("-k", "--n_neighbors", required=False, default=1, type=int)
+    parser.add_argument("--leaf_size", required=False, default=1000, type=int)
+    parser.add_argument("-d", "--data", required=False, default="data/ucr/Univariate_ts/")
+    parser.add_argument("-p", "--problem", required=False, default=None) # UCR problem for the memory benchmark, synthetic data if not set
+
+    arguments = parser.parse_args()
+    return arguments
+
+
+def legacy_generate_words(pca, breakpoints, word_length):
+    # per (instance, letter) digitize loop, kept as the reference implementation
+    words = np.zeros((pca.shape[0], word_length))
+    for a in range(pca.shape[0]):
+        for i in range(word_length):
+            words[a, i] = np.digitize(pca[a, i], breakpoints[i], right=True)
+    return words
+
+
+def legacy_vfd_features(windows, bounds, feat_list):
+    # per (window, segment, feature) tsfresh calls, kept as the reference implementation
+    paa = PAASAXVFD()
+    calculators = {
+        'max': feature_calculators.maximum,
+        'min': feature_calculators.minimum,
+        'mean': feature_calculators.mean,
+        'median': feature_calculators.median,
+        'var': feature_calculators.variance,
+        'skew': feature_calculators.skewness,
+        'kurtosis': feature_calculators.kurtosis,
+        'range': lambda seg: np.max(seg) - np.mean(seg),
+        'IQR': lambda seg: np.percentile(seg, 75) - np.percentile(seg, 25),
+        'entropy': paa.entropy,
+        'bEn': lambda seg: feature_calculators.binned_entropy(seg, max_bins=10),
+        'apEn': lambda seg: feature_calculators.approximate_entropy(seg, m=3, r=0.2),
+        'sampEn': feature_calculators.sample_entropy,
+        'slope': paa.slope,
+        'abs_en': feature_calculators.abs_energy,
+        'abs_sum_of_ch': feature_calculators.absolute_sum_of_changes,
+        'mean_abs_ch': feature_calculators.mean_abs_change,
+        'mean_sec_deri_central': feature_calculators.mean_second_derivative_central,
+    }
+    features = np.zeros((windows.shape[0], (len(bounds) - 1) * len(feat_list)))
+    for n in range(windows.shape[0]):
+        features[n] = [calculators[feat_name](windows[n, bounds[j]:bounds[j + 1]])
+                       for j in range(len(bounds) - 1) for feat_name in feat_list]
+    return features
+
+
+def best_time(func, repeat):
+    runtimes = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        runtimes.append(time.perf_counter() - start_time)
+    return min(runtimes)
+
+
+def bench_generate_words(arguments, module):
+    rng = np.random.default_rng(0)
+
+    spartan = SPARTAN(alphabet_size=arguments.alphabet_size, word_length=arguments.word_length, window_size=16)
+    spartan.fit(rng.standard_normal((64, 128)))
+    print("[{}] DAA alphabet sizes: {}".format(module, spartan.alphabet_size))
+
+    results = []
+    for num_windows in arguments.num_windows:
+        pca = rng.standard_normal((num_windows, arguments.word_length))
+
+        words = spartan.generate_words(pca, spartan.breakpoints)
+        legacy_rows = min(num_windows, arguments.legacy_max)
+        legacy_words = legacy_generate_words(pca[:legacy_rows], spartan.breakpoints, arguments.word_length)
+        assert np.array_equal(words[:legacy_rows], legacy_words)
+
+        batched_time = best_time(lambda: spartan.generate_words(pca, spartan.breakpoints), arguments.repeat)
+        legacy_time = best_time(
+            lambda: legacy_generate_words(pca[:legacy_rows], spartan.breakpoints, arguments.word_length), 1)
+        legacy_time = legacy_time * num_windows / legacy_rows
+
+        results.append({
+            'num_windows': num_windows,
+            'legacy_s': legacy_time,
+            'legacy_extrapolated': legacy_rows < num_windows,
+            'batched_s': batched_time,
+            'speedup': legacy_time / batched_time,
+            'legacy_mb': num_windows * arguments.word_length * np.dtype(np.float64).itemsize / 2**20,
+            'batched_mb': words.nbytes / 2**20,
+        })
+        print("[{}] {}".format(module, results[-1]))
+
+    return pd.DataFrame(results)
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    result = func()
+    runtime = time.perf_counter() - start_time
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, runtime, peak
+
+
+def bench_sliding_windows(arguments, module):
+    rng = np.random.default_rng(0)
+    window_size = arguments.window_size
+
+    spartan = SPARTAN(word_length=arguments.word_length, window_size=window_size)
+    spartan.fit(rng.standard_normal((16, 4 * window_size)).cumsum(axis=1))
+
+    results = []
+    for series_length in arguments.series_length:
+        X = rng.standard_normal((1, series_length)).cumsum(axis=1)
+        num_windows = series_length - window_size + 1
+
+        def legacy():
+            # fancy-indexed window tensor, projected in one call
+            split = X[:, np.arange(window_size)[None, :] + np.arange(num_windows)[:, None]]
+            return spartan.pca.transform(split.reshape(-1, window_size))
+
+        legacy_repr, legacy_time, legacy_peak = peak_memory(legacy)
+        chunked_repr, chunked_time, chunked_peak = peak_memory(
+            lambda: map_windows(spartan.pca.transform, X, window_size))
+        assert np.array_equal(legacy_repr, chunked_repr)
+        del legacy_repr, chunked_repr
+
+        results.append({
+            'series_length': series_length,
+            'window_size': window_size,
+            'legacy_s': legacy_time,
+            'chunked_s': chunked_time,
+            'legacy_peak_mb': legacy_peak / 2**20,
+            'chunked_peak_mb': chunked_peak / 2**20,
+        })
+        print("[{}] {}".format(module, results[-1]))
+
+    return pd.DataFrame(results)
+
+
+def bench_pairwise_distance(arguments, module):
+    rng = np.random.default_rng(0)
+
+    results = []
+    for num_instances in arguments.num_instances:
+        # sparse-ish bag-of-patterns counts
+        X = rng.poisson(0.05, (num_instances, arguments.vocab_size))
+        Y = rng.poisson(0.05, (num_instances, arguments.vocab_size))
+
+        for metric in ['euclidean_vectorized', 'boss_vectorized']:
+            dist_mat, full_time, full_peak = peak_memory(
+                lambda: getattr(distance_vectorized, metric)(X, Y))
+            blocked_mat, blocked_time, blocked_peak = peak_memory(
+                lambda: getattr(distance_blocked, metric)(X, Y, memory_budget=arguments.memory_budget,
+                                                          n_jobs=arguments.n_jobs))
+            assert np.array_equal(dist_mat, blocked_mat)
+
+            results.append({
+                'metric': metric,
+                'num_instances': num_instances,
+                'vocab_size': arguments.vocab_size,
+                'full_s': full_time,
+                'blocked_s': blocked_time,
+                'full_peak_mb': full_peak / 2**20,
+                'blocked_peak_mb': blocked_peak / 2**20,
+            })
+            print("[{}] {}".format(module, results[-1]))
+
+    return pd.DataFrame(results)
+
+
+def bench_mindist(arguments, module):
+    rng = np.random.default_rng(0)
+
+    spartan = SPARTAN(alphabet_size=arguments.alphabet_size, word_length=arguments.word_length, retain_training_data=True)
+    spartan.fit(rng.standard_normal((256, 64)))
+    breakpoints = spartan.mindist_breakpoints
+    print("[{}] DAA alphabet sizes: {}".format(module, spartan.alphabet_size))
+
+    # compile the kernels outside the timed region
+    distance_vectorized.spartan_pca_mindist(spartan.pca_repr[:2] > 0, spartan.pca_repr[:2] > 0, breakpoints)
+
+    results = []
+    for num_instances in arguments.num_instances:
+        words = spartan.generate_words(rng.standard_normal((num_instances, arguments.word_length)), spartan.breakpoints)
+
+        dist_mat = distance_vectorized.spartan_pca_mindist(words, words, breakpoints)
+        legacy_dist_mat = legacy_distance_vectorized.spartan_pca_mindist(words, words, breakpoints)
+        # the kernels sum the cells sequentially, np.sum pairwise
+        assert np.allclose(dist_mat, legacy_dist_mat, rtol=1e-12, atol=0)
+        del legacy_dist_mat
+
+        kernel_time = best_time(lambda: distance_vectorized.spartan_pca_mindist(words, words, breakpoints), arguments.repeat)
+        legacy_time = best_time(lambda: legacy_distance_vectorized.spartan_pca_mindist(words, words, breakpoints), 1)
+
+        results.append({
+            'num_instances': num_instances,
+            'legacy_s': legacy_time,
+            'kernel_s': kernel_time,
+            'speedup': legacy_time / kernel_time,
+        })
+        print("[{}] {}".format(module, results[-1]))
+
+    return pd.DataFrame(results)
+
+
+def bench_index(arguments, module):
+    rng = np.random.default_rng(0)
+    series_length = arguments.series_length[0]
+
+    results = []
+    for num_instances in arguments.num_instances:
+        # noisy copies of a few random walks, z-normalized
+        prototypes = rng.standard_normal((100, series_length)).cumsum(axis=1)
+        X = prototypes[rng.integers(0, 100, num_instances)] + rng.standard_normal((num_instances, series_length))
+        X = (X - X.mean(axis=1, keepdims=True)) / X.std(axis=1, keepdims=True)
+        queries = X[rng.integers(0, num_instances, 20)] + 0.1 * rng.standard_normal((20, series_length))
+
+        start_time = time.perf_counter()
+        index = SPARTANIndex(leaf_size=arguments.leaf_size, word_length=arguments.word_length,
+                             alphabet_size=arguments.alphabet_size).fit(X)
+        build_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        distances, indices = index.kneighbors(queries, arguments.n_neighbors)
+        exact_time = time.perf_counter() - start_time
+        pruning_ratio = index.pruning_ratio
+
+        start_time = time.perf_counter()
+        brute_force = np.stack([np.sqrt(np.sum((X - query)**2, axis=1)) for query in queries])
+        brute_indices = np.argsort(brute_force, axis=1, kind='stable')[:, :arguments.n_neighbors]
+        brute_time = time.perf_counter() - start_time
+        assert np.array_equal(indices, brute_indices)
+
+        results.append({
+            'num_instances': num_instances,
+            'build_s': build_time,
+            'exact_s': exact_time,
+            'brute_force_s': brute_time,
+            'pruning_ratio': pruning_ratio,
+        })
+        print("[{}] {}".format(module, results[-1]))
+
+    return pd.DataFrame(results)
+
+
+def bench_streaming(arguments, module):
+    rng = np.random.default_rng(0)
+
+    results = []
+    for series_length in arguments.series_length:
+        x = rng.standard_normal(series_length).cumsum()
+        spartan = SPARTAN(alphabet_size=arguments.alphabet_size, word_length=arguments.word_length,
+                          window_size=arguments.window_size, build_histogram=False)
+        spartan.fit(x[None, :min(series_length, 10**4)])
+
+        def batch():
+            pca_repr = map_windows(spartan.pca.transform, x[None, :], arguments.window_size)
+            return spartan.generate_words(pca_repr[:, :arguments.word_length], spartan.breakpoints)
+
+        stream = SPARTANStream(spartan)
+
+        def streaming():
+            return stream.reset().extend(x)
+
+        batch_time = best_time(batch, arguments.repeat)
+        stream_time = best_time(streaming, arguments.repeat)
+        assert np.array_equal(batch(), streaming())
+
+        # one sample at a time, as from a live feed
+        stream.reset().extend(x[:arguments.window_size])
+        n_updates = min(series_length - arguments.window_size, 10**4)
+        start_time = time.perf_counter()
+        for value in x[arguments.window_size:arguments.window_size + n_updates]:
+            stream.update(value)
+        update_time = (time.perf_counter() - start_time) / n_updates
+
+        results.append({
+            'series_length': series_length,
+            'batch_s': batch_time,
+            'stream_s': stream_time,
+            'update_us': update_time * 1e6,
+        })
+        print("[{}] {}".format(module, results[-1]))
+
+    return pd.DataFrame(results)
+
+
+def model_nbytes(model):
+    # bytes of the numpy arrays and sparse matrices reachable from the model's attributes
+    seen = set()
+    stack = [model]
+    nbytes = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, np.ndarray):
+            nbytes += obj.nbytes
+        elif scipy.sparse.issparse(obj):
+            stack.extend(getattr(obj, name) for name in ('data', 'indices', 'indptr', 'row', 'col', 'offsets') if hasattr(obj, name))
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__'):
+            stack.extend(vars(obj).values())
+    return nbytes
+
+
+def bench_memory(arguments, module):
+    if arguments.problem is not None:
+        X, y = load_from_tsfile(os.path.join(arguments.data, arguments.problem, arguments.problem + "_TRAIN.ts"))
+        X = X[:, 0]
+    else:
+        # shaped like the larger UCR training sets (e.g. HandOutlines)
+        rng = np.random.default_rng(0)
+        X = rng.standard_normal((1000, 2709)).cumsum(axis=1)
+        y = rng.integers(0, 2, len(X))
+    X_test = X[:min(len(X), 100)]
+    print("[{}] training data: {} ({:.1f} MB)".format(module, X.shape, X.nbytes / 2**20))
+
+    settings = [
+        dict(metric='symbolic_l1'),
+        dict(metric='euclidean_lb', assignment_policy='direct'),
+        dict(metric='hist_euclidean', window_size=arguments.window_size, return_sparse=True),
+    ]
+    # compile the kernels outside the measured fits
+    for setting in settings:
+        SPARTANClassifier(alphabet_size=arguments.alphabet_size, word_length=arguments.word_length, **setting).fit(X[:20], y[:20])
+
+    results = []
+    for setting in settings:
+        predictions = {}
+        for retain_training_data in [True, False]:
+            clf = SPARTANClassifier(alphabet_size=arguments.alphabet_size, word_length=arguments.word_length,
+                                    retain_training_data=retain_training_data, **setting)
+            _, fit_time, fit_peak = peak_memory(lambda: clf.fit(X, y))
+            results.append({
+                'metric': setting['metric'],
+                'retain_training_data': retain_training_data,
+                'fit_s': fit_time,
+                'fit_peak_mb': fit_peak / 2**20,
+                'model_mb': model_nbytes(clf) / 2**20,
+            })
+            predictions[retain_training_data] = clf.predict(X_test)
+            print("[{}] {}".format(module, results[-1]))
+        assert np.array_equal(predictions[True], predictions[False])
+
+    return pd.DataFrame(results)
+
+
+def bench_sfa_threads(arguments, module):
+    rng = np.random.default_rng(0)
+    window_size = arguments.window_size
+    dft_length = arguments.word_length
+    support = np.arange(dft_length)
+    breakpoints = np.sort(rng.standard_normal((dft_length, arguments.alphabet_size - 1)), axis=1)
+    breakpoints = np.hstack([breakpoints, np.full((dft_length, 1), np.inf)])
+    letter_bits = np.uint32(np.ceil(np.log2(arguments.alphabet_size)))
+
+    max_threads = numba.config.NUMBA_NUM_THREADS
+    thread_counts = sorted({1, max_threads} | {2**i for i in range(int(np.log2(max_threads)) + 1)})
+
+    def mft(X):
+        return _mft(X, window_size, dft_length, False, support, False, False, 1.0, True)
+
+    def words(dfts):
+        return sfa_generate_words(dfts, False, False, window_size, breakpoints, dft_length, letter_bits)
+
+    # compile the kernels outside the timed region
+    words(mft(rng.standard_normal((1, 4 * window_size))))
+
+    results = []
+    for series_length in arguments.series_length:
+        X = rng.standard_normal((1, series_length)).cumsum(axis=1)
+        reference = None
+        for n_threads in thread_counts:
+            numba.set_num_threads(n_threads)
+            dfts = mft(X)
+            if reference is None:
+                reference = words(dfts)
+            # the blocks restart from an exact DFT, so the words do not depend on the thread count
+            assert np.array_equal(words(dfts), reference)
+
+            mft_time = best_time(lambda: mft(X), arguments.repeat)
+            words_time = best_time(lambda: words(dfts), arguments.repeat)
+            if n_threads == 1:
+                mft_base, words_base = mft_time, words_time
+
+            results.append({
+                'series_length': series_length,
+                'n_threads': n_threads,
+                'mft_s': mft_time,
+                'words_s': words_time,
+                'mft_speedup': mft_base / mft_time,
+                'words_speedup': words_base / words_time,
+            })
+            print("[{}] {}".format(module, results[-1]))
+    numba.set_num_threads(max_threads)
+
+    return pd.DataFrame(results)
+
+
+def bench_rolling_znorm(arguments, module):
+    rng = np.random.default_rng(0)
+    window_size = arguments.window_size
+    num_intervals = arguments.word_length // 2
+    breakpoints = [-0.67, 0, 0.67, np.finfo(np.float64).max]
+    breakpoints_angle = [-30, 0, 30, np.finfo(np.float64).max]
+    transformers = {
+        'tfsax': (PAATFSAX(num_intervals=num_intervals),
+                  lambda paa, x: paa.transform_series(x, window_size, breakpoints, breakpoints_angle)),
+        'sax_dr': (PAASAXDR(num_intervals=num_intervals),
+                   lambda paa, x: paa.transform_series(x, window_size, breakpoints)[:2]),
+    }
+
+    def chunked(paa, x):
+        # z-normalized window blocks, as the transformers did before
+        outputs = [paa.transform(block)[:2] for _, block in iter_window_chunks(x, window_size, znorm=True)]
+        return tuple(np.concatenate(output) for output in zip(*outputs))
+
+    results = []
+    for series_length in arguments.series_length:
+        x = rng.standard_normal(series_length).cumsum()
+        for name, (paa, rolling) in transformers.items():
+            # compile the kernels outside the timed region
+            chunked(paa, x[:4 * window_size])
+            rolling(paa, x[:4 * window_size])
+
+            chunked_out, chunked_time, chunked_peak = peak_memory(lambda: chunked(paa, x))
+            rolling_out, rolling_time, rolling_peak = peak_memory(lambda: rolling(paa, x))
+            # same letters for the frames, same trend letters / direct features
+            assert np.array_equal(np.searchsorted(breakpoints, chunked_out[0]), np.searchsorted(breakpoints, rolling_out[0]))
+            if name == 'tfsax':
+                assert np.array_equal(np.searchsorted(breakpoints_angle, chunked_out[1]), np.searchsorted(breakpoints_angle, rolling_out[1]))
+            else:
+                assert np.array_equal(chunked_out[1], rolling_out[1])
+
+            results.append({
+                'transformer': name,
+                'series_length': series_length,
+                'window_size': window_size,
+                'chunked_s': chunked_time,
+                'rolling_s': rolling_time,
+                'chunked_peak_mb': chunked_peak / 2**20,
+                'rolling_peak_mb': rolling_peak / 2**20,
+            })
+            print("[{}] {}".format(module, results[-1]))
+
+    return pd.DataFrame(results)
+
+
+def bench_vfd_features(arguments, module):
+    rng = np.random.default_rng(0)
+    window_size = arguments.window_size
+    paa = PAASAXVFD(num_intervals=arguments.word_length / 4)
+    bounds, _ = paa_segments(window_size, paa.num_intervals)
+
+    results = []
+    for series_length in arguments.series_length:
+        x = rng.standard_normal(series_length).cumsum()
+        num_windows = series_length - window_size + 1
+        # compile the kernels outside the timed region
+        paa.transform_series(x[:4 * window_size], window_size)
+
+        features = paa.transform_series(x, window_size)
+        batched_time = best_time(lambda: paa.transform_series(x, window_size), arguments.repeat)
+
+        # the per-segment calls take milliseconds per window, time a prefix
+        legacy_rows = min(num_windows, max(1, arguments.legacy_max // 100))
+        windows = next(iter_window_chunks(x[:legacy_rows + window_size - 1], window_size, znorm=True))[1]
+        start_time = time.perf_counter()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            legacy_features = legacy_vfd_features(windows, bounds, paa.feat_list)
+        legacy_time = (time.perf_counter() - start_time) * num_windows / legacy_rows
+        # the batched reductions round differently from the per-segment calls
+        assert np.allclose(features[:legacy_rows], legacy_features, rtol=1e-9, atol=1e-12, equal_nan=True)
+        max_error = np.nanmax(np.abs(features[:legacy_rows] - legacy_features))
+
+        results.append({
+            'series_length': series_length,
+            'window_size': window_size,
+            'num_segments': len(bounds) - 1,
+            'legacy_s': legacy_time,
+            'legacy_extrapolated': legacy_rows < num_windows,
+            'batched_s': batched_time,
+            'speedup': legacy_time / batched_time,
+            'max_abs_error': max_error,
+        })
+        print("[{}] {}".format(module, results[-1]))
+
+    return pd.DataFrame(results)
+
+
+def write_tsfile(path, X, y):
+    with open(path, 'w') as f:
+        f.write("@problemName Runtime\n@timeStamps false\n@missing false\n@univariate true\n")
+        f.write("@equalLength true\n@seriesLength {}\n@classLabel true {}\n@data\n".format(X.shape[1], " ".join(np.unique(y))))
+        for series, label in zip(X, y):
+            f.write(",".join(map(repr, series.tolist())) + ":" + label + "\n")
+
+
+def bench_ts_parser(arguments, module):
+    rng = np.random.default_rng(0)
+    series_length = arguments.series_length[0]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_instances in arguments.num_instances:
+            # UCR files store a few decimals per value
+            X = np.round(rng.standard_normal((num_instances, series_length)).cumsum(axis=1), 6)
+            y = rng.integers(0, 5, num_instances).astype(str)
+            path = os.path.join(tmp_dir, 'Runtime_{}.ts'.format(num_instances))
+            write_tsfile(path, X, y)
+
+            X_fast, y_fast = load_from_tsfile(path)
+            X_legacy, y_legacy = load_from_tsfile(path, fast_parse=False)
+            assert np.array_equal(X_fast, X_legacy) and np.array_equal(y_fast, y_legacy)
+            assert np.array_equal(X_fast[:, 0], X)
+
+            fast_time = best_time(lambda: load_from_tsfile(path), arguments.repeat)
+            legacy_time = best_time(lambda: load_from_tsfile(path, fast_parse=False), arguments.repeat)
+
+            results.append({
+                'num_instances': num_instances,
+                'series_length': series_length,
+                'file_mb': os.path.getsize(path) / 2**20,
+                'legacy_s': legacy_time,
+                'fast_s': fast_time,
+                'speedup': legacy_time / fast_time,
+            })
+            print("[{}] {}".format(module, results[-1]))
+
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+
+    arguments = parse_arguments()
+    module = 'SymbolicRuntimeBenchmark'
+
+    print("=======================================================================")
+    print("[{}] Starting Runtime Benchmark: {}".format(module, arguments.bench))
+    print("=======================================================================")
+
+    if arguments.bench == 'generate_words':
+        results = bench_generate_words(arguments, module)
+    elif arguments.bench == 'sliding_windows':
+        results = bench_sliding_windows(arguments, module)
+    elif arguments.bench == 'pairwise_distance':
+        results = bench_pairwise_distance(arguments, module)
+    elif arguments.bench == 'mindist':
+        results = bench_mindist(arguments, module)
+    elif arguments.bench == 'index':
+        results = bench_index(arguments, module)
+    elif arguments.bench == 'ts_parser':
+        results = bench_ts_parser(arguments, module)
+    elif arguments.bench == 'streaming':
+        results = bench_streaming(arguments, module)
+    elif arguments.bench == 'memory':
+        results = bench_memory(arguments, module)
+    elif arguments.bench == 'sfa_threads':
+        results = bench_sfa_threads(arguments, module)
+    elif arguments.bench == 'rolling_znorm':
+        results = bench_rolling_znorm(arguments, module)
+    elif arguments.bench == 'vfd_features':
+        results = bench_vfd_features(arguments, module)
+
+    print(results.to_string(index=False))
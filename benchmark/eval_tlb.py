@@ -10,10 +10,11 @@ import matplotlib.pyplot as plt
 
 from tslearn.piecewise import SymbolicAggregateApproximation
 
-from .util.distance_vectorized import euclidean_vectorized, univariate_sfa_distance, spartan_pca_mindist
+from .util.tlb import mean_tlb, lower_bound_violations, sax_mindist_pairwise, sfa_mindist_pairwise
 from .util.dataset import create_numpy_dataset
 from .util.normalization import create_normalizer
 from TSB_Symbolic.onennclassifier.spartan_classifier import SPARTANClassifier
+from TSB_Symbolic.util.distance_blocked import euclidean_vectorized, spartan_pca_mindist
 # from TSB_Symbolic.onennclassifier.sax_classifier import SAXDictionaryClassifier
 # from TSB_Symbolic.onennclassifier.sfa_classifier import SFADictionaryClassifier
 
@@ -27,7 +28,7 @@ import argparse
 
 from tqdm import tqdm
 
-def parse_arguments():
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("-d", "--data", required=False, default="../data/TSC/Univariate_ts/")
     parser.add_argument("-p", "--problem", required=False, default="Computers") 
@@ -36,14 +37,14 @@ def parse_arguments():
     parser.add_argument("--alpha_max", required=False, default=10, type=int) 
     parser.add_argument("--wordlen_min", required=False, default=4, type=int) 
     parser.add_argument("--wordlen_max", required=False, default=10, type=int) 
+    parser.add_argument("--cache_dir", required=False, default=None) # cache of the parsed datasets, disabled if None
 
-    arguments = parser.parse_args()
+    arguments = parser.parse_args(argv)
 
     return arguments
 
-if __name__ == "__main__":
+def run(arguments):
 
-    arguments = parse_arguments()
     dataset   = arguments.problem
     data_path = arguments.data
     data_id   = arguments.problem_idx
@@ -63,7 +64,7 @@ if __name__ == "__main__":
 
     # load dataset
 
-    X_train,y_train,X_test,y_test = create_numpy_dataset(name=dataset,path=data_path)
+    X_train,y_train,X_test,y_test = create_numpy_dataset(name=dataset,path=data_path,cache_dir=arguments.cache_dir)
 
     X_train = X_train[:,0,:]
     X_test = X_test[:,0,:]
@@ -120,6 +121,19 @@ if __name__ == "__main__":
 
     start_time = time.time()
 
+    # fit the PCA once at the largest word length; every (word length, alphabet size)
+    # cell derives its binning from it and reuses the single test set projection
+    spartan_full = SPARTANClassifier(
+        alphabet_size=int(alphabet_sizes[0]),
+        word_length=int(word_sizes[-1]),
+        metric='pca_mindist',
+        assignment_policy='direct',
+        pca_solver='full',
+        retain_training_data=True
+    )
+    spartan_full.fit(X_train_transform,y_train_transformed)
+    test_pca_repr = spartan_full.spartan.pca.transform((X_test_transform - spartan_full._mean) / spartan_full._std)
+
     for n in tqdm(range(len(word_sizes))):
 
         word_len = word_sizes[n]
@@ -131,25 +145,22 @@ if __name__ == "__main__":
             ######################
 
             # print(f"ALPHABET: {alphabet_size} | WORDLEN: {word_len} | BUDGET: {np.log2(alphabet_size) * word_len}")
-            spartan_woDAA = SPARTANClassifier(
-                alphabet_size=int(alphabet_size),
+            spartan_woDAA = spartan_full.spartan.derive(
                 word_length=word_len,
-                metric='pca_mindist',
-                assignment_policy='direct',
-                pca_solver='full'
+                alphabet_size=int(alphabet_size),
+                assignment_policy='direct'
             )
 
             assignment_policy = 'DAA'
             lamda = 0.5
 
-            spartan_DAA = SPARTANClassifier(
-                alphabet_size=int(alphabet_size),
+            spartan_DAA = spartan_full.spartan.derive(
                 word_length=word_len,
-                metric='pca_mindist',
+                alphabet_size=int(alphabet_size),
                 assignment_policy='DAA',
                 lamda=lamda,
                 bit_budget=int(np.log2(alphabet_size) * word_len),
-                pca_solver='full'
+                max_bit_budget=int(np.log2(alphabet_sizes[-1]) * word_len)
             )
             
             sfa = SFAWhole(word_length=int(word_len),
@@ -160,12 +171,9 @@ if __name__ == "__main__":
             # II. Fit models
             ####################
 
-            # print("SPARTAN FITTING")
-            spartan_woDAA.fit(X_train_transform,y_train_transformed)
-            pred_woDAA = spartan_woDAA.predict(X_test_transform)
-
-            spartan_DAA.fit(X_train_transform,y_train_transformed)
-            pred_DAA = spartan_DAA.predict(X_test_transform)
+            # print("SPARTAN WORDS")
+            woDAA_pred_words = spartan_woDAA.generate_words(test_pca_repr,spartan_woDAA.breakpoints)
+            DAA_pred_words = spartan_DAA.generate_words(test_pca_repr,spartan_DAA.breakpoints)
 
             # print("SFA FITTING")
             sfa_train_words, _ = sfa.fit_transform(X_train_transform, None)
@@ -186,81 +194,42 @@ if __name__ == "__main__":
             
             # print("SPARTAN TLB")
             # SPARTAN without DAA TLB
-            pred_words = np.squeeze(spartan_woDAA.pred_words,axis=1)
-            breakpoints = spartan_woDAA.spartan.mindist_breakpoints
-            spartan_woDAA_dist_mat = spartan_pca_mindist(pred_words,pred_words,breakpoints)
+            breakpoints = spartan_woDAA.mindist_breakpoints
+            spartan_woDAA_dist_mat = spartan_pca_mindist(woDAA_pred_words,woDAA_pred_words,breakpoints)
 
-            spartan_woDAA_tlbs = []
-            for i,j in zip(spartan_woDAA_dist_mat.ravel(),euclidean_dist_mat.ravel()):
-                if i == 0 and j == 0:
-                    spartan_woDAA_tlbs.append(1)
-                else:
-                    spartan_woDAA_tlbs.append(i / j)
-
-            spartan_woDAA_mean_tlb = np.mean(spartan_woDAA_tlbs)
+            spartan_woDAA_mean_tlb = mean_tlb(spartan_woDAA_dist_mat,euclidean_dist_mat)
 
             spartan_woDAA_tlb_values[n,m] = spartan_woDAA_mean_tlb
 
             # SPARTAN with DAA TLB
 
-            pred_words = np.squeeze(spartan_DAA.pred_words,axis=1)
-            breakpoints = spartan_DAA.spartan.mindist_breakpoints
-            spartan_DAA_dist_mat = spartan_pca_mindist(pred_words,pred_words,breakpoints)
-
-            spartan_DAA_tlbs = []
-            for i,j in zip(spartan_DAA_dist_mat.ravel(),euclidean_dist_mat.ravel()):
-                if i == 0 and j == 0:
-                    spartan_DAA_tlbs.append(1)
-                else:
-                    spartan_DAA_tlbs.append(i / j)
+            breakpoints = spartan_DAA.mindist_breakpoints
+            spartan_DAA_dist_mat = spartan_pca_mindist(DAA_pred_words,DAA_pred_words,breakpoints)
 
-            spartan_DAA_mean_tlb = np.mean(spartan_DAA_tlbs)
+            spartan_DAA_mean_tlb = mean_tlb(spartan_DAA_dist_mat,euclidean_dist_mat)
 
             spartan_DAA_tlb_values[n,m] = spartan_DAA_mean_tlb
             
             # print("SAX TLB")
             # SAX TLB
-            tsl_sax_dist_mat = np.zeros((tsl_words.shape[0],tsl_words.shape[0]))
-            for i in range(tsl_words.shape[0]):
-                for j in range(tsl_words.shape[0]):
+            tsl_sax_dist_mat = sax_mindist_pairwise(tsl_words,tsl_words,tsl_sax.breakpoints_avg_,X_test_transform.shape[1])
 
-                    tsl_sax_dist_mat[i,j] = tsl_sax.distance_sax(tsl_words[i],tsl_words[j])
-
-            sax_tlbs = []
-            for i,j in zip(tsl_sax_dist_mat.ravel(),euclidean_dist_mat.ravel()):
-                if i == 0 and j == 0:
-                    sax_tlbs.append(1)
-                else:
-                    sax_tlbs.append(i / j)
-
-            sax_mean_tlb = np.mean(sax_tlbs)
+            sax_mean_tlb = mean_tlb(tsl_sax_dist_mat,euclidean_dist_mat)
 
             sax_tlb_values[n,m] = sax_mean_tlb
             
             # print("SFA TLB")
             # SFA TLB 
-            sfa_tlbs = []
-            sfa_dist_mat = np.zeros((sfa_words.shape[0],sfa_words.shape[0]))
             sfa_bkpt = sfa.breakpoints
-            for i in range(sfa_words.shape[0]):
-                for j in range(sfa_words.shape[0]):
-
-                    sfa_dist_mat[i,j] = univariate_sfa_distance(sfa_words[i],sfa_words[j], sfa_bkpt)
+            sfa_dist_mat = sfa_mindist_pairwise(sfa_words,sfa_words,sfa_bkpt)
 
             assert sfa_dist_mat.shape == euclidean_dist_mat.shape
 
-            for i,j in zip(sfa_dist_mat.ravel(),euclidean_dist_mat.ravel()):
-                if i == 0 and j == 0:
-                    sfa_tlbs.append(1)
-                else:
-                    if j == 0 or i > j:
-                        sfa_tlbs.append(np.nan) # error
-                        print("sfa: ", i, j)
-                        continue
-                    else:
-                        sfa_tlbs.append(i / j)
+            # lower bound violations count as NaN (error)
+            for i,j in zip(*np.nonzero(lower_bound_violations(sfa_dist_mat,euclidean_dist_mat))):
+                print("sfa: ", sfa_dist_mat[i,j], euclidean_dist_mat[i,j])
 
-            sfa_mean_tlb = np.mean(sfa_tlbs)
+            sfa_mean_tlb = mean_tlb(sfa_dist_mat,euclidean_dist_mat,violations_as_nan=True)
 
             sax_record = pd.DataFrame([{'dataset':dataset,'a':alphabet_size,'w':word_len,'method':'sax','tlb':sax_mean_tlb, 'param': 'none'}])
             sfa_record = pd.DataFrame([{'dataset':dataset,'a':alphabet_size,'w':word_len,'method':'sfa','tlb':sfa_mean_tlb, 'param': 'none'}])
@@ -279,4 +248,9 @@ if __name__ == "__main__":
 
     print(f"runtime for {dataset}: {(time.time()-start_time)/60:.2f}min")
 
-        
+    return tlb_results
+
+
+if __name__ == "__main__":
+
+    run(parse_arguments())
@@ -1,5 +1,7 @@
 import os
 import re
+import json
+import hashlib
 import shutil
 import tempfile
 import urllib
@@ -17,43 +19,51 @@ from sklearn.model_selection import train_test_split
 
 name = "DataLoader"
 
+# bump when the loader or preprocessing changes the arrays it produces
+DATASET_CACHE_VERSION = 1
 
 
 def resample_length(X,len_resample=None):
+    """Resample every series with missing values to len_resample points.
+
+    The NaNs of a series are dropped and the remaining values are resampled
+    with resample_poly. Series with the same number of valid values share the
+    up/down factors, so they are resampled together as one 2d block.
+    """
+    n_instances, n_channels, series_length = X.shape
     if len_resample is None:
-        max_len = X.shape[2]
+        max_len = series_length
     else:
         max_len = len_resample
-    tmp = []
-    for i in range(len(X)):
-        _x = X[i,:]
-
-        _y = []
-        for y in _x:
-            if np.isnan(y).any():
-                y = resample_poly(y[~np.isnan(y)],max_len,len(y[~np.isnan(y)]))
-            _y.append(y)
-        tmp.append(_y)
-    X_transform = np.array(tmp)
-    return X_transform
+
+    rows = X.reshape(-1, series_length)
+    missing = np.isnan(rows)
+    n_valid = series_length - missing.sum(axis=1)
+    # move the valid values of every row to its front, keeping their order
+    compact = np.take_along_axis(rows, np.argsort(missing, axis=1, kind='stable'), axis=1)
+
+    X_transform = np.empty((len(rows), max_len))
+    resample = n_valid != max_len
+    X_transform[~resample] = rows[~resample]
+    for length in np.unique(n_valid[resample]):
+        group = np.flatnonzero(n_valid == length)
+        X_transform[group] = resample_poly(compact[group, :length], max_len, length, axis=1)
+    return X_transform.reshape(n_instances, n_channels, max_len)
+
+
 def fill_nontrailing_missing(X):
-    tmp = []
-    for i in range(len(X)):
-        _x = X[i,:]
-
-        _y = []
-        for y in _x:
-            if np.isnan(y).any():
-                #y_end = np.isnan(y).nonzero().max()
-                y_series = pd.Series(y)
-                #y_series = y_series.interpolate(method='linear',limit_direction='both')
-                y_series = y_series.ffill()
-                y_series = y_series.bfill()
-                y = np.array(np.transpose(y_series))
-            _y.append(y)
-        tmp.append(_y)
-    X_transform = np.array(tmp)
-    return X_transform
+    """Forward fill, then backward fill the NaNs of every series."""
+    missing = np.isnan(X)
+    positions = np.arange(X.shape[-1])
+
+    # index of the last valid value at or before every position
+    last_valid = np.maximum.accumulate(np.where(missing, 0, positions), axis=-1)
+    X_transform = np.take_along_axis(X, last_valid, axis=-1)
+
+    # leading NaNs take the first valid value after them
+    missing = np.isnan(X_transform)
+    next_valid = np.minimum.accumulate(np.where(missing, positions[-1], positions)[..., ::-1], axis=-1)[..., ::-1]
+    return np.take_along_axis(X_transform, next_valid, axis=-1)
 
 
 def _load_header_info(file):
@@ -240,11 +250,59 @@ def _load_data(file, meta_data, replace_missing_vals_with="NaN"):
     return data, np.asarray(y_values), meta_data
 
 
+def _load_data_fast(lines, meta_data, replace_missing_vals_with="NaN"):
+    """Bulk parse the data section of an equal length univariate file without
+    timestamps.
+
+    The labels are split off at the ':' separator and the values of all
+    cases are parsed by one np.loadtxt call, which rounds like Python's
+    float(), so the result is identical to _load_data. Cases are
+    pre-processed the same way (lower case, missing markers replaced).
+
+    Returns
+    -------
+    data : np.ndarray (n_cases, 1, series_length), y_values : np.ndarray of str,
+    or None if the section does not fit the fast path (it is then parsed by
+    _load_data)
+    """
+    target = meta_data["classlabel"] or meta_data["targetlabel"]
+
+    text = "".join(lines).lower()
+    text = text.replace("nan", replace_missing_vals_with).replace("?", replace_missing_vals_with)
+    cases = [line.strip() for line in text.splitlines()]
+    if len(cases) == 0 or not all(cases):
+        return None
+
+    y_values = []
+    if target:
+        values = []
+        for case in cases:
+            if case.count(":") != 1:
+                return None
+            series, _, label = case.partition(":")
+            values.append(series)
+            y_values.append(label)
+    else:
+        if any(":" in case for case in cases):
+            return None
+        values = cases
+
+    # all cases must have the same number of values, shorter cases are padded
+    # with NaN by _load_data
+    try:
+        data = np.loadtxt(values, delimiter=",", dtype=np.float64, ndmin=2)
+    except ValueError:
+        return None
+
+    return data[:, None, :], np.asarray(y_values)
+
+
 def load_from_tsfile(
     full_file_path_and_name,
     replace_missing_vals_with="NaN",
     return_meta_data=False,
     return_type="auto",
+    fast_parse=True,
 ):
     """Load time series .ts file into X and (optionally) y.
 
@@ -261,6 +319,9 @@ def load_from_tsfile(
         If "auto", returns numpy3D for equal length and list of numpy2D for unequal.
         If "numpy2D", will squash a univariate equal length into a numpy2D (n_cases,
         n_timepoints). Other options are available but not supported medium term.
+    fast_parse : boolean, default=True
+        parse equal length univariate files without timestamps in bulk, other
+        files (and files the bulk parser rejects) use the case by case parser.
 
     Returns
     -------
@@ -285,8 +346,16 @@ def load_from_tsfile(
     with open(full_file_path_and_name, "r", encoding="utf-8") as file:
         # Read in headers
         meta_data = _load_header_info(file)
+        lines = file.readlines()
+
+    parsed = None
+    if fast_parse and meta_data["univariate"] and meta_data["equallength"] and not meta_data["timestamps"]:
+        parsed = _load_data_fast(lines, meta_data)
+    if parsed is not None:
+        data, y = parsed
+    else:
         # load into list of numpy
-        data, y, meta_data = _load_data(file, meta_data)
+        data, y, meta_data = _load_data(lines, meta_data)
 
     # if equal load to 3D numpy
     if meta_data["equallength"]:
@@ -301,23 +370,51 @@ def load_from_tsfile(
     return data, y
 
 
-def create_numpy_dataset(
-        name = 'ArrowHead',
-        path='data/ucr/Univariate_ts/',
-        return_meta_data =False,
-        equalize_length=True,
-        fill_missing = True,
-        resample=False,
-        test_size=0.3,
-        random_state=0
-    ):
-    train_dataset_path = os.path.join(path,'{}/{}_{}.ts'.format(name, name,'TRAIN'))
-    X_train,y_train,train_meta_data = load_from_tsfile(train_dataset_path,return_meta_data=True)
+def _dataset_cache_key(file_paths, options):
+    """Hash of the source files' path, modification time and size plus the
+    preprocessing options, so editing a file or an option invalidates the entry."""
+    sources = []
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        sources.append([os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size])
+    key = json.dumps({'version': DATASET_CACHE_VERSION, 'sources': sources, 'options': options}, sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
 
-    test_dataset_path = os.path.join(path,'{}/{}_{}.ts'.format(name, name,'TEST'))
-    test_dataset_path = path +'/{}/{}_{}.ts'.format(name, name,'TEST')
+
+def _load_cached_dataset(cache_path):
+    """Memory map the arrays of a cache entry, None if there is no entry."""
+    if not os.path.exists(os.path.join(cache_path, 'meta.json')):
+        return None
+    return tuple(np.load(os.path.join(cache_path, '{}.npy'.format(array_name)), mmap_mode='r', allow_pickle=False)
+                 for array_name in ['X_train', 'y_train', 'X_test', 'y_test'])
+
+
+def _save_cached_dataset(cache_path, arrays, meta_data):
+    """Write a cache entry into a temporary directory and rename it into place.
+
+    Readers only see complete entries; when several processes build the same
+    entry concurrently the first rename wins and the others are discarded.
+    """
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=cache_dir, prefix='.tmp-')
+    try:
+        for array_name, array in zip(['X_train', 'y_train', 'X_test', 'y_test'], arrays):
+            np.save(os.path.join(tmp_path, '{}.npy'.format(array_name)), np.asarray(array), allow_pickle=False)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(meta_data, f, indent=2)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        if not os.path.exists(os.path.join(cache_path, 'meta.json')):
+            raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _load_preprocessed_dataset(train_dataset_path, test_dataset_path, equalize_length, fill_missing):
+    X_train,y_train,train_meta_data = load_from_tsfile(train_dataset_path,return_meta_data=True)
     X_test,y_test,test_meta_data = load_from_tsfile(test_dataset_path,return_meta_data=True)
-        
+
     if (not (train_meta_data['equallength'] and test_meta_data['equallength'])) and equalize_length:
         max_len = max([X_train.shape[2],X_test.shape[2]])
 
@@ -334,6 +431,51 @@ def create_numpy_dataset(
 
         X_test = fill_nontrailing_missing(X_test)
 
+    return X_train,y_train,X_test,y_test
+
+
+def create_numpy_dataset(
+        name = 'ArrowHead',
+        path='data/ucr/Univariate_ts/',
+        return_meta_data =False,
+        equalize_length=True,
+        fill_missing = True,
+        resample=False,
+        test_size=0.3,
+        random_state=0,
+        cache_dir=None
+    ):
+    """Load the TRAIN and TEST split of a UCR/UEA problem as numpy arrays.
+
+    With ``cache_dir`` the parsed and preprocessed arrays are stored as .npy
+    files under ``cache_dir``, keyed on the source files and the
+    preprocessing options. Later calls memory map them (read-only), so
+    repeated runs skip parsing and concurrent workers share the pages.
+    """
+    train_dataset_path = os.path.join(path,'{}/{}_{}.ts'.format(name, name,'TRAIN'))
+    test_dataset_path = path +'/{}/{}_{}.ts'.format(name, name,'TEST')
+
+    if cache_dir is None:
+        X_train,y_train,X_test,y_test = _load_preprocessed_dataset(train_dataset_path,test_dataset_path,equalize_length,fill_missing)
+    else:
+        options = {'equalize_length': equalize_length, 'fill_missing': fill_missing}
+        key = _dataset_cache_key([train_dataset_path,test_dataset_path],options)
+        cache_path = os.path.join(cache_dir,'{}-{}'.format(name,key[:16]))
+
+        cached = _load_cached_dataset(cache_path)
+        if cached is None:
+            arrays = _load_preprocessed_dataset(train_dataset_path,test_dataset_path,equalize_length,fill_missing)
+            _save_cached_dataset(cache_path,arrays,{
+                'name': name,
+                'key': key,
+                'sources': [os.path.abspath(train_dataset_path),os.path.abspath(test_dataset_path)],
+                'options': options,
+                'shapes': {array_name: list(np.shape(array)) for array_name, array in zip(['X_train','y_train','X_test','y_test'],arrays)},
+                'created': datetime.now().isoformat(),
+            })
+            cached = _load_cached_dataset(cache_path)
+        X_train,y_train,X_test,y_test = cached
+
     if resample:
         X_full = np.concatenate([X_train,X_test],axis=0)
         y_full = np.concatenate([y_train,y_test],axis=0)
@@ -0,0 +1,123 @@
+"""Tightness of lower bound (TLB) computation.
+
+The TLB of a symbolic representation is the mean ratio between its lower
+bounding distance and the Euclidean distance over all pairs of series. The
+helpers below compute the ratios for a whole distance matrix at once and
+batch the pairwise SAX and SFA mindist computations, which are otherwise
+evaluated one pair at a time.
+"""
+import numpy as np
+
+
+def lower_bound_violations(lb_dist_mat, dist_mat):
+    """Mask of the pairs where the lower bound is not a valid lower bound.
+
+    A pair violates the bound when the lower bound exceeds the true distance
+    or when the true distance is zero while the lower bound is not.
+    """
+    lb_dist_mat = np.asarray(lb_dist_mat)
+    dist_mat = np.asarray(dist_mat)
+    both_zero = (lb_dist_mat == 0) & (dist_mat == 0)
+    return ~both_zero & ((dist_mat == 0) | (lb_dist_mat > dist_mat))
+
+
+def tlb_ratios(lb_dist_mat, dist_mat, violations_as_nan=False):
+    """Element-wise TLB ratios lb / d.
+
+    Pairs where both distances are zero count as a perfectly tight bound (1).
+    With ``violations_as_nan`` the pairs flagged by ``lower_bound_violations``
+    are NaN, so they propagate into the mean; otherwise the plain ratio is
+    kept (inf for a positive bound over a zero distance).
+
+    Returns
+    -------
+    numpy array with the shape of dist_mat
+    """
+    lb_dist_mat = np.asarray(lb_dist_mat, dtype=np.float64)
+    dist_mat = np.asarray(dist_mat, dtype=np.float64)
+
+    ratios = np.ones(np.broadcast_shapes(lb_dist_mat.shape, dist_mat.shape))
+    divide = ~((lb_dist_mat == 0) & (dist_mat == 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(lb_dist_mat, dist_mat, out=ratios, where=divide)
+
+    if violations_as_nan:
+        ratios[lower_bound_violations(lb_dist_mat, dist_mat)] = np.nan
+    return ratios
+
+
+def mean_tlb(lb_dist_mat, dist_mat, violations_as_nan=False):
+    """Mean TLB over all pairs (np.mean semantics: any NaN gives NaN)."""
+    return np.mean(tlb_ratios(lb_dist_mat, dist_mat, violations_as_nan))
+
+
+def _symbol_pair_sums(X_words, Y_words, tables):
+    # sum tables[letter][x, y] over the letters, in letter order
+    dist = np.zeros((X_words.shape[0], Y_words.shape[0]))
+    for letter in range(X_words.shape[1]):
+        dist += tables[letter][X_words[:, letter][:, None], Y_words[:, letter][None, :]]
+    return dist
+
+
+def _cell_table(breakpoints, alphabet_size):
+    # squared gap between the cells of two symbols more than one letter apart,
+    # symbol s covers (breakpoints[s-1], breakpoints[s]]
+    symbols = np.arange(alphabet_size)
+    x, y = np.meshgrid(symbols, symbols, indexing='ij')
+    high, low = np.maximum(x, y), np.minimum(x, y)
+    gap = np.zeros((alphabet_size, alphabet_size))
+    far = np.abs(x - y) > 1
+    gap[far] = (breakpoints[high[far] - 1] - breakpoints[low[far]]) ** 2
+    return gap
+
+
+def sax_mindist_pairwise(X_words, Y_words, breakpoints, original_size):
+    """Pairwise SAX MINDIST of tslearn SAX words.
+
+    Batched equivalent of ``SymbolicAggregateApproximation.distance_sax`` for
+    every pair of rows (up to the rounding of its fastmath kernel).
+
+    Parameters
+    ----------
+    X_words, Y_words : int numpy arrays [N_instances,n_segments(,n_dims)]
+    breakpoints : 1d numpy array, ``breakpoints_avg_`` of the fitted SAX
+    original_size : int, length of the original series
+
+    Returns
+    -------
+    dist_mat : 2d numpy array [N_X,N_Y]
+    """
+    X_words = np.asarray(X_words, dtype=np.int64)
+    Y_words = np.asarray(Y_words, dtype=np.int64)
+    n_segments = X_words.shape[1]
+    X_words = X_words.reshape(X_words.shape[0], -1)
+    Y_words = Y_words.reshape(Y_words.shape[0], -1)
+
+    breakpoints = np.asarray(breakpoints, dtype=np.float64)
+    table = _cell_table(breakpoints, len(breakpoints) + 1)
+    dist = _symbol_pair_sums(X_words, Y_words, [table] * X_words.shape[1])
+    return np.sqrt(dist * float(original_size) / n_segments)
+
+
+def sfa_mindist_pairwise(X_words, Y_words, breakpoints):
+    """Pairwise SFA lower bounding distance of whole series SFA words.
+
+    Batched equivalent of ``univariate_sfa_distance`` for every pair of rows
+    (up to the rounding of its fastmath kernel).
+
+    Parameters
+    ----------
+    X_words, Y_words : int numpy arrays [N_instances,word_length]
+    breakpoints : 2d numpy array [word_length,alphabet_size] of the fitted SFA
+
+    Returns
+    -------
+    dist_mat : 2d numpy array [N_X,N_Y]
+    """
+    X_words = np.asarray(X_words, dtype=np.int64)
+    Y_words = np.asarray(Y_words, dtype=np.int64)
+    breakpoints = np.asarray(breakpoints, dtype=np.float64)
+
+    tables = [_cell_table(breakpoints[letter], breakpoints.shape[1]) for letter in range(X_words.shape[1])]
+    dist = _symbol_pair_sums(X_words, Y_words, tables)
+    return np.sqrt(2 * dist)
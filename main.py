@@ -1,7 +1,20 @@
 import os
+import time
+import signal
 import argparse
+import importlib
+import traceback
 import pandas as pd
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+EVAL_MODULES = {
+    'classification': 'benchmark.eval_classfication',
+    'clustering': 'benchmark.eval_clustering',
+    'tlb': 'benchmark.eval_tlb',
+    'anomaly': 'benchmark.eval_anomaly',
+}
+
 def parse_arguments():
     parser = argparse.ArgumentParser()
     parser.add_argument("-d", "--data", required=False, default="data/ucr/Univariate_ts/")
@@ -22,11 +35,117 @@ def parse_arguments():
     parser.add_argument("--alpha_max", required=False, default=10, type=int) 
     parser.add_argument("--wordlen_min", required=False, default=4, type=int) 
     parser.add_argument("--wordlen_max", required=False, default=10, type=int) 
+    parser.add_argument("-j","--n_workers", required=False, default=1, type=int)  # -- driver: worker processes
+    parser.add_argument("--timeout", required=False, default=0, type=int)  # seconds per task, 0 disables
+    parser.add_argument("--summary", required=False, default=None)  # summary csv, default output/<eval_task>/summary.csv
+    parser.add_argument("--cache_dir", required=False, default=None)  # cache of the parsed datasets, disabled if None
 
     arguments = parser.parse_args()
     return arguments
 
 
+class TaskTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise TaskTimeout()
+
+
+def init_worker(module_name, n_threads=None):
+    """Import the eval module once per worker process.
+
+    The numba kernels compiled by the first task of a worker stay loaded for
+    all following tasks, so only the first task pays the JIT and import cost.
+    """
+    importlib.import_module(module_name)
+    if n_threads is not None:
+        import numba
+        numba.set_num_threads(n_threads)
+
+
+def run_task(module_name, task_id, problem, argv, timeout=0):
+    """Run one eval task in the current process.
+
+    The timeout is enforced with SIGALRM and is checked between Python
+    bytecodes, so a long running native call finishes before the task stops.
+
+    Returns
+    -------
+    (task_id, problem, status, error, runtime, results) where status is one
+    of 'ok', 'timeout' or 'error' and results is the DataFrame returned by
+    the eval module's run (None unless status is 'ok')
+    """
+    module = importlib.import_module(module_name)
+    status, error, results = 'ok', None, None
+
+    start_time = time.time()
+    if timeout > 0:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(timeout)
+    try:
+        results = module.run(module.parse_arguments(argv))
+    except TaskTimeout:
+        status, error = 'timeout', 'exceeded {}s'.format(timeout)
+    except (Exception, SystemExit) as e:
+        status, error = 'error', repr(e)
+        traceback.print_exc()
+    finally:
+        if timeout > 0:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+    return task_id, problem, status, error, time.time() - start_time, results
+
+
+def run_tasks(module_name, tasks, n_workers=1, timeout=0):
+    """Run (problem, argv) tasks and return their outcomes in task order.
+
+    With more than one worker the tasks run on a pool of warm worker
+    processes that share the cores' numba threads between them.
+    """
+    outcomes = [None] * len(tasks)
+
+    if n_workers <= 1:
+        init_worker(module_name)
+        for task_id, (problem, argv) in enumerate(tasks):
+            outcomes[task_id] = run_task(module_name, task_id, problem, argv, timeout)
+            print("Finished: ", task_id, problem, outcomes[task_id][2])
+        return outcomes
+
+    n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker,
+                             initargs=(module_name, n_threads)) as executor:
+        futures = {executor.submit(run_task, module_name, task_id, problem, argv, timeout): task_id
+                   for task_id, (problem, argv) in enumerate(tasks)}
+        for future in as_completed(futures):
+            task_id = futures[future]
+            try:
+                outcomes[task_id] = future.result()
+            except Exception as e:
+                # the worker process died (e.g. out of memory)
+                outcomes[task_id] = (task_id, tasks[task_id][0], 'error', repr(e), None, None)
+            print("Finished: ", task_id, tasks[task_id][0], outcomes[task_id][2])
+
+    return outcomes
+
+
+def summarize(outcomes):
+    """One table of all task results, in task order, with the task status."""
+    frames = []
+    for task_id, problem, status, error, runtime, results in outcomes:
+        if isinstance(results, pd.DataFrame) and len(results) > 0:
+            frame = results.reset_index(drop=True).copy()
+        else:
+            frame = pd.DataFrame(index=[0])
+        frame.insert(0, 'problem', problem)
+        frame.insert(1, 'status', status)
+        frame.insert(2, 'error', error)
+        frame.insert(3, 'task_runtime', runtime)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
 if __name__ == "__main__":
 
     arguments = parse_arguments()
@@ -51,6 +170,9 @@ if __name__ == "__main__":
     wordlen_min  = arguments.wordlen_min
 
 
+    module_name = EVAL_MODULES[eval_task]
+    tasks = []
+
     dset_info = pd.read_csv('benchmark/util/summaryUnivariate.csv')
     dset_info = dset_info.sort_values(by=['numTrainCases','numTestCases'])
 
@@ -65,13 +187,16 @@ if __name__ == "__main__":
             print("Dataset No.: ", i, dataset)
 
             if eval_task == 'classification':
-                call_string = 'python -m benchmark.eval_classfication --data {} --classifier {} --norm {} --problem {} --itr {} --config {} --downsample {}'.format(data_path,classifier_name,normalization,dataset,itr,config, downsample_rate)
+                argv = ['--data', data_path, '--classifier', classifier_name, '--norm', normalization, '--problem', dataset, '--itr', itr, '--config', config, '--downsample', downsample_rate]
             elif eval_task == 'clustering':
-                call_string = 'python -m benchmark.eval_clustering --data {} --classifier {} --norm {} --problem {} --itr {} --config {} --clust_model {} --linkage {} --kmedoids_type {} -b {} -t {}'.format(data_path,classifier_name,normalization,dataset,itr,config, clust_model, linkage, kmedoids_type, data_split, repr_type)
+                argv = ['--data', data_path, '--classifier', classifier_name, '--norm', normalization, '--problem', dataset, '--itr', itr, '--config', config, '--clust_model', clust_model, '--linkage', linkage, '--kmedoids_type', kmedoids_type, '-b', data_split, '-t', repr_type]
             elif eval_task == 'tlb':
-                call_string = 'python -m benchmark.eval_tlb --data {} --problem {} -x {} --alpha_max {} --alpha_min {} --wordlen_max {} --wordlen_min {}'.format(data_path, dataset, i, alphabet_max, alphabet_min, wordlen_max, wordlen_min)
+                argv = ['--data', data_path, '--problem', dataset, '-x', i, '--alpha_max', alphabet_max, '--alpha_min', alphabet_min, '--wordlen_max', wordlen_max, '--wordlen_min', wordlen_min]
 
-            os.system(call_string)
+            if arguments.cache_dir is not None:
+                argv += ['--cache_dir', arguments.cache_dir]
+
+            tasks.append((dataset, [str(arg) for arg in argv]))
 
     elif eval_task == 'anomaly':
 
@@ -88,6 +213,18 @@ if __name__ == "__main__":
                 if top_num - 1 < i and top_num != 0:
                     continue
 
-                call_string = 'python -m benchmark.eval_anomaly --data {} --classifier {} --norm {} --problem {} --itr {} --config {} -t {}'.format(datadir,classifier_name,normalization,filename,itr,config, repr_type)
+                argv = ['--data', datadir, '--classifier', classifier_name, '--norm', normalization, '--problem', filename, '--itr', itr, '--config', config, '-t', repr_type]
+
+                tasks.append((filename, [str(arg) for arg in argv]))
+
+    outcomes = run_tasks(module_name, tasks, n_workers=arguments.n_workers, timeout=arguments.timeout)
+
+    summary = summarize(outcomes)
+    summary_path = arguments.summary
+    if summary_path is None:
+        summary_path = os.path.join('output', eval_task, 'summary.csv')
+    os.makedirs(os.path.dirname(summary_path) or '.', exist_ok=True)
+    summary.to_csv(summary_path, index=False)
 
-                os.system(call_string)   
+    print(summary[['problem', 'status', 'task_runtime']].to_string(index=False))
+    print("Summary: ", summary_path)